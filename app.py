@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, send_from_directory, url_for
+from flask import Flask, request, jsonify, send_from_directory, url_for, g, Response
 import subprocess
 import os
 import time
@@ -9,44 +9,2106 @@ import threading
 import uuid
 from datetime import datetime
 import json
+import mimetypes
 import urllib3
+import asyncio
+import atexit
+import importlib.util
+import bisect
+import copy
+import errno
+import hashlib
+import heapq
+import math
+import platform
+import queue
+import random
+import re
+import shutil
+import signal
+import sys
+import tempfile
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+try:
+    import fcntl
+except ImportError:  # Windows - çıktı kilitleri process içi kalır
+    fcntl = None
+from contextlib import contextmanager
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
 
-# SSL uyarılarını bastır
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+def lazy_import(name):
+    """Modülü ilk attribute erişiminde yükle (importlib LazyLoader) - worker açılışı ağır import'u ödemesin"""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+# NumPy sadece analiz/crop-follow job'larında gerekir
+np = lazy_import('numpy')
 
 app = Flask(__name__)
 
-# Kesitlerin kaydedileceği klasör
-CLIPS_FOLDER = "clips"
-Path(CLIPS_FOLDER).mkdir(exist_ok=True)
+# Platform bir kez tespit edilir - ARM64 veya Windows'ta kaynak önce indirilir (URL modu yerine)
+IS_ARM64 = platform.machine() in ('aarch64', 'arm64')
+IS_WINDOWS = platform.system() == 'Windows'
+USE_DOWNLOAD_MODE = IS_ARM64 or IS_WINDOWS
+
+# Kesitlerin kaydedileceği klasör
+CLIPS_FOLDER = "clips"
+
+# Job durumlarını sakla (file-based, worker'lar arası paylaşım için)
+JOBS_FOLDER = "jobs"
+# Job kayıtları bellekte tutulur, diske en fazla JOB_FLUSH_SECONDS'ta bir yazılır (terminal durumlar hemen)
+JOB_FLUSH_SECONDS = float(os.environ.get('JOB_FLUSH_SECONDS', '1'))
+JOB_CACHE_SIZE = int(os.environ.get('JOB_CACHE_SIZE', '1024'))
+TERMINAL_JOB_STATUSES = ('finished', 'failed', 'cancelled')
+# Terminal job kayıtları bu süre sonra silinir (durum başına, saniye)
+JOB_TTL_SECONDS = {
+    'finished': int(os.environ.get('JOB_TTL_FINISHED', '600')),
+    'cancelled': int(os.environ.get('JOB_TTL_CANCELLED', '600')),
+    'failed': int(os.environ.get('JOB_TTL_FAILED', '3600'))
+}
+JOB_REAP_SCAN_SECONDS = int(os.environ.get('JOB_REAP_SCAN_SECONDS', '300'))  # diğer worker'ların/önceki process'in job'ları için tarama
+
+# Batch kayıtları (birden fazla video tek istekte)
+BATCHES_FOLDER = "batches"
+BATCH_TTL_SECONDS = int(os.environ.get('BATCH_TTL_SECONDS', '86400'))  # batch kaydı oluşturulduktan bu süre sonra silinir
+
+# Keyframe index cache'i (video_id başına, iki aşamalı seek için)
+KEYFRAMES_FOLDER = "keyframes"
+KEYFRAME_INDEX_TIMEOUT = 120
+
+# FFprobe metadata cache'i (süre, stream'ler, GOP, bitrate)
+PROBES_FOLDER = "probes"
+PROBE_TIMEOUT = 60
+PROBE_SAMPLE_PACKETS = 300  # GOP tahmini için okunacak paket sayısı
+CLIP_END_TOLERANCE = 0.5  # end, süreyi bu kadar aşabilir (yuvarlama farkları)
+SHORT_GOP_SECONDS = 2  # bundan kısa GOP'ta iki aşamalı seek'in kazancı yok
+
+# Sessizlik/sahne analizi cache'i (video_id başına, otomatik clip sınırları için)
+ANALYSIS_FOLDER = "analysis"
+ANALYSIS_FPS = float(os.environ.get('ANALYSIS_FPS', '4'))  # sahne skoru için örneklenen kare/sn
+ANALYSIS_FRAME_SIZE = (64, 36)  # gri tonlama, düşük çözünürlük (genişlik, yükseklik)
+ANALYSIS_SCENE_THRESHOLD = float(os.environ.get('ANALYSIS_SCENE_THRESHOLD', '0.12'))  # ortalama piksel farkı (0-1)
+ANALYSIS_SILENCE_DB = float(os.environ.get('ANALYSIS_SILENCE_DB', '-35'))
+ANALYSIS_SILENCE_SECONDS = float(os.environ.get('ANALYSIS_SILENCE_SECONDS', '0.4'))
+ANALYSIS_SPEED = 4  # timeout için beklenen decode hızı (x gerçek zaman)
+ANALYSIS_MIN_CLIP = 15
+ANALYSIS_MAX_CLIP = 60
+ANALYSIS_SNAP_TOLERANCE = 2  # saniye - bundan uzaktaki sınıra snap edilmez
+
+# Crop-follow kırpma yörüngesi cache'i (video_id başına, tüm clipler paylaşır)
+REFRAME_FOLDER = "reframe"
+REFRAME_FPS = 2  # yörünge örnekleme sıklığı
+REFRAME_FRAME_SIZE = (160, 90)  # gri tonlama, düşük çözünürlük (genişlik, yükseklik)
+REFRAME_MOTION_WEIGHT = 4.0  # hareket, statik kenar yoğunluğuna göre bu kadar önemli
+REFRAME_SMOOTH_SECONDS = float(os.environ.get('REFRAME_SMOOTH_SECONDS', '2'))  # kamera hareketi yumuşatma penceresi
+REFRAME_KEYPOINT_SECONDS = 1.0  # ffmpeg crop ifadesindeki ara nokta aralığı
+REFRAME_CHUNK_FRAMES = 256  # kareler bu kadarlık parçalarla okunur - bellekte sadece (kare, sütun) enerjisi tutulur
+
+# Aynı anda aktif olabilecek maksimum job sayısı (process başına)
+# Encode eşzamanlılığını CPU_SLOTS sınırlar, burada clipler arası interleave için pay bırakılır
+MAX_ACTIVE_JOBS = int(os.environ.get('MAX_ACTIVE_JOBS', '4'))
+
+# Öncelik sınıfları (küçük değer önce çalışır)
+PRIORITY_CLASSES = {'interactive': 0, 'bulk': 1}
+INTERACTIVE_MAX_CLIPS = int(os.environ.get('INTERACTIVE_MAX_CLIPS', '3'))  # daha büyük işler interactive olamaz
+INTERACTIVE_RESERVED_WORKERS = int(os.environ.get('INTERACTIVE_RESERVED_WORKERS', '1'))
+
+# Batch'lerde paralel URL çözümleme sayısı
+URL_RESOLVE_WORKERS = int(os.environ.get('URL_RESOLVE_WORKERS', '4'))
+
+# Kaynak limitleri (admission control)
+CPU_SLOTS = int(os.environ.get('CPU_SLOTS', str(max(1, (os.cpu_count() or 2) // 2))))
+MAX_CONCURRENT_DOWNLOADS = int(os.environ.get('MAX_CONCURRENT_DOWNLOADS', '2'))
+MAX_DOWNLOAD_BYTES_PER_SEC = int(float(os.environ.get('MAX_DOWNLOAD_MBPS', '0')) * 1024 * 1024)  # 0 = limitsiz
+MIN_FREE_TEMP_BYTES = int(os.environ.get('MIN_FREE_TEMP_MB', '1024')) * 1024 * 1024
+ESTIMATED_SOURCE_BYTES = int(os.environ.get('ESTIMATED_SOURCE_MB', '300')) * 1024 * 1024
+# İndirilen kaynaklar için çalışma alanı - hızlı bir volume (tmpfs / yerel NVMe) önerilir
+WORKSPACE_ROOT = os.environ.get('WORKSPACE_ROOT') or os.path.join(tempfile.gettempdir(), 'clip_api_work')
+WORKSPACE_ORPHAN_SECONDS = int(os.environ.get('WORKSPACE_ORPHAN_SECONDS', '3600'))  # sahipsiz klasörler bu kadar eskiyse silinir
+MAX_QUEUE_SIZE = int(os.environ.get('MAX_QUEUE_SIZE', '20'))
+# CPU/indirme slotları ve disk rezervi host geneli: gunicorn worker'ları bu klasördeki dosya kilitlerini paylaşır
+SCHEDULER_STATE_DIR = os.environ.get('SCHEDULER_STATE_DIR') or os.path.join(tempfile.gettempdir(), 'clip_api_slots')
+HOST_SLOT_POLL_SECONDS = 0.1
+DEFAULT_JOB_SECONDS = 60
+ADMISSION_POLL_SECONDS = 5
+
+# Encoder ayarları (libx264) - calibrate_encoder.py ile host'a göre ölçülür
+ENCODER_CALIBRATION_FILE = os.environ.get('ENCODER_CALIBRATION_FILE', 'encoder_calibration.json')
+ENCODER_TUNE = os.environ.get('ENCODER_TUNE') or None  # örn. film, animation
+ENCODER_TARGET_SPEED = float(os.environ.get('ENCODER_TARGET_SPEED', '1.5'))  # encode hızı / gerçek zaman
+LONG_CLIP_SECONDS = 300
+
+# FFmpeg çalıştırma - ilerleme -progress pipe:1'den satır satır okunur
+FFMPEG_TIMEOUT = 300  # encoder planı olmayan çalıştırmalar için
+# İmzalı kaynak URL'lerine ffmpeg/ffprobe ile giderken gönderilen header'lar (kesim komutlarıyla aynı)
+SOURCE_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36"
+SOURCE_REFERER = "https://downloaderto.com/"
+# Encode timeout'u clip süresi / beklenen encode hızından hesaplanır (min/max arasında)
+FFMPEG_TIMEOUT_BASE = 30  # input açma + seek payı
+FFMPEG_TIMEOUT_MARGIN = float(os.environ.get('FFMPEG_TIMEOUT_MARGIN', '3'))  # beklenen sürenin katı
+FFMPEG_MIN_TIMEOUT = 60
+FFMPEG_MAX_TIMEOUT = int(os.environ.get('FFMPEG_MAX_TIMEOUT', '3600'))
+FFMPEG_STALL_SECONDS = int(os.environ.get('FFMPEG_STALL_SECONDS', '60'))  # out_time bu kadar ilerlemezse takıldı say
+FFMPEG_FALLBACK_SPEED = 0.5  # kalibrasyon/ölçüm yoksa varsayılan encode hızı (x gerçek zaman)
+FFMPEG_STDERR_LINES = 200  # hata analizi için sadece son satırlar tutulur
+PROGRESS_SAVE_SECONDS = float(os.environ.get('PROGRESS_SAVE_SECONDS', '1'))  # job kaydına yazma aralığı
+CANCEL_POLL_SECONDS = 1  # diğer worker'lardan gelen iptal marker'larını kontrol aralığı
+
+# Clip retry - hata sınıfına göre: geçici ağ hataları backoff ile, erişimi reddedilen (süresi dolmuş
+# imzalı) URL'ler get_video_urls ile yeniden çözülerek tekrar denenir, diğerleri hemen başarısız sayılır
+MAX_CLIP_RETRIES = int(os.environ.get('MAX_CLIP_RETRIES', '2'))
+CLIP_RETRY_BACKOFF = float(os.environ.get('CLIP_RETRY_BACKOFF', '2'))  # saniye, her denemede 2 katı
+CLIP_RETRY_POLICY = {
+    'connection': 'retry',
+    'timeout': 'retry',
+    'ssl': 'retry',
+    'stall': 'retry',
+    'download': 'retry',
+    'http_403': 'refresh_urls',
+    'http_404': 'refresh_urls',
+    'invalid_data': 'refresh_urls'
+}
+X264_PRESETS = ['ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium']
+
+# Crash recovery - çalışan job'lar heartbeat dosyası tutar, eskiyenler başka process'te devam ettirilir
+JOB_HEARTBEAT_SECONDS = 10
+JOB_STALE_SECONDS = int(os.environ.get('JOB_STALE_SECONDS', '30'))  # heartbeat bu kadar eskiyse job sahipsiz
+JOB_RECOVERY_INTERVAL = int(os.environ.get('JOB_RECOVERY_INTERVAL', '30'))
+MAX_JOB_RECOVERIES = 2  # her restart'ta çöken job sonsuza kadar tekrar denenmesin
+
+# Instagram Reels profili (9:16 letterbox - üst/alt siyah bar)
+REELS_WIDTH, REELS_HEIGHT = 1080, 1920
+# Yanıtlardaki video_info.resolution: üretilen dosyanın boyutu (kaynağınki source_resolution'da)
+REELS_RESOLUTION = f"{REELS_WIDTH}x{REELS_HEIGHT} (9:16)"
+ENCODER_PROFILE = {
+    'name': 'reels',
+    'video_filter': f"scale={REELS_WIDTH}:{REELS_HEIGHT}:force_original_aspect_ratio=decrease,"
+                    f"pad={REELS_WIDTH}:{REELS_HEIGHT}:(ow-iw)/2:(oh-ih)/2:black",
+    'preset': 'fast',
+    'crf': 23,
+    'audio_args': ["-c:a", "aac", "-b:a", "128k", "-ar", "44100"]
+}
+
+# Çıktı: tek MP4 (+faststart, encode bitince kullanılabilir) veya encode sürerken oynatılabilen fMP4 HLS
+OUTPUT_FORMATS = ('mp4', 'hls')
+HLS_SEGMENT_SECONDS = int(os.environ.get('HLS_SEGMENT_SECONDS', '4'))
+HLS_PLAYLIST = "index.m3u8"
+
+# Dikey çerçeveleme: letterbox (tüm kare + siyah bar) veya crop (içeriği takip eden 9:16 kırpma)
+FRAMING_MODES = ('letterbox', 'crop')
+DEFAULT_FRAMING = os.environ.get('DEFAULT_FRAMING', 'letterbox') if os.environ.get('DEFAULT_FRAMING') in FRAMING_MODES else 'letterbox'
+
+# Önizleme çıktıları (poster, animasyonlu WebP, sprite + VTT) - Reels encode'u ile aynı decode'dan üretilir
+PREVIEW_KINDS = ('thumbnail', 'webp', 'sprite')
+DEFAULT_PREVIEWS = [kind.strip() for kind in os.environ.get('DEFAULT_PREVIEWS', '').split(',') if kind.strip() in PREVIEW_KINDS]
+PREVIEW_POSTER_SECONDS = 1  # poster karesi (clip daha kısaysa ortası)
+PREVIEW_WEBP_SECONDS = 3
+PREVIEW_WEBP_FPS = 10
+SPRITE_THUMB_SIZE = (180, 320)  # Reels çıktısı 9:16
+SPRITE_COLUMNS = 10
+SPRITE_MAX_THUMBS = 100
+
+# Sadece ses job'ları (transkripsiyon) - video indirilmez, encode edilmez
+# 'analysis' job'ları kesim yapmaz, sadece clip sınırı önerir (/api/analyze)
+JOB_MODES = ('video', 'audio')
+AUDIO_FORMATS = {
+    'm4a': {'ext': 'm4a', 'args': ["-c:a", "aac", "-b:a", "128k", "-movflags", "+faststart"]},
+    'flac': {'ext': 'flac', 'args': ["-ac", "1", "-ar", "16000", "-c:a", "flac"]},  # ASR için 16 kHz mono
+    'wav': {'ext': 'wav', 'args': ["-ac", "1", "-ar", "16000", "-c:a", "pcm_s16le"]}
+}
+AUDIO_EXTENSIONS = tuple(f".{audio_format['ext']}" for audio_format in AUDIO_FORMATS.values())
+CLIP_EXTENSIONS = ('.mp4',) + AUDIO_EXTENSIONS
+
+# SaveNow API adresi (benchmark.py yerel stub'a yönlendirir)
+SAVENOW_API_BASE = os.environ.get('SAVENOW_API_BASE', 'https://p.savenow.to').rstrip('/')
+
+_encoder_calibration = None
+_encoder_calibration_mtime = None
+_observed_speeds = {}  # (preset, threads) -> ölçülen encode hızı (EWMA)
+_observed_speeds_lock = threading.Lock()
+
+_source_locks = {}
+_source_locks_guard = threading.Lock()
+
+# Prometheus metrikleri - gunicorn altında PROMETHEUS_MULTIPROC_DIR ile worker'lar
+# arası toplanır (gunicorn.conf.py), tek process'te varsayılan registry kullanılır
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+HTTP_REQUESTS = Counter('clip_api_http_requests_total', 'HTTP istek sayısı', ['endpoint', 'method', 'status'])
+HTTP_LATENCY = Histogram('clip_api_http_request_duration_seconds', 'HTTP istek süresi', ['endpoint'],
+                         buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+STAGE_DURATION = Histogram('clip_api_stage_duration_seconds', 'Aşama süreleri (provider, indirme, encode...)', ['stage'],
+                           buckets=STAGE_BUCKETS)
+PROVIDER_REQUESTS = Counter('clip_api_provider_requests_total', 'Video URL çözümleme sonuçları', ['provider', 'outcome'])
+DOWNLOAD_BYTES = Counter('clip_api_download_bytes_total', 'Kaynaktan indirilen byte', ['kind'])
+CLIPS_TOTAL = Counter('clip_api_clips_total', 'İşlenen clip sayısı', ['outcome'])
+CLIP_ERRORS = Counter('clip_api_clip_errors_total', 'Başarısız clip sayısı (hata sınıfına göre)', ['error_class'])
+CLIP_RETRIES = Counter('clip_api_clip_retries_total', 'Clip tekrar denemeleri', ['error_class', 'action'])
+JOBS_TOTAL = Counter('clip_api_jobs_total', 'Biten job sayısı', ['status'])
+CACHE_LOOKUPS = Counter('clip_api_cache_lookups_total', 'Cache okumaları (probe, keyframes, clip)', ['cache', 'result'])
+QUEUE_DEPTH = Gauge('clip_api_queue_depth', 'Kuyrukta bekleyen job sayısı', multiprocess_mode='livesum')
+JOBS_ACTIVE = Gauge('clip_api_jobs_active', 'Çalışan job sayısı', multiprocess_mode='livesum')
+CPU_SLOTS_IN_USE = Gauge('clip_api_cpu_slots_in_use', 'Kullanılan CPU slot sayısı', multiprocess_mode='livesum')
+CPU_WAITING = Gauge('clip_api_cpu_waiting', 'CPU slot bekleyen clip sayısı', multiprocess_mode='livesum')
+DOWNLOADS_IN_FLIGHT = Gauge('clip_api_downloads_in_flight', 'Devam eden indirme sayısı', multiprocess_mode='livesum')
+
+# Aşama süreleri (span) - job kaydında ve process genelinde toplanır
+MAX_JOB_SPANS = 200
+TIMING_STATS = {}
+_timing_stats_lock = threading.Lock()
+_timing_context = threading.local()
+_job_context = threading.local()  # ffmpeg'in hangi job için çalıştığı (iptal için)
+
+class SpanRecorder:
+    """Bir job'un aşama sürelerini (span) toplar, job kaydına 'timings' olarak yazılır"""
+    
+    def __init__(self, timings=None):
+        timings = timings or {}
+        self.spans = list(timings.get('spans', []))
+        self.totals = {name: dict(total) for name, total in timings.get('totals', {}).items()}
+        self._lock = threading.Lock()
+    
+    def add(self, name, started, duration, attrs=None):
+        span = {'name': name, 'start': datetime.fromtimestamp(started).isoformat(), 'ms': round(duration * 1000, 1)}
+        span.update(attrs or {})
+        with self._lock:
+            # Çok clip'li job'larda kayıt şişmesin - toplamlar her zaman güncellenir
+            if len(self.spans) < MAX_JOB_SPANS:
+                self.spans.append(span)
+            total = self.totals.setdefault(name, {'count': 0, 'total_ms': 0.0})
+            total['count'] += 1
+            total['total_ms'] = round(total['total_ms'] + span['ms'], 1)
+    
+    def summary(self):
+        with self._lock:
+            return {'spans': list(self.spans), 'totals': {name: dict(total) for name, total in self.totals.items()}}
+
+def set_timing_recorder(recorder):
+    """Bu thread'in span'leri yazacağı recorder'ı ayarla, öncekini döndür"""
+    previous = getattr(_timing_context, 'recorder', None)
+    _timing_context.recorder = recorder
+    return previous
+
+def record_span(name, started, duration, **attrs):
+    """Span'i aktif job'a ve process geneli istatistiklere ekle"""
+    duration_ms = duration * 1000
+    with _timing_stats_lock:
+        stats = TIMING_STATS.setdefault(name, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        stats['count'] += 1
+        stats['total_ms'] += duration_ms
+        stats['max_ms'] = max(stats['max_ms'], duration_ms)
+    STAGE_DURATION.labels(stage=name).observe(duration)
+    recorder = getattr(_timing_context, 'recorder', None)
+    if recorder is not None:
+        recorder.add(name, started, duration, attrs)
+
+@contextmanager
+def timed(name, **attrs):
+    """Blok süresini span olarak kaydet - yield edilen dict'e ek alan yazılabilir"""
+    started = time.time()
+    counter = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        record_span(name, started, time.perf_counter() - counter, **attrs)
+
+def timing_stats():
+    """Process genelinde span istatistikleri (ortalama/maksimum)"""
+    with _timing_stats_lock:
+        return {
+            name: {
+                'count': stats['count'],
+                'avg_ms': round(stats['total_ms'] / stats['count'], 1),
+                'max_ms': round(stats['max_ms'], 1),
+                'total_ms': round(stats['total_ms'], 1)
+            }
+            for name, stats in sorted(TIMING_STATS.items())
+        }
+
+def file_version(path):
+    """Dosyanın sürümü (başka bir worker yeniden yazınca değişir), dosya yoksa None"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+class JobRecord:
+    """Cache'teki tek job kaydı"""
+    __slots__ = ('data', 'version', 'dirty', 'written_at')
+    
+    def __init__(self, data, version=None):
+        self.data = data
+        self.version = version  # diskte bildiğimiz dosyanın sürümü (file_version)
+        self.dirty = False  # bellekteki içerik diske henüz yazılmadı
+        self.written_at = 0.0  # son disk yazımı (monotonic)
+
+class JobStore:
+    """
+    Job kayıtlarının process içi cache'i (write-behind)
+    
+    Okuma, dosyanın sürümü değişmediyse bellekten döner; başka worker'ın yazdığı kayıt
+    mtime/size/inode değişiminden anlaşılıp yeniden okunur. Yazmalar job başına en fazla
+    `interval`'da bir diske iner (aradaki güncellemeler birleşir), terminal durumlar hemen yazılır.
+    """
+    
+    def __init__(self, interval, max_records):
+        self.interval = interval
+        self.max_records = max_records
+        self._records = OrderedDict()  # dosya yolu -> JobRecord (JOBS_FOLDER değişse de karışmaz)
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._flusher = None
+    
+    def get(self, path):
+        with self._lock:
+            record = self._records.get(path)
+            if record is not None and record.dirty:
+                return copy.deepcopy(record.data)
+        
+        version = file_version(path)
+        with self._lock:
+            record = self._records.get(path)
+            if record is not None and (record.dirty or (version is not None and record.version == version)):
+                self._records.move_to_end(path)
+                return copy.deepcopy(record.data)
+            if version is None:
+                self._records.pop(path, None)
+                return None
+        
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                version = file_version(path)
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            record = self._records.get(path)
+            if record is None or not record.dirty:
+                self._records[path] = JobRecord(data, version)
+                self._records.move_to_end(path)
+                self._evict()
+        return copy.deepcopy(data)
+    
+    def save(self, path, data, sync=False):
+        data = copy.deepcopy(data)
+        with self._lock:
+            record = self._records.get(path)
+            if record is None:
+                record = self._records[path] = JobRecord(data)
+            record.data = data
+            record.dirty = True
+            self._records.move_to_end(path)
+            due = sync or data.get('status') in TERMINAL_JOB_STATUSES or time.monotonic() - record.written_at >= self.interval
+        if due:
+            self._write(path)
+        else:
+            self._ensure_flusher()
+    
+    def forget(self, path):
+        """Silinen job'un bekleyen yazımı dosyayı geri getirmesin"""
+        with self._lock:
+            self._records.pop(path, None)
+    
+    def flush(self):
+        """Bekleyen tüm yazımları diske indir (çıkışta ve testlerde)"""
+        with self._lock:
+            paths = [path for path, record in self._records.items() if record.dirty]
+        for path in paths:
+            self._write(path)
+    
+    def _write(self, path):
+        with self._write_lock:
+            with self._lock:
+                record = self._records.get(path)
+                if record is None or not record.dirty:
+                    return
+                # Yazdığımız dosya bu arada silindiyse (job silindi) geri oluşturma
+                if record.version is not None and file_version(path) is None:
+                    self._records.pop(path, None)
+                    return
+                data = record.data
+                record.dirty = False
+            
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                with timed('job.save'), open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                # Diğer worker'lar yarım yazılmış dosya okumasın
+                os.replace(temp_path, path)
+            except OSError as e:
+                print(f"⚠️ Job kaydı yazılamadı ({path}): {e}")
+                with self._lock:
+                    self._records.pop(path, None)
+                return
+            
+            with self._lock:
+                record.version = file_version(path)
+                record.written_at = time.monotonic()
+    
+    def _evict(self):
+        # En eski, diske yazılmış kayıtlar bellekten düşer
+        for path in list(self._records):
+            if len(self._records) <= self.max_records:
+                break
+            if not self._records[path].dirty:
+                del self._records[path]
+    
+    def _ensure_flusher(self):
+        # Flush thread'ini ilk ertelenen yazımda başlat (import sırasında thread açma)
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+                self._flusher.start()
+    
+    def _flush_loop(self):
+        while True:
+            time.sleep(max(self.interval / 4, 0.05))
+            now = time.monotonic()
+            with self._lock:
+                due = [path for path, record in self._records.items()
+                       if record.dirty and now - record.written_at >= self.interval]
+            for path in due:
+                self._write(path)
+
+JOB_STORE = JobStore(JOB_FLUSH_SECONDS, JOB_CACHE_SIZE)
+atexit.register(JOB_STORE.flush)
+
+def job_path(job_id):
+    return os.path.join(JOBS_FOLDER, f"{job_id}.json")
+
+def get_job(job_id):
+    """Job'u oku (değişmediyse bellekten)"""
+    return JOB_STORE.get(job_path(job_id))
+
+def save_job(job_id, job_data, sync=False):
+    """Job'u kaydet - diske yazım ertelenip birleştirilir, terminal durum veya sync=True ise hemen yazılır"""
+    status = job_data.get('status')
+    if status in TERMINAL_JOB_STATUSES and 'expires_at' not in job_data:
+        # Silinme zamanı kayıtla birlikte saklanır (restart sonrası reaper taramada bulur)
+        job_data['expires_at'] = time.time() + JOB_TTL_SECONDS[status]
+        JOB_REAPER.schedule(job_id, job_data['expires_at'])
+    JOB_STORE.save(job_path(job_id), job_data, sync)
+
+def delete_job(job_id):
+    """Job dosyasını (ve varsa iptal marker'ı/heartbeat'i) sil"""
+    JOB_STORE.forget(job_path(job_id))
+    for path in (job_path(job_id), cancel_marker_path(job_id), heartbeat_path(job_id)):
+        if os.path.exists(path):
+            os.remove(path)
+
+def cancel_marker_path(job_id):
+    return os.path.join(JOBS_FOLDER, f"{job_id}.cancel")
+
+def heartbeat_path(job_id):
+    return os.path.join(JOBS_FOLDER, f"{job_id}.heartbeat")
+
+def initial_clip_states(clips):
+    """Clip bazında kalıcı durum (pending/running/done/failed) - restart sonrası devam için"""
+    return [
+        {'index': idx, 'start': clip.get('start'), 'end': clip.get('end'), 'state': 'pending'}
+        for idx, clip in enumerate(clips)
+    ]
+
+def update_clip_state(job_id, index, state, **fields):
+    """Tek clip'in durumunu job kaydına yaz"""
+    job = get_job(job_id)
+    if not job or not job.get('clip_states'):
+        return
+    job['clip_states'][index]['state'] = state
+    job['clip_states'][index].update(fields)
+    save_job(job_id, job)
+
+def is_job_cancelled(job_id):
+    """İptal marker'ı var mı (gunicorn worker'ları arasında dosya üzerinden paylaşılır)"""
+    return bool(job_id) and os.path.exists(cancel_marker_path(job_id))
+
+def get_batch(batch_id):
+    """Batch'i dosyadan oku"""
+    batch_file = os.path.join(BATCHES_FOLDER, f"{batch_id}.json")
+    if os.path.exists(batch_file):
+        with open(batch_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return None
+
+def save_batch(batch_id, batch_data):
+    """Batch'i dosyaya kaydet"""
+    batch_file = os.path.join(BATCHES_FOLDER, f"{batch_id}.json")
+    with open(batch_file, 'w', encoding='utf-8') as f:
+        json.dump(batch_data, f, ensure_ascii=False, indent=2)
+    if 'expires_at' in batch_data:
+        JOB_REAPER.schedule(batch_id, batch_data['expires_at'], kind='batch')
+
+def delete_batch(batch_id):
+    """Batch dosyasını sil (job'ları kendi TTL'leriyle silinir)"""
+    batch_file = os.path.join(BATCHES_FOLDER, f"{batch_id}.json")
+    if os.path.exists(batch_file):
+        os.remove(batch_file)
+
+def generate_clip_filename(video_id, start, end, framing='letterbox'):
+    """Dosya adı oluştur: videoID-start-end_reels.mp4 (crop modunda _reels_crop.mp4)"""
+    if framing == 'crop':
+        return f"{video_id}-{start}-{end}_reels_crop.mp4"
+    return f"{video_id}-{start}-{end}_reels.mp4"
+
+def hls_playlist_name(clip_filename):
+    """HLS çıktısının playlist yolu (CLIPS_FOLDER'a göre): <clip>_hls/index.m3u8"""
+    base = clip_filename[:-len('.mp4')] if clip_filename.endswith('.mp4') else clip_filename
+    return f"{base}_hls/{HLS_PLAYLIST}"
+
+def read_hls_playlist(playlist_path):
+    """Playlist'teki hazır segment sayısı ve encode'un bitip bitmediği -> (segments, complete)"""
+    try:
+        with open(playlist_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except OSError:
+        return 0, False
+    return content.count('#EXTINF'), '#EXT-X-ENDLIST' in content
+
+def clip_output_size(output_path):
+    """Çıktının diskteki boyutu (HLS'te playlist klasöründeki tüm segmentler)"""
+    if not output_path.endswith('.m3u8'):
+        return os.path.getsize(output_path)
+    directory = os.path.dirname(output_path)
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+def remove_clip_output(output_path):
+    """Hatalı/boş çıktıyı sil (HLS'te playlist klasörüyle birlikte)"""
+    if output_path.endswith('.m3u8'):
+        shutil.rmtree(os.path.dirname(output_path), ignore_errors=True)
+    elif os.path.exists(output_path):
+        os.remove(output_path)
+
+def partial_output_path(output_path):
+    """
+    Encode'un yazılacağı yol: tek dosyalık çıktılar CLIPS_FOLDER/.partial altında geçici adla yazılır
+    
+    Son ada sadece tamamlanınca (finish_clip_output) taşınır; çöken bir encode'un yarım dosyası
+    diğer job'lara "mevcut kesit" görünmez. HLS klasörü encode sürerken sunulduğu için yerinde yazılır.
+    """
+    if output_path.endswith('.m3u8'):
+        return output_path
+    partial_dir = os.path.join(os.path.dirname(output_path), '.partial')
+    os.makedirs(partial_dir, exist_ok=True)
+    return os.path.join(partial_dir, f"{uuid.uuid4().hex[:12]}-{os.path.basename(output_path)}")
+
+def finish_clip_output(encode_path, output_path):
+    """Tamamlanan encode'u son adına atomik olarak taşı"""
+    if encode_path != output_path:
+        os.replace(encode_path, output_path)
+
+def sweep_partial_outputs():
+    """Çöken process'lerden kalan geçici encode dosyalarını sil (WORKSPACE_ORPHAN_SECONDS'tan eski olanlar)"""
+    partial_dir = os.path.join(CLIPS_FOLDER, '.partial')
+    if not os.path.isdir(partial_dir):
+        return
+    for name in os.listdir(partial_dir):
+        path = os.path.join(partial_dir, name)
+        try:
+            if time.time() - os.path.getmtime(path) > WORKSPACE_ORPHAN_SECONDS:
+                os.remove(path)
+                print(f"🗑️ Sahipsiz geçici çıktı silindi: {name}")
+        except OSError:
+            pass
+
+def prepare_clip_output(output_path):
+    """HLS klasörünü temiz başlat (yarım kalmış önceki segmentler karışmasın)"""
+    if output_path.endswith('.m3u8'):
+        directory = os.path.dirname(output_path)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+def output_container_args(output_path):
+    """Çıktı muxer argümanları: MP4 (+faststart) veya segment segment yazılan fMP4 HLS (event playlist)"""
+    if not output_path.endswith('.m3u8'):
+        return ["-movflags", "+faststart", "-y", output_path]
+    directory = os.path.dirname(output_path)
+    return [
+        # Segment sınırlarında keyframe olsun (her segment bağımsız oynatılabilsin)
+        "-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
+        "-f", "hls",
+        "-hls_time", str(HLS_SEGMENT_SECONDS),
+        "-hls_playlist_type", "event",
+        "-hls_segment_type", "fmp4",
+        "-hls_fmp4_init_filename", "init.mp4",
+        "-hls_segment_filename", os.path.join(directory, "seg_%05d.m4s"),
+        "-hls_flags", "independent_segments+temp_file",
+        "-y", output_path
+    ]
+
+def generate_audio_filename(video_id, start, end, audio_format='m4a'):
+    """Ses kesiti dosya adı: videoID-start-end_audio.<ext>"""
+    return f"{video_id}-{start}-{end}_audio.{AUDIO_FORMATS[audio_format]['ext']}"
+
+def job_clip_filenames(video_id, clips, mode='video', audio_format='m4a', framing='letterbox', output_format='mp4'):
+    """Job'un üreteceği dosya adları (start/end'i olan clipler için)"""
+    return [
+        generate_audio_filename(video_id, c.get('start'), c.get('end'), audio_format) if mode == 'audio'
+        else hls_playlist_name(generate_clip_filename(video_id, c.get('start'), c.get('end'), framing)) if output_format == 'hls'
+        else generate_clip_filename(video_id, c.get('start'), c.get('end'), framing)
+        for c in clips if c.get('start') is not None and c.get('end') is not None
+    ]
+
+def validate_job_mode(mode, audio_format, framing='letterbox', output_format='mp4'):
+    """İstekteki mode/audio_format/framing/output geçerli mi? Geçersizse hata mesajı döner"""
+    if mode not in JOB_MODES:
+        return f"mode şunlardan biri olmalı: {', '.join(JOB_MODES)}"
+    if audio_format not in AUDIO_FORMATS:
+        return f"audio_format şunlardan biri olmalı: {', '.join(AUDIO_FORMATS)}"
+    if framing not in FRAMING_MODES:
+        return f"framing şunlardan biri olmalı: {', '.join(FRAMING_MODES)}"
+    if output_format not in OUTPUT_FORMATS:
+        return f"output şunlardan biri olmalı: {', '.join(OUTPUT_FORMATS)}"
+    if output_format == 'hls' and mode != 'video':
+        return "output: hls sadece video job'larında kullanılabilir"
+    return None
+
+def clip_duration(start, end):
+    """Clip süresi (saniye), sayıya çevrilemiyorsa None"""
+    try:
+        return float(end) - float(start)
+    except (TypeError, ValueError):
+        return None
+
+def load_encoder_calibration():
+    """calibrate_encoder.py çıktısını oku (dosya değişirse yeniden yüklenir)"""
+    global _encoder_calibration, _encoder_calibration_mtime
+    try:
+        mtime = os.path.getmtime(ENCODER_CALIBRATION_FILE)
+    except OSError:
+        return None
+    if _encoder_calibration is None or mtime != _encoder_calibration_mtime:
+        try:
+            with open(ENCODER_CALIBRATION_FILE, 'r', encoding='utf-8') as f:
+                _encoder_calibration = json.load(f)
+            _encoder_calibration_mtime = mtime
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Encoder kalibrasyonu okunamadı: {e}")
+            return None
+    return _encoder_calibration
+
+def select_preset(duration, threads, calibration=None, source_fps=None):
+    """Clip süresi ve thread sayısına göre en kaliteli yeterince hızlı preset'i seç"""
+    long_clip = duration is not None and duration > LONG_CLIP_SECONDS
+    
+    if not calibration or not calibration.get('presets'):
+        # Kalibrasyon yok - uzun clipler slot'u uzun süre tutmasın
+        if long_clip:
+            return 'veryfast'
+        return 'faster' if duration is not None and duration > 60 else ENCODER_PROFILE['preset']
+    
+    # Uzun clipler için daha yüksek hız hedefi
+    target_speed = ENCODER_TARGET_SPEED * (2 if long_clip else 1)
+    calibration_threads = max(1, calibration.get('threads', 1))
+    # Gerçek zaman hızı kaynağın fps'ine göre (probe varsa)
+    source_fps = source_fps or calibration.get('source_fps', 30)
+    
+    best = X264_PRESETS[0]
+    for preset in X264_PRESETS:
+        fps = calibration['presets'].get(preset)
+        if not fps:
+            continue
+        # Ölçüm tüm çekirdeklerle yapıldı - bu encode'a düşen thread oranında ölçekle
+        speed = fps * min(1.0, threads / calibration_threads) / source_fps
+        if speed >= target_speed:
+            best = preset
+    return best
+
+def record_encode_speed(preset, threads, speed):
+    """Başarılı bir encode'un -progress'ten ölçülen hızını kaydet"""
+    if not speed or speed <= 0:
+        return
+    with _observed_speeds_lock:
+        previous = _observed_speeds.get((preset, threads))
+        _observed_speeds[(preset, threads)] = speed if previous is None else 0.7 * previous + 0.3 * speed
+
+def expected_encode_speed(preset, threads, calibration=None, source_fps=None):
+    """Bu host'ta beklenen encode hızı (x gerçek zaman): önce ölçülen, sonra kalibrasyon"""
+    with _observed_speeds_lock:
+        observed = _observed_speeds.get((preset, threads))
+    if observed:
+        return observed
+    
+    if calibration and calibration.get('presets', {}).get(preset):
+        calibration_threads = max(1, calibration.get('threads', 1))
+        source_fps = source_fps or calibration.get('source_fps', 30)
+        return calibration['presets'][preset] * min(1.0, threads / calibration_threads) / source_fps
+    return FFMPEG_FALLBACK_SPEED
+
+def ffmpeg_timeout(duration, speed):
+    """Clip süresi ve beklenen hızdan encode timeout'u (saniye)"""
+    if not duration or duration <= 0:
+        return FFMPEG_TIMEOUT
+    expected = duration / max(speed or FFMPEG_FALLBACK_SPEED, 0.05)
+    return int(min(max(FFMPEG_TIMEOUT_BASE + expected * FFMPEG_TIMEOUT_MARGIN, FFMPEG_MIN_TIMEOUT), FFMPEG_MAX_TIMEOUT))
+
+def plan_encoder(duration, probe=None):
+    """Eşzamanlı encode sayısı, clip süresi ve kaynak fps'ine göre libx264 ayarlarını belirle"""
+    cores = os.cpu_count() or 1
+    # Çekirdekleri slot limitinin izin verdiği eşzamanlı encode sayısına böl - o an çalışan sayıya göre
+    # değil, yoksa boşta başlayan encode tüm çekirdekleri alır ve toplam CPU'yu aşar (slotlar host
+    # geneli olduğu için gunicorn worker sayısından bağımsız)
+    concurrent = max(1, SCHEDULER.cpu_slots)
+    threads = max(1, cores // concurrent)
+    calibration = load_encoder_calibration()
+    source_fps = ((probe or {}).get('video') or {}).get('fps')
+    preset = select_preset(duration, threads, calibration, source_fps)
+    speed = expected_encode_speed(preset, threads, calibration, source_fps)
+    
+    return {
+        'preset': preset,
+        'tune': ENCODER_TUNE,
+        'threads': threads,
+        'filter_threads': max(1, threads // 2),
+        # Çok sayıda paralel encode'da lookahead bellek/gecikme maliyetini düşür
+        'x264_params': 'rc-lookahead=20' if threads <= 2 else None,
+        'concurrent_encodes': concurrent,
+        'expected_speed': round(speed, 3),
+        'timeout': ffmpeg_timeout(duration, speed)
+    }
+
+def encoder_video_args(plan):
+    """Plan'dan FFmpeg video encode argümanlarını oluştur"""
+    args = ["-c:v", "libx264", "-preset", plan['preset'], "-crf", str(ENCODER_PROFILE['crf']), "-threads", str(plan['threads'])]
+    if plan.get('tune'):
+        args += ["-tune", plan['tune']]
+    if plan.get('x264_params'):
+        args += ["-x264-params", plan['x264_params']]
+    return args
+
+_ffmpeg_encoders = None
+
+def ffmpeg_has_encoder(name):
+    """Kurulu ffmpeg bu encoder'ı destekliyor mu (ilk çağrıda bir kez sorgulanır)"""
+    global _ffmpeg_encoders
+    if _ffmpeg_encoders is None:
+        try:
+            output = subprocess.run(["ffmpeg", "-hide_banner", "-encoders"], capture_output=True, text=True, timeout=30).stdout
+        except (OSError, subprocess.SubprocessError):
+            output = ''
+        _ffmpeg_encoders = {line.split()[1] for line in output.splitlines() if line.startswith(' ') and len(line.split()) > 1}
+    return name in _ffmpeg_encoders
+
+def preview_filenames(clip_filename, previews):
+    """Clip dosya adından istenen önizlemelerin dosya adları"""
+    base = os.path.splitext(clip_filename)[0] if clip_filename.endswith(('.mp4', '.m3u8')) else clip_filename
+    names = {}
+    if 'thumbnail' in previews:
+        names['thumbnail'] = f"{base}.jpg"
+    if 'webp' in previews:
+        names['webp'] = f"{base}.webp"
+    if 'sprite' in previews:
+        names['sprite'] = f"{base}_sprite.jpg"
+        names['sprite_vtt'] = f"{base}_sprite.vtt"
+    return names
+
+def sprite_layout(duration):
+    """Sprite için (aralık saniyesi, kare sayısı, sütun, satır)"""
+    interval = max(1, math.ceil(duration / SPRITE_MAX_THUMBS))
+    count = max(1, math.ceil(duration / interval))
+    columns = min(count, SPRITE_COLUMNS)
+    return interval, count, columns, math.ceil(count / columns)
+
+def build_preview_outputs(preview_names, duration, offset=0, video_filter=None):
+    """
+    Önizleme dallarını filter_complex'e ekle -> (filter_complex, önizleme output argümanları)
+    
+    Decode edilen kareler split ile çoğaltılır; video_filter verilirse Reels filtresi bir kez
+    uygulanır ve ana çıktı [main] etiketiyle map edilmelidir. Dalların kendi trim'i var
+    (output -ss, tile gibi EOF'ta çıktı veren filtrelerde kareyi atıyor).
+    """
+    branches = []
+    args = []
+    if 'thumbnail' in preview_names:
+        poster_at = offset + min(PREVIEW_POSTER_SECONDS, duration / 2)
+        branches.append(('pt', f"trim=start={poster_at:.3f}:duration=1,setpts=PTS-STARTPTS,scale=540:-2"))
+        args += ["-map", "[pt]", "-frames:v", "1", "-q:v", "3", "-y", os.path.join(CLIPS_FOLDER, preview_names['thumbnail'])]
+    if 'webp' in preview_names:
+        branches.append(('pw', f"trim=start={offset:.3f}:duration={min(PREVIEW_WEBP_SECONDS, duration):.3f},setpts=PTS-STARTPTS,"
+                               f"fps={PREVIEW_WEBP_FPS},scale=270:-2"))
+        args += ["-map", "[pw]", "-c:v", "libwebp_anim", "-loop", "0", "-quality", "60", "-an", "-y",
+                 os.path.join(CLIPS_FOLDER, preview_names['webp'])]
+    if 'sprite' in preview_names:
+        interval, count, columns, rows = sprite_layout(duration)
+        width, height = SPRITE_THUMB_SIZE
+        branches.append(('ps', f"trim=start={offset:.3f}:duration={duration:.3f},setpts=PTS-STARTPTS,"
+                               f"fps=1/{interval},scale={width}:{height},tile={columns}x{rows}"))
+        args += ["-map", "[ps]", "-frames:v", "1", "-update", "1", "-q:v", "4", "-y", os.path.join(CLIPS_FOLDER, preview_names['sprite'])]
+    
+    labels = (['main'] if video_filter else []) + [label for label, _ in branches]
+    head = f"{video_filter}," if video_filter else ""
+    graph = f"[0:v:0]{head}split={len(labels)}" + ''.join(f"[{label}_in]" if label != 'main' else "[main]" for label in labels)
+    graph += ''.join(f";[{label}_in]{chain}[{label}]" for label, chain in branches)
+    return graph, args
+
+def reels_video_args(preview_names, duration, offset=0, video_filter=None):
+    """Ana çıktının video argümanları + aynı decode'dan önizleme çıktıları -> (video_args, preview_args)"""
+    video_filter = video_filter or ENCODER_PROFILE['video_filter']
+    if not preview_names:
+        return ["-map", "0:v:0", "-vf", video_filter], []
+    graph, preview_args = build_preview_outputs(preview_names, duration, offset, video_filter)
+    return ["-filter_complex", graph, "-map", "[main]"], preview_args
+
+def write_sprite_vtt(vtt_path, sprite_filename, duration):
+    """Sprite karelerinin zaman aralıklarını WebVTT olarak yaz (#xywh ile)"""
+    interval, count, columns, _ = sprite_layout(duration)
+    width, height = SPRITE_THUMB_SIZE
+    
+    def stamp(seconds):
+        return f"{int(seconds // 3600):02d}:{int(seconds % 3600 // 60):02d}:{seconds % 60:06.3f}"
+    
+    lines = ["WEBVTT", ""]
+    for index in range(count):
+        cue_start = index * interval
+        cue_end = min((index + 1) * interval, duration)
+        lines += [
+            f"{stamp(cue_start)} --> {stamp(cue_end)}",
+            f"{sprite_filename}#xywh={index % columns * width},{index // columns * height},{width},{height}",
+            ""
+        ]
+    with open(vtt_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines))
+
+def collect_previews(preview_names, duration):
+    """Oluşan önizlemeleri (gerekirse VTT yazarak) {tür: dosya adı} olarak döndür"""
+    previews = {}
+    for kind, filename in preview_names.items():
+        if kind == 'sprite_vtt':
+            continue
+        path = os.path.join(CLIPS_FOLDER, filename)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            previews[kind] = filename
+        else:
+            print(f"⚠️ Önizleme oluşturulamadı: {filename}")
+    if 'sprite' in previews:
+        write_sprite_vtt(os.path.join(CLIPS_FOLDER, preview_names['sprite_vtt']), previews['sprite'], duration)
+        previews['sprite_vtt'] = preview_names['sprite_vtt']
+    return previews
+
+def requested_previews(previews):
+    """İstenen önizleme türleri (libwebp olmayan ffmpeg'de WebP atlanır)"""
+    previews = [kind for kind in PREVIEW_KINDS if kind in (previews or [])]
+    if 'webp' in previews and not ffmpeg_has_encoder('libwebp_anim'):
+        print(f"⚠️ ffmpeg libwebp_anim desteklemiyor - WebP önizleme atlanıyor")
+        previews.remove('webp')
+    return previews
+
+def ensure_previews(clip_filename, previews, duration):
+    """Cache'teki clip için eksik önizlemeleri (küçük Reels çıktısından) üret"""
+    preview_names = preview_filenames(clip_filename, requested_previews(previews))
+    missing = {
+        kind: filename for kind, filename in preview_names.items()
+        if kind != 'sprite_vtt' and not os.path.exists(os.path.join(CLIPS_FOLDER, filename))
+    }
+    if missing:
+        if 'sprite' in missing:
+            missing['sprite_vtt'] = preview_names['sprite_vtt']
+        graph, preview_args = build_preview_outputs(missing, duration)
+        cmd = ["ffmpeg", "-i", os.path.join(CLIPS_FOLDER, clip_filename), "-filter_complex", graph, *preview_args]
+        try:
+            with timed('clip.previews'):
+                run_ffmpeg(cmd, duration)
+        except subprocess.TimeoutExpired:
+            print(f"⚠️ Önizleme üretimi zaman aşımına uğradı: {clip_filename}")
+    return collect_previews(preview_names, duration)
+
+def source_lock(kind, video_id):
+    """Aynı video için paralel job'lar aynı cache'i tekrar tekrar üretmesin"""
+    with _source_locks_guard:
+        return _source_locks.setdefault((kind, video_id), threading.Lock())
+
+@contextmanager
+def output_lock(output_file):
+    """
+    CLIPS_FOLDER'daki bir çıktı için process'ler arası kilit (gunicorn worker'ları dahil)
+    
+    Thread'ler source_lock ile, process'ler CLIPS_FOLDER/.locks/<çıktı>.lock üzerinde flock ile
+    sıralanır. Kilit dosyaları silinmez (silmek flock'u yarışa açar).
+    """
+    with source_lock('clip', output_file):
+        if fcntl is None:
+            yield
+            return
+        lock_dir = os.path.join(CLIPS_FOLDER, '.locks')
+        os.makedirs(lock_dir, exist_ok=True)
+        with open(os.path.join(lock_dir, output_file.replace('/', '_') + '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def parse_frame_rate(value):
+    """FFprobe frame rate'i ("30000/1001") float'a çevir"""
+    try:
+        numerator, _, denominator = str(value).partition('/')
+        rate = float(numerator) / float(denominator or 1)
+        return round(rate, 3) if rate > 0 else None
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+
+def summarize_probe(data):
+    """FFprobe JSON çıktısından cache'lenecek özet bilgiyi çıkar"""
+    fmt = data.get('format', {})
+    streams = data.get('streams', [])
+    video = next((stream for stream in streams if stream.get('codec_type') == 'video'), None)
+    audio = next((stream for stream in streams if stream.get('codec_type') == 'audio'), None)
+    
+    duration = None
+    for value in (fmt.get('duration'), (video or {}).get('duration')):
+        try:
+            duration = float(value)
+            break
+        except (TypeError, ValueError):
+            continue
+    
+    # İlk paketlerden keyframe aralığını (GOP) tahmin et
+    keyframes = []
+    if video:
+        for packet in data.get('packets', []):
+            if packet.get('stream_index') != video.get('index') or 'K' not in packet.get('flags', ''):
+                continue
+            try:
+                keyframes.append(float(packet['pts_time']))
+            except (KeyError, TypeError, ValueError):
+                continue
+    keyframes.sort()
+    intervals = sorted(b - a for a, b in zip(keyframes, keyframes[1:]) if b > a)
+    
+    return {
+        'duration': duration,
+        'bit_rate': int(fmt['bit_rate']) if str(fmt.get('bit_rate', '')).isdigit() else None,
+        'size': int(fmt['size']) if str(fmt.get('size', '')).isdigit() else None,
+        'format': fmt.get('format_name'),
+        'video': {
+            'codec': video.get('codec_name'),
+            'width': video.get('width'),
+            'height': video.get('height'),
+            'fps': parse_frame_rate(video.get('avg_frame_rate')) or parse_frame_rate(video.get('r_frame_rate')),
+            'frame_rate': video.get('r_frame_rate'),
+            'time_base': video.get('time_base'),
+            'profile': video.get('profile'),
+            'pix_fmt': video.get('pix_fmt')
+        } if video else None,
+        'audio': {
+            'codec': audio.get('codec_name'),
+            'sample_rate': int(audio['sample_rate']) if str(audio.get('sample_rate', '')).isdigit() else None,
+            'channels': audio.get('channels')
+        } if audio else None,
+        'keyframe_interval': round(intervals[len(intervals) // 2], 3) if intervals else None
+    }
+
+def probe_source(source):
+    """FFprobe ile kaynağın süre, stream ve bitrate bilgisini al (sadece header + ilk paketler)"""
+    cmd = [
+        "ffprobe", "-v", "error",
+        "-read_intervals", f"%+#{PROBE_SAMPLE_PACKETS}",
+        "-show_entries", "packet=stream_index,pts_time,flags",
+        "-show_format", "-show_streams",
+        "-of", "json",
+        *source_input_args(source),
+        source
+    ]
+    result = run_probe(cmd, PROBE_TIMEOUT)
+    if result.returncode != 0:
+        print(f"⚠️ FFprobe hatası: {result.stderr[:200]}")
+        return None
+    return summarize_probe(json.loads(result.stdout or '{}'))
+
+def get_source_probe(video_id, source, build=True):
+    """Probe bilgisini cache'ten oku, yoksa bir kez ffprobe çalıştır ve kaydet"""
+    probe_file = os.path.join(PROBES_FOLDER, f"{video_id}.json")
+    
+    with source_lock('probe', video_id):
+        if os.path.exists(probe_file):
+            try:
+                with open(probe_file, 'r', encoding='utf-8') as f:
+                    probe = json.load(f)
+                CACHE_LOOKUPS.labels(cache='probe', result='hit').inc()
+                return probe
+            except (OSError, ValueError):
+                pass
+        
+        if not build or not source:
+            return None
+        CACHE_LOOKUPS.labels(cache='probe', result='miss').inc()
+        
+        try:
+            with timed('source.probe'):
+                probe = probe_source(source)
+        except (OSError, ValueError, subprocess.TimeoutExpired) as e:
+            print(f"⚠️ Probe hatası: {str(e)[:200]}")
+            return None
+        
+        if not probe or not probe.get('duration'):
+            return None
+        
+        probe['video_id'] = video_id
+        probe['probed_at'] = datetime.now().isoformat()
+        temp_probe = f"{probe_file}.{os.getpid()}.tmp"
+        with open(temp_probe, 'w', encoding='utf-8') as f:
+            json.dump(probe, f, ensure_ascii=False, indent=2)
+        os.replace(temp_probe, probe_file)
+        
+        video = probe.get('video') or {}
+        print(f"🔎 Probe: {probe['duration']:.1f}s, {video.get('width')}x{video.get('height')} {video.get('codec')} @ {video.get('fps')}fps, GOP ~{probe.get('keyframe_interval')}s")
+        return probe
+
+def probe_resolution(probe, default):
+    """Probe'dan kaynak çözünürlük metni (örn. 1280x720)"""
+    video = (probe or {}).get('video') or {}
+    if video.get('width') and video.get('height'):
+        return f"{video['width']}x{video['height']}"
+    return default
+
+def validate_clip_range(start, end, probe=None):
+    """Clip aralığı geçerli mi? Geçersizse hata mesajı döner"""
+    try:
+        start = float(start)
+        end = float(end)
+    except (TypeError, ValueError):
+        return 'start ve end sayı olmalı'
+    
+    if start < 0:
+        return 'start negatif olamaz'
+    if end <= start:
+        return 'end, start değerinden büyük olmalı'
+    
+    duration = (probe or {}).get('duration')
+    if duration:
+        if start >= duration:
+            return f"start ({start}s) video süresini ({round(duration, 2)}s) aşıyor"
+        if end > duration + CLIP_END_TOLERANCE:
+            return f"end ({end}s) video süresini ({round(duration, 2)}s) aşıyor"
+    return None
+
+def find_invalid_clips(video_id, clips, require_range=False):
+    """
+    Cache'teki probe'a göre imkansız clip aralıklarını bul (network'e gitmeden)
+    
+    require_range=True ise start/end eksik veya sayı olmayan clipler de geçersiz sayılır (batch).
+    """
+    probe = get_source_probe(video_id, None, build=False)
+    invalid = []
+    for idx, clip in enumerate(clips):
+        if not isinstance(clip, dict):
+            invalid.append({'index': idx, 'error': 'clip start/end içeren bir nesne olmalı', 'clip': clip})
+            continue
+        if not require_range and (clip.get('start') is None or clip.get('end') is None):
+            continue
+        error = validate_clip_range(clip.get('start'), clip.get('end'), probe)
+        if error:
+            invalid.append({'index': idx, 'error': error, 'clip': clip})
+    return invalid
+
+def build_keyframe_index(source):
+    """ffprobe ile video stream'indeki keyframe zamanlarını çıkar (decode etmeden, sadece paketler)"""
+    cmd = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags",
+        "-of", "csv=p=0",
+        *source_input_args(source),
+        source
+    ]
+    result = run_probe(cmd, KEYFRAME_INDEX_TIMEOUT)
+    if result.returncode != 0:
+        print(f"⚠️ Keyframe index oluşturulamadı: {result.stderr[:200]}")
+        return None
+    
+    keyframes = set()
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' not in flags:
+            continue
+        try:
+            keyframes.add(round(float(pts_time), 3))
+        except ValueError:
+            continue
+    return sorted(keyframes) or None
+
+def get_keyframe_index(video_id, source, build=True):
+    """
+    Keyframe index'i cache'ten oku, yoksa bir kez oluştur ve kaydet
+    
+    İndirilen muxed dosya ile URL'deki stream'in zaman damgaları farklı olabilir - cache kaynak türüne göre ayrı.
+    """
+    kind = 'url' if source.startswith(('http://', 'https://')) else 'file'
+    index_file = os.path.join(KEYFRAMES_FOLDER, f"{video_id}.{kind}.json")
+    
+    with source_lock('keyframes', video_id):
+        if os.path.exists(index_file):
+            try:
+                with open(index_file, 'r', encoding='utf-8') as f:
+                    keyframes = json.load(f)['keyframes']
+                CACHE_LOOKUPS.labels(cache='keyframes', result='hit').inc()
+                return keyframes
+            except (OSError, ValueError, KeyError):
+                pass
+        
+        if not build:
+            return None
+        CACHE_LOOKUPS.labels(cache='keyframes', result='miss').inc()
+        
+        try:
+            started = time.time()
+            with timed('source.keyframe_index'):
+                keyframes = build_keyframe_index(source)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            print(f"⚠️ Keyframe index hatası: {str(e)[:200]}")
+            return None
+        
+        if not keyframes:
+            return None
+        
+        print(f"🔑 Keyframe index oluşturuldu: {len(keyframes)} keyframe ({time.time() - started:.1f}s)")
+        temp_index = f"{index_file}.{os.getpid()}.tmp"
+        with open(temp_index, 'w', encoding='utf-8') as f:
+            json.dump({'video_id': video_id, 'created_at': datetime.now().isoformat(), 'keyframes': keyframes}, f)
+        os.replace(temp_index, index_file)
+        return keyframes
+
+def build_analysis_command(source, frames_path, silence_path, has_audio=True):
+    """Tek ffmpeg geçişi: düşük çözünürlüklü gri kareler (rawvideo) + silencedetect metadata dosyası"""
+    width, height = ANALYSIS_FRAME_SIZE
+    cmd = ["ffmpeg"]
+    cmd += source_input_args(source)
+    cmd += [
+        "-i", source,
+        "-map", "0:v:0",
+        "-vf", f"fps={ANALYSIS_FPS:g},scale={width}:{height},format=gray",
+        "-f", "rawvideo", "-y", frames_path
+    ]
+    if has_audio:
+        # Filtre argümanında ':' ayraçtır (Windows sürücü harfi için kaçır)
+        metadata_file = silence_path.replace('\\', '/').replace(':', '\\:')
+        cmd += [
+            "-map", "0:a:0",
+            "-af", f"silencedetect=noise={ANALYSIS_SILENCE_DB:g}dB:d={ANALYSIS_SILENCE_SECONDS:g},ametadata=mode=print:file={metadata_file}",
+            "-f", "null", "-"
+        ]
+    return cmd
+
+def parse_silences(text, duration=None):
+    """ametadata çıktısındaki lavfi.silence_start/end değerlerini [start, end] aralıklarına çevir"""
+    silences = []
+    silence_start = None
+    for line in text.splitlines():
+        key, _, value = line.strip().partition('=')
+        try:
+            if key == 'lavfi.silence_start':
+                silence_start = max(float(value), 0.0)
+            elif key == 'lavfi.silence_end' and silence_start is not None:
+                silences.append([round(silence_start, 3), round(float(value), 3)])
+                silence_start = None
+        except ValueError:
+            continue
+    # Kaynak sessizlikle bitiyorsa son aralık kapanmaz
+    if silence_start is not None and duration:
+        silences.append([round(silence_start, 3), round(duration, 3)])
+    return silences
+
+def scene_scores(frames):
+    """Ardışık kareler arası ortalama mutlak piksel farkı (0-1), kare sayısı - 1 uzunluğunda"""
+    if len(frames) < 2:
+        return np.zeros(0, dtype=np.float32)
+    return np.abs(np.diff(frames.astype(np.int16), axis=0)).mean(axis=1, dtype=np.float32) / 255.0
+
+def detect_scene_cuts(scores, fps=ANALYSIS_FPS, threshold=ANALYSIS_SCENE_THRESHOLD):
+    """Eşiği aşan yerel tepe skorları sahne kesmesi say, [zaman, skor] listesi döner"""
+    if not len(scores):
+        return []
+    padded = np.concatenate(([0.0], scores, [0.0]))
+    peaks = (scores >= threshold) & (scores >= padded[:-2]) & (scores > padded[2:])
+    indexes = np.flatnonzero(peaks)
+    # scores[i], i ve i+1 kareleri arasındaki fark - kesme i+1. karede
+    return [[round((i + 1) / fps, 3), round(float(scores[i]), 3)] for i in indexes]
+
+def analyze_source(source, has_audio=True, duration=None):
+    """Kaynağı bir kez decode et: sahne kesmeleri ve sessiz aralıklar"""
+    width, height = ANALYSIS_FRAME_SIZE
+    with WORKSPACE.scratch(getattr(_job_context, 'job_id', None)) as scratch:
+        frames_path = os.path.join(scratch, 'frames.gray')
+        silence_path = os.path.join(scratch, 'silence.txt')
+        cmd = build_analysis_command(source, frames_path, silence_path, has_audio)
+        result = run_ffmpeg(cmd, duration, encoder_plan={'timeout': ffmpeg_timeout(duration, ANALYSIS_SPEED)})
+        if result.returncode != 0:
+            print(f"⚠️ Analiz başarısız: {(result.stderr or '')[-300:]}")
+            return None
+        
+        frames = np.fromfile(frames_path, dtype=np.uint8) if os.path.exists(frames_path) else np.zeros(0, dtype=np.uint8)
+        count = frames.size // (width * height)
+        frames = frames[:count * width * height].reshape(count, width * height)
+        silence_text = ''
+        if os.path.exists(silence_path):
+            with open(silence_path, 'r', encoding='utf-8', errors='replace') as f:
+                silence_text = f.read()
+    
+    duration = duration or (count / ANALYSIS_FPS if count else None)
+    return {
+        'duration': round(duration, 3) if duration else None,
+        'fps': ANALYSIS_FPS,
+        'frames': count,
+        'scene_cuts': detect_scene_cuts(scene_scores(frames)),
+        'silences': parse_silences(silence_text, duration)
+    }
+
+def get_source_analysis(video_id, source, probe=None, build=True):
+    """Analizi cache'ten oku, yoksa bir kez çıkar ve kaydet"""
+    analysis_file = os.path.join(ANALYSIS_FOLDER, f"{video_id}.json")
+    
+    with source_lock('analysis', video_id):
+        if os.path.exists(analysis_file):
+            try:
+                with open(analysis_file, 'r', encoding='utf-8') as f:
+                    analysis = json.load(f)
+                CACHE_LOOKUPS.labels(cache='analysis', result='hit').inc()
+                return analysis
+            except (OSError, ValueError):
+                pass
+        
+        if not build or not source:
+            return None
+        CACHE_LOOKUPS.labels(cache='analysis', result='miss').inc()
+        
+        try:
+            started = time.time()
+            with timed('source.analysis'):
+                analysis = analyze_source(source, has_audio=not probe or probe.get('audio') is not None,
+                                          duration=(probe or {}).get('duration'))
+        except (OSError, ValueError, subprocess.TimeoutExpired) as e:
+            print(f"⚠️ Analiz hatası: {str(e)[:200]}")
+            return None
+        
+        if not analysis:
+            return None
+        
+        print(f"🎚️ Analiz tamamlandı: {len(analysis['scene_cuts'])} sahne kesmesi, {len(analysis['silences'])} sessizlik ({time.time() - started:.1f}s)")
+        analysis['video_id'] = video_id
+        analysis['created_at'] = datetime.now().isoformat()
+        temp_analysis = f"{analysis_file}.{os.getpid()}.tmp"
+        with open(temp_analysis, 'w', encoding='utf-8') as f:
+            json.dump(analysis, f)
+        os.replace(temp_analysis, analysis_file)
+        return analysis
+
+def analysis_boundaries(analysis):
+    """Aday clip sınırları: (zamanlar, ağırlıklar, türler) - zamana göre sıralı
+    
+    Sessizlik ortası (ağırlık 1 + süre) konuşmayı bölmediği için sahne kesmesine (ağırlık = skor < 1) tercih edilir.
+    """
+    silences = np.array(analysis.get('silences') or [], dtype=np.float64).reshape(-1, 2)
+    cuts = np.array(analysis.get('scene_cuts') or [], dtype=np.float64).reshape(-1, 2)
+    times = np.concatenate((silences.mean(axis=1), cuts[:, 0]))
+    weights = np.concatenate((1.0 + silences[:, 1] - silences[:, 0], cuts[:, 1]))
+    kinds = np.array(['silence'] * len(silences) + ['scene'] * len(cuts))
+    order = np.argsort(times, kind='stable')
+    return times[order], weights[order], kinds[order]
+
+def suggest_clip_ranges(analysis, min_duration=ANALYSIS_MIN_CLIP, max_duration=ANALYSIS_MAX_CLIP):
+    """Kaynağı min-max süreli clip'lere böl, her clip'i penceredeki en güçlü sınırda bitir"""
+    duration = analysis.get('duration') or 0
+    times, weights, kinds = analysis_boundaries(analysis)
+    ranges = []
+    start = 0.0
+    while duration - start >= min_duration:
+        if duration - start <= max_duration:
+            end, boundary = duration, 'end'
+        else:
+            low, high = np.searchsorted(times, [start + min_duration, start + max_duration], side='left')
+            if high > low:
+                best = low + int(np.argmax(weights[low:high]))
+                end, boundary = float(times[best]), str(kinds[best])
+            else:
+                end, boundary = start + max_duration, 'max_duration'
+        ranges.append({'start': round(start, 2), 'end': round(end, 2), 'duration': round(end - start, 2), 'boundary': boundary})
+        start = end
+    return ranges
+
+def snap_times(values, boundaries, tolerance=ANALYSIS_SNAP_TOLERANCE):
+    """Her zamanı tolerans içindeki en yakın sınıra çek (vektörel)"""
+    values = np.asarray(values, dtype=np.float64)
+    if not len(boundaries):
+        return values
+    padded = np.concatenate(([-np.inf], np.sort(boundaries), [np.inf]))
+    index = np.searchsorted(padded, values)
+    left, right = padded[index - 1], padded[index]
+    nearest = np.where(values - left <= right - values, left, right)
+    return np.where(np.abs(nearest - values) <= tolerance, nearest, values)
+
+def snap_clip_ranges(clips, analysis, tolerance=ANALYSIS_SNAP_TOLERANCE):
+    """Kullanıcının clip aralıklarını en yakın sessizlik/sahne sınırına snap et (diğer alanlar korunur)"""
+    if not clips:
+        return []
+    # Kaynağın başı ve sonu da geçerli sınır
+    times = np.concatenate((analysis_boundaries(analysis)[0], [0.0, analysis.get('duration') or 0.0]))
+    starts = snap_times([float(clip['start']) for clip in clips], times, tolerance)
+    ends = snap_times([float(clip['end']) for clip in clips], times, tolerance)
+    snapped = []
+    for clip, start, end in zip(clips, starts, ends):
+        if end <= start:
+            start, end = float(clip['start']), float(clip['end'])
+        snapped.append(dict(clip, start=round(float(start), 2), end=round(float(end), 2),
+                            original_start=clip['start'], original_end=clip['end']))
+    return snapped
+
+def build_analysis_result(analysis, options=None):
+    """Job sonucuna yazılacak analiz özeti, önerilen ve snap edilmiş clipler"""
+    options = options or {}
+    return {
+        'duration': analysis.get('duration'),
+        'scene_cuts': [cut[0] for cut in analysis.get('scene_cuts', [])],
+        'silences': analysis.get('silences', []),
+        'suggested_clips': suggest_clip_ranges(analysis, options.get('min_duration', ANALYSIS_MIN_CLIP),
+                                               options.get('max_duration', ANALYSIS_MAX_CLIP)),
+        'snapped_clips': snap_clip_ranges(options.get('clips') or [], analysis,
+                                          options.get('snap_tolerance', ANALYSIS_SNAP_TOLERANCE))
+    }
+
+def crop_window_fraction(probe=None):
+    """9:16 kırpma penceresinin kaynak genişliğine oranı (kaynak zaten dikeyse None)"""
+    video = (probe or {}).get('video') or {}
+    width, height = video.get('width'), video.get('height')
+    if not width or not height:
+        width, height = 16, 9  # probe yoksa yatay 16:9 varsay
+    window = height * 9 / 16 / width
+    return round(window, 4) if window < 0.95 else None
+
+def column_energy(frames, previous=None):
+    """Kare parçasının sütun enerjisi (kare, sütun) - previous: önceki parçanın son karesi (hareket farkı için)"""
+    frames = frames.astype(np.int16)
+    energy = np.zeros((frames.shape[0], frames.shape[2]), dtype=np.float32)
+    energy[:, 1:] = np.abs(np.diff(frames, axis=2)).sum(axis=1, dtype=np.int32)
+    energy[1:] += REFRAME_MOTION_WEIGHT * np.abs(np.diff(frames, axis=0)).sum(axis=1, dtype=np.int32)
+    if previous is not None:
+        energy[0] += REFRAME_MOTION_WEIGHT * np.abs(frames[0] - previous.astype(np.int16)).sum(axis=0, dtype=np.int32)
+    return energy
+
+def crop_centers(frames, window, fps=REFRAME_FPS):
+    """
+    Düşük çözünürlüklü gri karelerden yumuşatılmış yatay kırpma merkezleri (0-1, kare başına)
+    
+    Sütun enerjisi = yatay kenar yoğunluğu (statik önem) + REFRAME_MOTION_WEIGHT * kareler arası fark;
+    her karede enerjisi en yüksek pencere seçilir, merkezler REFRAME_SMOOTH_SECONDS ile yumuşatılır.
+    """
+    count, height, width = frames.shape
+    if not count:
+        return np.zeros(0)
+    # frames memmap olabilir - tamamı float'a çevrilmez, parça parça okunur
+    energy = np.empty((count, width), dtype=np.float32)
+    previous = None
+    for start in range(0, count, REFRAME_CHUNK_FRAMES):
+        chunk = np.asarray(frames[start:start + REFRAME_CHUNK_FRAMES])
+        energy[start:start + len(chunk)] = column_energy(chunk, previous)
+        previous = chunk[-1]
+    
+    # Her pencere konumunun toplam enerjisi (kümülatif toplam ile tek seferde)
+    span = min(max(int(round(window * width)), 1), width)
+    cumulative = np.concatenate((np.zeros((count, 1), dtype=np.float32), np.cumsum(energy, axis=1)), axis=1)
+    sums = cumulative[:, span:] - cumulative[:, :-span]
+    # Aynı enerjili (içeriği tamamen kapsayan) pencerelerin ortası - içerik kenarda kalmasın
+    best = sums >= sums.max(axis=1, keepdims=True) * (1 - 1e-4)
+    first = np.argmax(best, axis=1)
+    last = best.shape[1] - 1 - np.argmax(best[:, ::-1], axis=1)
+    centers = ((first + last) / 2 + span / 2) / width
+    
+    # Enerjisi olmayan (düz) karelerde önceki merkezi koru
+    valid = energy.sum(axis=1) > 1e-3
+    if not valid.any():
+        return np.full(count, 0.5)
+    last_valid = np.maximum.accumulate(np.where(valid, np.arange(count), -1))
+    centers = np.where(last_valid >= 0, centers[np.maximum(last_valid, 0)], centers[np.argmax(valid)])
+    
+    # Hareketli ortalama (kenarlar tekrar edilerek) - titreyen kamera olmasın
+    kernel = max(int(round(REFRAME_SMOOTH_SECONDS * fps)) | 1, 1)
+    padded = np.pad(centers, kernel // 2, mode='edge')
+    smoothed = np.convolve(padded, np.ones(kernel) / kernel, mode='valid')
+    # Pencere kaynak dışına taşmasın
+    return np.clip(smoothed, window / 2, 1 - window / 2)
+
+def build_crop_track(source, window, duration=None):
+    """Kaynağı bir kez düşük çözünürlükte decode edip kırpma yörüngesini çıkar"""
+    width, height = REFRAME_FRAME_SIZE
+    with WORKSPACE.scratch(getattr(_job_context, 'job_id', None)) as scratch:
+        frames_path = os.path.join(scratch, 'frames.gray')
+        cmd = ["ffmpeg"]
+        cmd += source_input_args(source)
+        cmd += [
+            "-i", source,
+            "-map", "0:v:0",
+            "-vf", f"fps={REFRAME_FPS},scale={width}:{height},format=gray",
+            "-f", "rawvideo", "-y", frames_path
+        ]
+        result = run_ffmpeg(cmd, duration, encoder_plan={'timeout': ffmpeg_timeout(duration, ANALYSIS_SPEED)})
+        if result.returncode != 0:
+            print(f"⚠️ Kırpma yörüngesi çıkarılamadı: {(result.stderr or '')[-300:]}")
+            return None
+        count = os.path.getsize(frames_path) // (width * height)
+        if not count:
+            return None
+        # Kaynak uzun olabilir (1 saat = 7200 kare) - dosya belleğe alınmaz, crop_centers parça parça okur
+        frames = np.memmap(frames_path, dtype=np.uint8, mode='r', shape=(count, height, width))
+        try:
+            centers = crop_centers(frames, window)
+        finally:
+            del frames  # scratch silinmeden önce dosyayı bırak
+    return {'fps': REFRAME_FPS, 'window': window, 'centers': [round(float(center), 4) for center in centers]}
+
+def get_crop_track(video_id, source, probe=None, build=True):
+    """Kırpma yörüngesini cache'ten oku, yoksa bir kez çıkar ve kaydet (kaynak dikeyse None)"""
+    window = crop_window_fraction(probe)
+    if window is None:
+        return None
+    track_file = os.path.join(REFRAME_FOLDER, f"{video_id}.json")
+    
+    with source_lock('reframe', video_id):
+        if os.path.exists(track_file):
+            try:
+                with open(track_file, 'r', encoding='utf-8') as f:
+                    track = json.load(f)
+                CACHE_LOOKUPS.labels(cache='reframe', result='hit').inc()
+                return track
+            except (OSError, ValueError):
+                pass
+        
+        if not build or not source:
+            return None
+        CACHE_LOOKUPS.labels(cache='reframe', result='miss').inc()
+        
+        try:
+            started = time.time()
+            with timed('source.reframe'):
+                track = build_crop_track(source, window, (probe or {}).get('duration'))
+        except (OSError, ValueError, subprocess.TimeoutExpired) as e:
+            print(f"⚠️ Kırpma yörüngesi hatası: {str(e)[:200]}")
+            return None
+        
+        if not track:
+            return None
+        
+        print(f"🎯 Kırpma yörüngesi çıkarıldı: {len(track['centers'])} nokta ({time.time() - started:.1f}s)")
+        track['video_id'] = video_id
+        track['created_at'] = datetime.now().isoformat()
+        temp_track = f"{track_file}.{os.getpid()}.tmp"
+        with open(temp_track, 'w', encoding='utf-8') as f:
+            json.dump(track, f)
+        os.replace(temp_track, track_file)
+        return track
+
+def crop_x_expression(track, base, span):
+    """
+    Yörüngenin [base, base + span] kısmını ffmpeg ifadesine çevir (t: input seek'ten itibaren saniye)
+    
+    Parça parça doğrusal: merkez = c0 + Σ (c[i+1] - c[i]) * clip((t - t[i]) / adım, 0, 1) - iç içe if yok.
+    """
+    centers = np.asarray(track['centers'], dtype=np.float64)
+    times = np.arange(len(centers)) / track['fps']
+    step = REFRAME_KEYPOINT_SECONDS
+    keypoints = np.arange(0, max(span, 0) + step, step)
+    values = np.interp(base + keypoints, times, centers)
+    deltas = np.diff(values)
+    
+    expression = f"{values[0]:.4f}"
+    for keypoint, delta in zip(keypoints[:-1], deltas):
+        if abs(delta) >= 0.001:
+            expression += f"+({delta:.4f})*clip((t-{keypoint:.2f})/{step:g},0,1)"
+    return f"clip(({expression})*iw-ow/2,0,iw-ow)"
+
+def reframe_filter(track, base, span):
+    """Crop-follow Reels filtresi: 9:16 pencereyi yörüngeye göre kaydır, 1080x1920'ye ölçekle"""
+    return f"crop=w=trunc(ih*9/32)*2:h=ih:x='{crop_x_expression(track, base, span)}':y=0,scale={REELS_WIDTH}:{REELS_HEIGHT},setsar=1"
+
+def plan_seek(start, keyframes):
+    """
+    İki aşamalı seek: önceki keyframe'e input seek + kalan kısım için output seek
+    
+    Döner: (input_seek, output_seek) - output_seek None ise tek -ss yeterli
+    """
+    if not keyframes:
+        return start, None
+    
+    position = bisect.bisect_right(keyframes, float(start)) - 1
+    if position < 0:
+        return 0, start if float(start) > 0 else None
+    
+    keyframe = keyframes[position]
+    offset = round(float(start) - keyframe, 3)
+    return keyframe, (offset if offset > 0 else None)
+
+def seek_args(start, keyframes):
+    """plan_seek sonucunu (input, output) FFmpeg argümanlarına çevir"""
+    input_seek, output_seek = plan_seek(start, keyframes)
+    return ["-ss", str(input_seek)], (["-ss", str(output_seek)] if output_seek else [])
+
+def parse_progress_report(fields, duration=None):
+    """ffmpeg -progress bloğunu (key=value) out_time/speed/fps özetine çevir"""
+    out_time = None
+    try:
+        out_time = int(fields['out_time_us']) / 1000000
+    except (KeyError, ValueError):
+        try:
+            hours, minutes, seconds = fields.get('out_time', '').split(':')
+            out_time = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+        except ValueError:
+            pass
+    if out_time is None:
+        return None
+    out_time = max(out_time, 0)
+    
+    try:
+        speed = float(fields.get('speed', '').rstrip('x'))
+    except ValueError:
+        speed = None
+    try:
+        fps = float(fields.get('fps', ''))
+    except ValueError:
+        fps = None
+    
+    report = {'out_time': round(out_time, 2), 'speed': speed, 'fps': fps, 'fraction': None, 'remaining': None}
+    if duration:
+        report['fraction'] = round(min(out_time / duration, 1), 4)
+        report['remaining'] = round(max(duration - out_time, 0), 2)
+    if fields.get('progress') == 'end':
+        report['fraction'] = 1 if duration else None
+        report['remaining'] = 0 if duration else None
+    return report
+
+class JobCancelledError(Exception):
+    """Job iptal edildi (DELETE /api/jobs/<job_id>)"""
+    
+    def __init__(self, job_id):
+        super().__init__(f"Job iptal edildi: {job_id}")
+        self.job_id = job_id
+
+class FFmpegStalledError(subprocess.TimeoutExpired):
+    """FFmpeg çalışıyor ama out_time FFMPEG_STALL_SECONDS boyunca ilerlemedi"""
+
+class FFmpegSupervisor:
+    """
+    Tüm ffmpeg child process'lerini tek bir asyncio event loop'undan yönet
+    
+    - -progress (stdout) ve stderr aynı loop'ta akış halinde okunur, stderr'in sadece sonu tutulur
+    - her process'in kendi timeout'u var; aşılırsa process grubu öldürülür
+    - out_time stall_timeout boyunca ilerlemezse (takılan input/bağlantı) process öldürülür
+    - cancel_job() o job'un çalışan ffmpeg'lerini hemen öldürür; başka worker process'ten
+      gelen iptal (marker dosyası) CANCEL_POLL_SECONDS içinde fark edilir
+    Çağıran thread sadece sonucu bekler, progress callback'leri de o thread'de çalışır.
+    """
+    
+    def __init__(self):
+        self._loop = None
+        self._lock = threading.Lock()
+        self._runs = {}  # sadece loop thread'inden erişilir
+    
+    def run(self, cmd, duration=None, on_progress=None, timeout=FFMPEG_TIMEOUT, job_id=None, stall_timeout=None,
+            capture_stdout=False):
+        """
+        Process'i çalıştır ve bitmesini bekle - subprocess.run gibi CompletedProcess döner
+        
+        capture_stdout=True ise stdout progress olarak değil çıktı olarak toplanır (ffprobe).
+        """
+        loop = self._ensure_loop()
+        reports = queue.Queue()
+        run = {
+            'cmd': cmd, 'job_id': job_id, 'process': None, 'cancelled': False, 'timed_out': False,
+            'stalled': False, 'stall_timeout': stall_timeout, 'out_time': None, 'advanced_at': time.monotonic(),
+            'stdout': [] if capture_stdout else None
+        }
+        future = asyncio.run_coroutine_threadsafe(self._run(run, duration, timeout, reports), loop)
+        
+        while True:
+            report = reports.get()
+            if report is None:
+                break
+            if on_progress:
+                try:
+                    on_progress(report)
+                except Exception as e:
+                    print(f"⚠️ Progress callback hatası: {str(e)[:200]}")
+        
+        returncode, stderr = future.result()
+        if run['cancelled']:
+            raise JobCancelledError(job_id)
+        if run['stalled']:
+            raise FFmpegStalledError(cmd, stall_timeout, stderr=stderr)
+        if run['timed_out']:
+            raise subprocess.TimeoutExpired(cmd, timeout, stderr=stderr)
+        stdout = b''.join(run['stdout']).decode('utf-8', 'replace') if capture_stdout else ''
+        return subprocess.CompletedProcess(cmd, returncode, stdout=stdout, stderr=stderr)
+    
+    def cancel_job(self, job_id):
+        """Job'un çalışan process'lerini öldür (herhangi bir thread'den çağrılabilir)"""
+        with self._lock:
+            loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._cancel_job, job_id)
+    
+    def running(self):
+        return len(self._runs)
+    
+    def _ensure_loop(self):
+        # Loop thread'i ilk ffmpeg'de başlat (import sırasında thread açma)
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, daemon=True).start()
+                asyncio.run_coroutine_threadsafe(self._watchdog(), self._loop)
+            return self._loop
+    
+    async def _run(self, run, duration, timeout, reports):
+        try:
+            if os.name == 'posix':
+                group_args = {'start_new_session': True}
+            else:
+                group_args = {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+            process = await asyncio.create_subprocess_exec(
+                *run['cmd'], stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                limit=1024 * 1024, **group_args
+            )
+            run['process'] = process
+            self._runs[id(run)] = run
+            if is_job_cancelled(run['job_id']):
+                self._kill(run, cancelled=True)
+            
+            stderr_tail = deque(maxlen=FFMPEG_STDERR_LINES)
+            try:
+                if run['stdout'] is not None:
+                    read_stdout = self._read_output(process.stdout, run['stdout'])
+                else:
+                    read_stdout = self._read_progress(run, process.stdout, duration, reports)
+                await asyncio.wait_for(asyncio.gather(
+                    read_stdout,
+                    self._read_stderr(process.stderr, stderr_tail),
+                    process.wait()
+                ), timeout)
+            except asyncio.TimeoutError:
+                run['timed_out'] = True
+                self._kill(run)
+                await process.wait()
+            return process.returncode, ''.join(stderr_tail)
+        finally:
+            self._runs.pop(id(run), None)
+            reports.put(None)
+    
+    async def _read_progress(self, run, stream, duration, reports):
+        fields = {}
+        async for line in stream:
+            key, _, value = line.decode('utf-8', 'replace').strip().partition('=')
+            fields[key] = value
+            if key != 'progress':
+                continue
+            report = parse_progress_report(fields, duration)
+            fields = {}
+            if report:
+                if run['out_time'] is None or report['out_time'] > run['out_time']:
+                    run['out_time'] = report['out_time']
+                    run['advanced_at'] = time.monotonic()
+                reports.put(report)
+    
+    async def _read_output(self, stream, chunks):
+        while True:
+            chunk = await stream.read(64 * 1024)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    
+    async def _read_stderr(self, stream, tail):
+        async for line in stream:
+            tail.append(line.decode('utf-8', 'replace'))
+    
+    async def _watchdog(self):
+        # İptal marker'ları ve ilerlemeyen (takılan) process'ler
+        while True:
+            await asyncio.sleep(CANCEL_POLL_SECONDS)
+            now = time.monotonic()
+            for run in list(self._runs.values()):
+                if not run['cancelled'] and is_job_cancelled(run['job_id']):
+                    self._kill(run, cancelled=True)
+                elif run['stall_timeout'] and not run['stalled'] and now - run['advanced_at'] > run['stall_timeout']:
+                    print(f"⚠️ FFmpeg {run['stall_timeout']}s boyunca ilerlemedi, durduruluyor (out_time={run['out_time']})")
+                    run['stalled'] = True
+                    self._kill(run)
+    
+    def _cancel_job(self, job_id):
+        for run in list(self._runs.values()):
+            if run['job_id'] == job_id:
+                self._kill(run, cancelled=True)
+    
+    def _kill(self, run, cancelled=False):
+        run['cancelled'] = run['cancelled'] or cancelled
+        process = run['process']
+        if process is None or process.returncode is not None:
+            return
+        try:
+            if os.name == 'posix':
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+        except (ProcessLookupError, PermissionError):
+            pass
+
+FFMPEG_SUPERVISOR = FFmpegSupervisor()
 
-# Job durumlarını sakla (file-based, worker'lar arası paylaşım için)
-JOBS_FOLDER = "jobs"
-Path(JOBS_FOLDER).mkdir(exist_ok=True)
+def set_current_job(job_id):
+    """Bu thread'de başlatılan ffmpeg'lerin ait olduğu job (iptal için), öncekini döndür"""
+    previous = getattr(_job_context, 'job_id', None)
+    _job_context.job_id = job_id
+    return previous
 
-def get_job(job_id):
-    """Job'u dosyadan oku"""
-    job_file = os.path.join(JOBS_FOLDER, f"{job_id}.json")
-    if os.path.exists(job_file):
-        with open(job_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return None
+def run_ffmpeg(cmd, duration=None, on_progress=None, encoder_plan=None):
+    """
+    FFmpeg'i -progress pipe:1 ile supervisor üzerinden çalıştır
+    
+    Timeout encoder planından (clip süresi / beklenen hız) gelir, ayrıca out_time
+    FFMPEG_STALL_SECONDS ilerlemezse durdurulur. stderr'in tamamı bellekte tutulmaz.
+    subprocess.run gibi CompletedProcess döner; süre aşılırsa TimeoutExpired
+    (takılmada FFmpegStalledError), job iptal edilirse JobCancelledError fırlatır.
+    """
+    cmd = [cmd[0], "-progress", "pipe:1", "-nostats", *cmd[1:]]
+    timeout = (encoder_plan or {}).get('timeout') or FFMPEG_TIMEOUT
+    last_report = {}
+    
+    def track(report):
+        last_report.update(report)
+        if on_progress:
+            on_progress(report)
+    
+    result = FFMPEG_SUPERVISOR.run(cmd, duration, track, timeout, job_id=getattr(_job_context, 'job_id', None),
+                                   stall_timeout=FFMPEG_STALL_SECONDS)
+    # Sonraki timeout'lar bu host'ta ölçülen gerçek hıza göre hesaplansın
+    if result.returncode == 0 and encoder_plan and encoder_plan.get('preset'):
+        record_encode_speed(encoder_plan['preset'], encoder_plan['threads'], last_report.get('speed'))
+    return result
 
-def save_job(job_id, job_data):
-    """Job'u dosyaya kaydet"""
-    job_file = os.path.join(JOBS_FOLDER, f"{job_id}.json")
-    with open(job_file, 'w', encoding='utf-8') as f:
-        json.dump(job_data, f, ensure_ascii=False, indent=2)
+def run_probe(cmd, timeout):
+    """ffprobe'u supervisor üzerinden çalıştır (timeout'ta process grubu öldürülür, job iptali de durdurur)"""
+    return FFMPEG_SUPERVISOR.run(cmd, timeout=timeout, job_id=getattr(_job_context, 'job_id', None), capture_stdout=True)
 
-def delete_job(job_id):
-    """Job dosyasını sil"""
-    job_file = os.path.join(JOBS_FOLDER, f"{job_id}.json")
-    if os.path.exists(job_file):
-        os.remove(job_file)
+def source_input_args(source):
+    """http(s) kaynak için ffmpeg/ffprobe input header'ları - imzalı URL header'sız 403 dönebilir"""
+    if source.startswith(('http://', 'https://')):
+        return ["-user_agent", SOURCE_USER_AGENT, "-referer", SOURCE_REFERER]
+    return []
 
-def generate_clip_filename(video_id, start, end):
-    """Dosya adı oluştur: videoID-start-end_reels.mp4"""
-    return f"{video_id}-{start}-{end}_reels.mp4"
+def cancel_job(job_id):
+    """Job'u iptal et: kuyruktaysa çıkar, çalışan ffmpeg'lerini öldür"""
+    with open(cancel_marker_path(job_id), 'w', encoding='utf-8') as f:
+        f.write(datetime.now().isoformat())
+    dequeued = SCHEDULER.cancel(job_id)
+    FFMPEG_SUPERVISOR.cancel_job(job_id)
+    # Compose job'unun o an çalışan alt job'u da durdurulsun
+    for child_id in (get_job(job_id) or {}).get('children', []):
+        cancel_job(child_id)
+    return dequeued
+
+class ClipProgress:
+    """Clip encode ilerlemesini job kaydına yaz (en fazla PROGRESS_SAVE_SECONDS'ta bir)"""
+    
+    def __init__(self, job_id, index, remaining_after=0):
+        self.job_id = job_id
+        self.index = index
+        self.remaining_after = remaining_after  # sonraki cliplerin toplam süresi (ETA için)
+        self._last_save = 0
+    
+    def __call__(self, report):
+        now = time.monotonic()
+        if now - self._last_save < PROGRESS_SAVE_SECONDS and report.get('fraction') != 1:
+            return
+        self._last_save = now
+        
+        job = get_job(self.job_id)
+        if not job:
+            return
+        fraction = report.get('fraction') or 0
+        total = job.get('total') or 1
+        job['progress'] = round(min((job.get('processed', 0) + fraction) * 100 / total, 100), 1)
+        job['current_clip'] = {
+            'index': self.index,
+            'progress': round(fraction * 100, 1),
+            'out_time': report.get('out_time'),
+            'speed': report.get('speed'),
+            'fps': report.get('fps')
+        }
+        if report.get('speed') and report.get('remaining') is not None:
+            job['eta_seconds'] = round((report['remaining'] + self.remaining_after) / report['speed'], 1)
+        save_job(self.job_id, job)
+
+class JobHeartbeat:
+    """
+    Bu process'in sahip olduğu (kuyrukta/çalışan) job'ların heartbeat dosyalarını tazeler
+    
+    Process ölürse dosyalar eskir ve recover_jobs() job'u sahipsiz sayar.
+    """
+    
+    def __init__(self, interval):
+        self.interval = interval
+        self._jobs = set()
+        self._lock = threading.Lock()
+        self._thread = None
+    
+    def add(self, job_id):
+        with self._lock:
+            self._jobs.add(job_id)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='job-heartbeat', daemon=True)
+                self._thread.start()
+        self._touch(job_id)
+    
+    def discard(self, job_id):
+        with self._lock:
+            self._jobs.discard(job_id)
+        try:
+            os.remove(heartbeat_path(job_id))
+        except OSError:
+            pass
+    
+    def _touch(self, job_id):
+        try:
+            with open(heartbeat_path(job_id), 'a'):
+                pass
+            os.utime(heartbeat_path(job_id), None)
+        except OSError as e:
+            print(f"⚠️ Heartbeat yazılamadı ({job_id}): {e}")
+    
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                job_ids = list(self._jobs)
+            for job_id in job_ids:
+                # Kaydı silinmiş job'un heartbeat'ini yeniden oluşturma
+                if os.path.exists(job_path(job_id)):
+                    self._touch(job_id)
+                else:
+                    self.discard(job_id)
+
+JOB_HEARTBEAT = JobHeartbeat(JOB_HEARTBEAT_SECONDS)
+
+class WorkspaceFullError(Exception):
+    """Çalışma alanında indirme için yeterli boş yer yok"""
+
+class WorkspaceManager:
+    """
+    Geçici dosyalar için job başına benzersiz klasörler (WORKSPACE_ROOT/<job_id>)
+    
+    Aynı video için eşzamanlı job'lar birbirinin dosyasını ezmez. Klasör job bitince
+    (hata/iptal dahil) silinir; process çökerse kalır ve devam ettirilen job tekrar kullanır.
+    Aktif job'a ait olmayan eski klasörler sweep() ile temizlenir.
+    """
+    
+    def __init__(self, root, min_free_bytes):
+        self.root = root
+        self.min_free_bytes = min_free_bytes
+    
+    def job_dir(self, job_id):
+        path = os.path.join(self.root, job_id)
+        os.makedirs(path, exist_ok=True)
+        return path
+    
+    def release(self, job_id):
+        """Job'un klasörünü içindekilerle birlikte sil"""
+        path = os.path.join(self.root, job_id)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+            print(f"🗑️ Çalışma alanı silindi: {path}")
+    
+    def scratch_dir(self, job_id=None):
+        """Tek seferlik geçici klasör (job varsa onun altında) - çağıran silmeli"""
+        parent = self.job_dir(job_id) if job_id else self.root
+        os.makedirs(parent, exist_ok=True)
+        return tempfile.mkdtemp(prefix='scratch-', dir=parent)
+    
+    @contextmanager
+    def scratch(self, job_id=None):
+        path = self.scratch_dir(job_id)
+        try:
+            yield path
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+    
+    def free_bytes(self):
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            return shutil.disk_usage(self.root).free
+        except OSError:
+            return 0
+    
+    def ensure_space(self, needed_bytes):
+        """İndirmeden önce kota kontrolü - yer yoksa WorkspaceFullError"""
+        needed_bytes = needed_bytes or ESTIMATED_SOURCE_BYTES
+        free = self.free_bytes()
+        if free - needed_bytes < self.min_free_bytes:
+            raise WorkspaceFullError(
+                f"Çalışma alanında yer yok: {free // (1024 * 1024)} MB boş, "
+                f"{needed_bytes // (1024 * 1024)} MB + {self.min_free_bytes // (1024 * 1024)} MB rezerv gerekli"
+            )
+    
+    def sweep(self, now=None):
+        """Aktif (pending/processing) job'a ait olmayan eski klasörleri sil, silinenleri döndür"""
+        removed = []
+        if not os.path.isdir(self.root):
+            return removed
+        now = now or time.time()
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                if now - os.path.getmtime(path) < WORKSPACE_ORPHAN_SECONDS:
+                    continue
+                job = get_job(name) if not name.startswith('scratch-') else None
+            except (OSError, ValueError):
+                continue
+            if job and job.get('status') in ('pending', 'processing'):
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+            removed.append(name)
+        if removed:
+            print(f"🧹 Sahipsiz çalışma alanları silindi: {len(removed)}")
+        return removed
+
+WORKSPACE = WorkspaceManager(WORKSPACE_ROOT, MIN_FREE_TEMP_BYTES)
+
+class JobReaper:
+    """
+    Terminal job'ları ve batch kayıtlarını TTL dolunca silen tek thread (job başına uyuyan cleanup thread'i yerine)
+    
+    Silinme zamanı kayıtta (expires_at) durur; restart sonrası ve diğer worker'ların kayıtları
+    JOBS_FOLDER/BATCHES_FOLDER taramasıyla heap'e eklenir. Silme idempotent - aynı job'u iki worker silebilir.
+    """
+    
+    def __init__(self, scan_interval):
+        self.scan_interval = scan_interval
+        self._heap = []  # (expires_at, kind, record_id) - kind: job | batch
+        self._scheduled = set()  # (kind, record_id)
+        self._cond = threading.Condition()
+        self._thread = None
+    
+    def start(self):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='job-reaper', daemon=True)
+                self._thread.start()
+    
+    def schedule(self, record_id, expires_at, kind='job'):
+        with self._cond:
+            if (kind, record_id) in self._scheduled:
+                return
+            self._scheduled.add((kind, record_id))
+            heapq.heappush(self._heap, (expires_at, kind, record_id))
+            self._cond.notify()
+        self.start()
+    
+    def pending(self):
+        with self._cond:
+            return len(self._heap)
+    
+    def scan(self):
+        """JOBS_FOLDER/BATCHES_FOLDER'daki (heap'te olmayan) terminal kayıtları zamanla, eklenen sayıyı döndür"""
+        added = self.scan_batches()
+        if not os.path.isdir(JOBS_FOLDER):
+            return added
+        for name in os.listdir(JOBS_FOLDER):
+            if not name.endswith('.json'):
+                continue
+            job_id = name[:-len('.json')]
+            with self._cond:
+                if ('job', job_id) in self._scheduled:
+                    continue
+            try:
+                job = get_job(job_id)
+                status = job.get('status') if job else None
+                if status not in TERMINAL_JOB_STATUSES:
+                    continue
+                # expires_at'ten önceki sürümlerin kayıtları: son yazımdan itibaren TTL
+                expires_at = job.get('expires_at') or os.path.getmtime(job_path(job_id)) + JOB_TTL_SECONDS[status]
+            except (OSError, ValueError):
+                continue
+            self.schedule(job_id, expires_at)
+            added += 1
+        return added
+    
+    def scan_batches(self):
+        if not os.path.isdir(BATCHES_FOLDER):
+            return 0
+        added = 0
+        for name in os.listdir(BATCHES_FOLDER):
+            if not name.endswith('.json'):
+                continue
+            batch_id = name[:-len('.json')]
+            with self._cond:
+                if ('batch', batch_id) in self._scheduled:
+                    continue
+            try:
+                batch = get_batch(batch_id) or {}
+                # expires_at'ten önceki sürümlerin kayıtları: son yazımdan itibaren TTL
+                expires_at = batch.get('expires_at') or os.path.getmtime(os.path.join(BATCHES_FOLDER, name)) + BATCH_TTL_SECONDS
+            except (OSError, ValueError):
+                continue
+            self.schedule(batch_id, expires_at, kind='batch')
+            added += 1
+        return added
+    
+    def reap(self, now=None):
+        """Süresi dolan job'ları (geçici dosyalarıyla) ve batch'leri sil, silinenleri döndür"""
+        now = now or time.time()
+        removed = []
+        while True:
+            with self._cond:
+                if not self._heap or self._heap[0][0] > now:
+                    break
+                _, kind, job_id = heapq.heappop(self._heap)
+                self._scheduled.discard((kind, job_id))
+            try:
+                if kind == 'batch':
+                    delete_batch(job_id)
+                    removed.append(job_id)
+                    continue
+                job = get_job(job_id)
+                if job and job.get('status') not in TERMINAL_JOB_STATUSES:
+                    continue
+                delete_job(job_id)
+                WORKSPACE.release(job_id)
+                removed.append(job_id)
+            except OSError as e:
+                print(f"⚠️ Kayıt silinemedi ({job_id}): {e}")
+        if removed:
+            print(f"🗑️ Süresi dolan kayıtlar silindi: {len(removed)}")
+        return removed
+    
+    def _loop(self):
+        next_scan = 0
+        while True:
+            try:
+                if time.time() >= next_scan:
+                    self.scan()
+                    next_scan = time.time() + self.scan_interval
+                self.reap()
+            except Exception as e:
+                print(f"❌ Job reaper hatası: {str(e)}")
+            with self._cond:
+                wake_at = min(self._heap[0][0], next_scan) if self._heap else next_scan
+                self._cond.wait(max(wake_at - time.time(), 0.1))
+
+JOB_REAPER = JobReaper(JOB_REAP_SCAN_SECONDS)
+
+# TurboScribe HTML yanıtı (her istekte yeniden derlenmesin)
+TURBOSCRIBE_TITLE_RE = re.compile(r'<h1[^>]*>([^<]+)</h1>')
+TURBOSCRIBE_ITAG_RES = {
+    itag: re.compile(rf'href="([^"]*videoplayback[^"]*itag={itag}[^"]*)"') for itag in (140, 139, 251)
+}
+TURBOSCRIBE_AUDIO_RE = re.compile(r'href="([^"]*googlevideo\.com[^"]*mime=audio[^"]*)"')
+TURBOSCRIBE_PLAYBACK_RE = re.compile(r'href="([^"]*videoplayback[^"]*)"')
 
 def get_audio_from_turboscribe(video_id):
     """TurboScribe.ai'den sadece ses linkini al"""
@@ -92,27 +2154,26 @@ def get_audio_from_turboscribe(video_id):
         html_content = response.text
         
         # Başlığı çıkar
-        import re
-        title_match = re.search(r'<h1[^>]*>([^<]+)</h1>', html_content)
+        title_match = TURBOSCRIBE_TITLE_RE.search(html_content)
         title = title_match.group(1) if title_match else 'Unknown'
         
         # Audio URL'ini çıkar - farklı itag'leri dene
         audio_url = None
         
         # Önce itag=140 (m4a 128kbps) dene
-        audio_url_match = re.search(r'href="([^"]*videoplayback[^"]*itag=140[^"]*)"', html_content)
+        audio_url_match = TURBOSCRIBE_ITAG_RES[140].search(html_content)
         if audio_url_match:
             audio_url = audio_url_match.group(1).replace('&amp;', '&')
             print(f"✅ Audio bulundu: itag=140 (m4a 128kbps)")
         else:
             # itag=139 (m4a 48kbps) dene
-            audio_url_match = re.search(r'href="([^"]*videoplayback[^"]*itag=139[^"]*)"', html_content)
+            audio_url_match = TURBOSCRIBE_ITAG_RES[139].search(html_content)
             if audio_url_match:
                 audio_url = audio_url_match.group(1).replace('&amp;', '&')
                 print(f"✅ Audio bulundu: itag=139 (m4a 48kbps)")
             else:
                 # itag=251 (webm opus) dene
-                audio_url_match = re.search(r'href="([^"]*videoplayback[^"]*itag=251[^"]*)"', html_content)
+                audio_url_match = TURBOSCRIBE_ITAG_RES[251].search(html_content)
                 if audio_url_match:
                     audio_url = audio_url_match.group(1).replace('&amp;', '&')
                     print(f"✅ Audio bulundu: itag=251 (webm opus)")
@@ -122,13 +2183,13 @@ def get_audio_from_turboscribe(video_id):
             print(f"🔍 Alternatif audio arama yapılıyor...")
             
             # Genel audio URL arama
-            general_audio_matches = re.findall(r'href="([^"]*googlevideo\.com[^"]*mime=audio[^"]*)"', html_content)
+            general_audio_matches = TURBOSCRIBE_AUDIO_RE.findall(html_content)
             if general_audio_matches:
                 audio_url = general_audio_matches[0].replace('&amp;', '&')
                 print(f"✅ Genel audio URL bulundu")
             else:
                 # Son çare: herhangi bir videoplayback URL'i
-                all_matches = re.findall(r'href="([^"]*videoplayback[^"]*)"', html_content)
+                all_matches = TURBOSCRIBE_PLAYBACK_RE.findall(html_content)
                 audio_candidates = [url for url in all_matches if 'mime=audio' in url or any(tag in url for tag in ['itag=140', 'itag=139', 'itag=251'])]
                 
                 if audio_candidates:
@@ -237,7 +2298,7 @@ def get_video_urls_from_savenow(video_id):
         video_url = f"https://www.youtube.com/watch?v={video_id}"
         
         # 1. İlk istek - download job başlat
-        api_url = f"https://p.savenow.to/ajax/download.php?copyright=0&format=720&url={quote(video_url)}"
+        api_url = f"{SAVENOW_API_BASE}/ajax/download.php?copyright=0&format=720&url={quote(video_url)}"
         
         headers = {
             'accept': '*/*',
@@ -258,7 +2319,8 @@ def get_video_urls_from_savenow(video_id):
         }
         
         print(f"🔄 SaveNow.to API'ye istek atılıyor...")
-        response = requests.get(api_url, headers=headers, timeout=30, verify=False)
+        with timed('provider.savenow.submit'):
+            response = requests.get(api_url, headers=headers, timeout=30, verify=False)
         
         if response.status_code != 200:
             return None, f"API hatası: {response.status_code}"
@@ -284,7 +2346,8 @@ def get_video_urls_from_savenow(video_id):
             try:
                 print(f"📊 Progress kontrol ediliyor... ({attempt + 1}/{max_attempts})")
                 
-                progress_response = requests.get(progress_url, headers=headers, timeout=15, verify=False)
+                with timed('provider.savenow.poll', attempt=attempt + 1):
+                    progress_response = requests.get(progress_url, headers=headers, timeout=15, verify=False)
                 
                 if progress_response.status_code != 200:
                     print(f"⚠️ Progress API hatası: {progress_response.status_code}")
@@ -355,7 +2418,10 @@ def get_video_urls(video_id):
     """Video URL'lerini al (SaveNow.to'dan tek URL - video+audio birlikte)"""
     try:
         # SaveNow.to'dan tek URL al (video+audio birlikte)
-        result, error = get_video_urls_from_savenow(video_id)
+        with timed('provider.resolve', provider='savenow') as span:
+            result, error = get_video_urls_from_savenow(video_id)
+            span['success'] = error is None
+        PROVIDER_REQUESTS.labels(provider='savenow', outcome='success' if error is None else 'error').inc()
         if error:
             print(f"❌ SaveNow.to hatası: {error}")
             return {"success": False, "error": error}
@@ -373,61 +2439,260 @@ def get_video_urls(video_id):
         print(f"❌ {error_msg}")
         return {"success": False, "error": error_msg}
 
-def cut_clip_from_url(video_url, audio_url, video_id, start, end, title, resolution):
+def classify_ffmpeg_error(error_details, returncode=None):
+    """FFmpeg stderr'inden hata sınıfı ve mesajı çıkar -> (error_class, error_msg)"""
+    if "Invalid data found when processing input" in error_details:
+        return 'invalid_data', f"FFmpeg hatası: Video/audio stream'e erişilemiyor. URL'ler geçersiz olabilir. Detay: {error_details[:300]}"
+    if "Connection refused" in error_details or "HTTP error" in error_details:
+        return 'connection', f"FFmpeg hatası: URL'lere bağlanılamıyor. Network sorunu olabilir. Detay: {error_details[:300]}"
+    if "No such file or directory" in error_details:
+        return 'missing_input', f"FFmpeg hatası: Input dosyası bulunamıyor. Detay: {error_details[:300]}"
+    if "SSL" in error_details or "certificate" in error_details:
+        return 'ssl', f"FFmpeg hatası: SSL sertifika sorunu. Detay: {error_details[:300]}"
+    if "403" in error_details or "Forbidden" in error_details:
+        return 'http_403', f"FFmpeg hatası: URL'lere erişim reddedildi (403). Detay: {error_details[:300]}"
+    if "404" in error_details or "Not Found" in error_details:
+        return 'http_404', f"FFmpeg hatası: URL bulunamadı (404). Detay: {error_details[:300]}"
+    if "timeout" in error_details.lower() or "timed out" in error_details.lower():
+        return 'timeout', f"FFmpeg hatası: Bağlantı zaman aşımı. Detay: {error_details[:300]}"
+    # Tam hata mesajını göster
+    return 'ffmpeg', f"FFmpeg hatası (code {returncode}): {error_details[:800]}"
+
+def classify_request_error(error):
+    """requests indirme hatasının sınıfı (retry politikası için)"""
+    if isinstance(error, WorkspaceFullError) or getattr(error, 'errno', None) == errno.ENOSPC:
+        return 'disk_full'
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        if error.response.status_code in (403, 404):
+            return f"http_{error.response.status_code}"
+    if isinstance(error, requests.exceptions.SSLError):
+        return 'ssl'
+    if isinstance(error, requests.exceptions.Timeout):
+        return 'timeout'
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return 'connection'
+    return 'download'
+
+def clip_retry_action(error_class, attempt):
+    """Başarısız clip için yapılacak: 'retry', 'refresh_urls' veya None (tekrar deneme)"""
+    if attempt >= MAX_CLIP_RETRIES:
+        return None
+    return CLIP_RETRY_POLICY.get(error_class)
+
+def clip_retry_delay(attempt):
+    """Exponential backoff (+%25'e kadar jitter) - aynı anda düşen clipler kaynağa birlikte yüklenmesin"""
+    return CLIP_RETRY_BACKOFF * (2 ** attempt) * (1 + random.random() * 0.25)
+
+def get_audio_urls(video_id):
+    """Sadece ses URL'ini al (TurboScribe.ai - itag 140/139/251), get_video_urls ile aynı yapıda"""
+    try:
+        with timed('provider.resolve', provider='turboscribe') as span:
+            result, error = get_audio_from_turboscribe(video_id)
+            span['success'] = error is None
+        PROVIDER_REQUESTS.labels(provider='turboscribe', outcome='success' if error is None else 'error').inc()
+        if error:
+            print(f"❌ TurboScribe.ai hatası: {error}")
+            return {"success": False, "error": error}
+        
+        return {
+            "success": True,
+            "video_url": result['audio_url'],  # Ses job'larında tek kaynak
+            "audio_url": result['audio_url'],
+            "title": result['title'],
+            "resolution": "audio"
+        }
+    
+    except Exception as e:
+        error_msg = f"Hata: {str(e)}"
+        print(f"❌ {error_msg}")
+        return {"success": False, "error": error_msg}
+
+def resolve_source_urls(video_id, mode='video'):
+    """Job moduna göre kaynak URL'lerini çöz"""
+    return get_audio_urls(video_id) if mode == 'audio' else get_video_urls(video_id)
+
+def cut_audio_clip(source, video_id, start, end, title, audio_format='m4a', on_progress=None):
+    """Sadece ses kesiti (-vn) - URL'den veya indirilmiş dosyadan, video decode/encode yok"""
+    with output_lock(generate_audio_filename(video_id, start, end, audio_format)):
+        return _cut_audio_clip(source, video_id, start, end, title, audio_format, on_progress)
+
+def _cut_audio_clip(source, video_id, start, end, title, audio_format='m4a', on_progress=None):
+    output_path = None
+    encode_path = None
+    
+    try:
+        output_file = generate_audio_filename(video_id, start, end, audio_format)
+        output_path = os.path.join(CLIPS_FOLDER, output_file)
+        
+        # Eğer dosya zaten varsa, tekrar kesme
+        if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+            print(f"✅ Ses kesiti zaten mevcut: {output_file}")
+            CACHE_LOOKUPS.labels(cache='clip', result='hit').inc()
+            file_size = os.path.getsize(output_path)
+            return {
+                "success": True,
+                "filename": output_file,
+                "video_info": {
+                    "title": title,
+                    "resolution": audio_format,
+                    "file_size": file_size,
+                    "file_size_mb": round(file_size / (1024 * 1024), 2)
+                }
+            }
+        CACHE_LOOKUPS.labels(cache='clip', result='miss').inc()
+        # Geçici adla yazılır, bitince son ada taşınır - yarım dosya cache hit sayılmasın
+        encode_path = partial_output_path(output_path)
+        
+        duration = end - start
+        cmd = ["ffmpeg"]
+        cmd += source_input_args(source)
+        cmd += [
+            "-ss", str(start),
+            "-i", source,
+            "-t", str(duration),
+            "-map", "0:a:0", "-vn",
+            *AUDIO_FORMATS[audio_format]['args'],
+            "-y", encode_path
+        ]
+        
+        print(f"🎧 Ses kesiti oluşturuluyor: {start}s - {end}s ({audio_format})")
+        with timed('clip.ffmpeg', mode='audio'):
+            result = run_ffmpeg(cmd, duration, on_progress)
+        
+        if result.returncode != 0:
+            error_class, error_msg = classify_ffmpeg_error(result.stderr or "Bilinmeyen FFmpeg hatası", result.returncode)
+            print(f"❌ {error_msg}")
+            if os.path.exists(encode_path):
+                os.remove(encode_path)
+            return {"success": False, "error": error_msg, "error_class": error_class}
+        
+        if not os.path.exists(encode_path) or os.path.getsize(encode_path) == 0:
+            if os.path.exists(encode_path):
+                os.remove(encode_path)
+            return {"success": False, "error": "Dosya boş oluşturuldu"}
+        
+        file_size = os.path.getsize(encode_path)
+        finish_clip_output(encode_path, output_path)
+        print(f"✅ Ses kesiti oluşturuldu: {output_file} ({round(file_size / 1024, 1)} KB)")
+        return {
+            "success": True,
+            "filename": output_file,
+            "video_info": {
+                "title": title,
+                "resolution": audio_format,
+                "file_size": file_size,
+                "file_size_mb": round(file_size / (1024 * 1024), 2)
+            }
+        }
+    
+    except subprocess.TimeoutExpired as e:
+        error_msg = f"FFmpeg timeout (>{int(e.timeout)} saniye): {start}s - {end}s"
+        print(f"❌ {error_msg}")
+        if encode_path and os.path.exists(encode_path):
+            os.remove(encode_path)
+        return {"success": False, "error": error_msg, "error_class": "stall" if isinstance(e, FFmpegStalledError) else "encode_timeout"}
+    
+    except Exception as e:
+        error_msg = f"Hata: {str(e)}"
+        print(f"❌ {error_msg}")
+        if encode_path and os.path.exists(encode_path):
+            try:
+                os.remove(encode_path)
+            except OSError:
+                pass
+        return {"success": False, "error": error_msg}
+
+def clip_output_lock(video_id, start, end, crop_track=None, output_format='mp4'):
+    """
+    Aynı çıktı dosyası için kilit - varlık kontrolü ile encode aynı kilit altında yapılır
+    
+    Yoksa ENDLIST'i henüz yazılmamış canlı bir HLS encode'u başka bir job'a (başka worker'daki
+    dahil) yarım kalmış görünür ve klasörü encode sürerken silinir.
+    """
+    output_file = generate_clip_filename(video_id, start, end, 'crop' if crop_track else 'letterbox')
+    if output_format == 'hls':
+        output_file = hls_playlist_name(output_file)
+    return output_lock(output_file)
+
+def cut_clip_from_url(video_url, audio_url, video_id, start, end, title, resolution, keyframes=None, probe=None, on_progress=None, previews=None,
+                      crop_track=None, output_format='mp4'):
     """Kesit oluştur - ARM64 için curl, diğerleri için direkt URL"""
+    with clip_output_lock(video_id, start, end, crop_track, output_format):
+        return _cut_clip_from_url(video_url, audio_url, video_id, start, end, title, resolution, keyframes, probe, on_progress, previews,
+                                  crop_track, output_format)
+
+def _cut_clip_from_url(video_url, audio_url, video_id, start, end, title, resolution, keyframes=None, probe=None, on_progress=None, previews=None,
+                       crop_track=None, output_format='mp4'):
     output_path = None
+    encode_path = None
+    temp_dir = None
     temp_video = None
     temp_audio = None
     
     try:
-        output_file = generate_clip_filename(video_id, start, end)
+        output_file = generate_clip_filename(video_id, start, end, 'crop' if crop_track else 'letterbox')
+        if output_format == 'hls':
+            output_file = hls_playlist_name(output_file)
         output_path = os.path.join(CLIPS_FOLDER, output_file)
+        # Yarım kalmış (ENDLIST'siz) HLS playlist'i mevcut kesit sayılmaz
+        if output_format == 'hls' and os.path.exists(output_path) and not read_hls_playlist(output_path)[1]:
+            prepare_clip_output(output_path)
         
         # Eğer dosya zaten varsa, tekrar kesme
         if os.path.exists(output_path):
-            file_size = os.path.getsize(output_path)
+            file_size = clip_output_size(output_path)
             if file_size > 0:
                 print(f"✅ Kesit zaten mevcut: {output_file} ({file_size} bytes)")
-                return {
+                CACHE_LOOKUPS.labels(cache='clip', result='hit').inc()
+                result = {
                     "success": True,
                     "filename": output_file,
                     "video_info": {
                         "title": title,
-                        "resolution": resolution,
+                        "resolution": REELS_RESOLUTION,
+                        "source_resolution": resolution,
                         "file_size": file_size,
                         "file_size_mb": round(file_size / (1024 * 1024), 2)
                     }
                 }
+                if previews:
+                    result["previews"] = ensure_previews(output_file, previews, end - start)
+                return result
             else:
                 print(f"⚠️ Boş dosya bulundu, siliniyor: {output_file}")
-                os.remove(output_path)
+                remove_clip_output(output_path)
+        CACHE_LOOKUPS.labels(cache='clip', result='miss').inc()
+        # Encode geçici dosyaya yazılır, bitince son ada taşınır - yarım dosya cache hit sayılmasın
+        encode_path = partial_output_path(output_path)
         
         print(f"✂️ Kesit oluşturuluyor: {start}s - {end}s (video: {video_id})")
         duration = end - start
+        encoder_plan = plan_encoder(duration, probe)
+        # Önceki keyframe'e hızlı seek + kalan kısım için hassas output seek
+        input_seek, output_seek = seek_args(start, keyframes)
+        offset = float(output_seek[1]) if output_seek else 0
+        # Crop modunda kırpma penceresi yörüngeyi izler (filtre zamanı input seek noktasından başlar)
+        video_filter = reframe_filter(crop_track, float(input_seek[1]), offset + duration) if crop_track else None
+        # İstenen önizlemeler aynı decode'dan ek çıktı olarak üretilir
+        preview_names = preview_filenames(output_file, requested_previews(previews))
+        video_args, preview_args = reels_video_args(preview_names, duration, offset, video_filter)
+        print(f"🎛️ Encoder: preset={encoder_plan['preset']}, threads={encoder_plan['threads']}, eşzamanlı={encoder_plan['concurrent_encodes']}, timeout={encoder_plan['timeout']}s")
         
-        # Platform kontrolü - ARM64 veya Windows için indirme modu
-        import platform
-        is_arm64 = platform.machine() in ['aarch64', 'arm64']
-        is_windows = platform.system() == 'Windows'
-        use_download_mode = is_arm64 or is_windows  # Her iki durumda da indir
+        # ARM64 veya Windows için indirme modu
+        use_download_mode = USE_DOWNLOAD_MODE
         
-        user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36"
+        user_agent = SOURCE_USER_AGENT
         
         if use_download_mode:
-            if is_windows:
+            if IS_WINDOWS:
                 print(f"🔧 Windows tespit edildi - indirme modu aktif")
             else:
                 print(f"🔧 ARM64 tespit edildi - indirme modu aktif")
             
-            # Geçici dosya isimleri
-            if is_windows:
-                import tempfile
-                temp_dir = tempfile.gettempdir()
-                temp_video = os.path.join(temp_dir, f"{video_id}_v_{start}_{end}.mp4")
-                temp_audio = os.path.join(temp_dir, f"{video_id}_a_{start}_{end}.m4a")
-            else:
-                temp_video = f"/tmp/{video_id}_v_{start}_{end}.mp4"
-                temp_audio = f"/tmp/{video_id}_a_{start}_{end}.m4a"
+            # Geçici dosyalar bu çağrıya özel klasörde (sonunda her durumda silinir)
+            temp_dir = WORKSPACE.scratch_dir(getattr(_job_context, 'job_id', None))
+            temp_video = os.path.join(temp_dir, "video.mp4")
+            temp_audio = os.path.join(temp_dir, "audio.m4a")
             
             # 1. Video indir (Python requests ile)
             print(f"📥 Video indiriliyor...")
@@ -448,20 +2713,23 @@ def cut_clip_from_url(video_url, audio_url, video_id, start, end, title, resolut
                     'Referer': 'https://vidfly.ai/'
                 }
                 
-                response = requests.get(video_url, headers=headers, stream=True, verify=False, timeout=180)
-                response.raise_for_status()
-                
-                with open(temp_video, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
+                with timed('clip.download_video'):
+                    response = requests.get(video_url, headers=headers, stream=True, verify=False, timeout=180)
+                    response.raise_for_status()
+                    WORKSPACE.ensure_space(int(response.headers.get('Content-Length') or 0))
+                    
+                    with open(temp_video, 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=8192):
+                            if chunk:
+                                f.write(chunk)
                 
+                DOWNLOAD_BYTES.labels(kind='video').inc(os.path.getsize(temp_video))
                 print(f"✅ Video indirildi: {os.path.getsize(temp_video)} bytes")
                 
             except Exception as e:
                 error_msg = f"Video indirme hatası: {str(e)[:200]}"
                 print(f"❌ {error_msg}")
-                return {"success": False, "error": error_msg}
+                return {"success": False, "error": error_msg, "error_class": classify_request_error(e)}
             
             # Video dosya boyutu kontrol
             if not os.path.exists(temp_video) or os.path.getsize(temp_video) < 1000:
@@ -486,20 +2754,22 @@ def cut_clip_from_url(video_url, audio_url, video_id, start, end, title, resolut
                     'Referer': 'https://vidfly.ai/'
                 }
                 
-                response = requests.get(audio_url, headers=headers, stream=True, verify=False, timeout=180)
-                response.raise_for_status()
-                
-                with open(temp_audio, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
+                with timed('clip.download_audio'):
+                    response = requests.get(audio_url, headers=headers, stream=True, verify=False, timeout=180)
+                    response.raise_for_status()
+                    
+                    with open(temp_audio, 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=8192):
+                            if chunk:
+                                f.write(chunk)
                 
+                DOWNLOAD_BYTES.labels(kind='audio').inc(os.path.getsize(temp_audio))
                 print(f"✅ Audio indirildi: {os.path.getsize(temp_audio)} bytes")
                 
             except Exception as e:
                 error_msg = f"Audio indirme hatası: {str(e)[:200]}"
                 print(f"❌ {error_msg}")
-                return {"success": False, "error": error_msg}
+                return {"success": False, "error": error_msg, "error_class": classify_request_error(e)}
             
             # Audio dosya boyutu kontrol
             if not os.path.exists(temp_audio) or os.path.getsize(temp_audio) < 1000:
@@ -510,46 +2780,55 @@ def cut_clip_from_url(video_url, audio_url, video_id, start, end, title, resolut
             # 3. Local dosyalardan Instagram Reels formatında kes (letterbox)
             cmd = [
                 "ffmpeg",
-                "-ss", str(start),
+                "-filter_threads", str(encoder_plan['filter_threads']),
+                *input_seek,
                 "-i", temp_video,
-                "-ss", str(start),
+                *input_seek,
                 "-i", temp_audio,
+                *output_seek,
                 "-t", str(duration),
-                "-map", "0:v", "-map", "1:a",
                 # Instagram Reels letterbox formatı (üst/alt siyah bar)
-                "-vf", "scale=1080:1920:force_original_aspect_ratio=decrease,pad=1080:1920:(ow-iw)/2:(oh-ih)/2:black",
-                "-c:v", "libx264", "-preset", "fast", "-crf", "23",
-                "-c:a", "aac", "-b:a", "128k", "-ar", "44100",
+                *video_args,
+                "-map", "1:a",
+                *encoder_video_args(encoder_plan),
+                *ENCODER_PROFILE['audio_args'],
                 "-avoid_negative_ts", "make_zero",
-                "-movflags", "+faststart", "-y", output_path
+                *output_container_args(encode_path),
+                *preview_args
             ]
         else:
             print(f"🔧 Standart platform - direkt URL modu")
             # Diğer platformlar için direkt URL (Instagram Reels letterbox)
             cmd = [
                 "ffmpeg",
+                "-filter_threads", str(encoder_plan['filter_threads']),
                 "-user_agent", user_agent,
-                "-referer", "https://downloaderto.com/",
-                "-ss", str(start),
+                "-referer", SOURCE_REFERER,
+                *input_seek,
                 "-i", video_url,
                 "-user_agent", user_agent,
-                "-referer", "https://downloaderto.com/",
-                "-ss", str(start),
+                "-referer", SOURCE_REFERER,
+                *input_seek,
                 "-i", audio_url,
+                *output_seek,
                 "-t", str(duration),
-                "-map", "0:v", "-map", "1:a",
                 # Instagram Reels letterbox formatı (üst/alt siyah bar)
-                "-vf", "scale=1080:1920:force_original_aspect_ratio=decrease,pad=1080:1920:(ow-iw)/2:(oh-ih)/2:black",
-                "-c:v", "libx264", "-preset", "fast", "-crf", "23",
-                "-c:a", "aac", "-b:a", "128k", "-ar", "44100",
+                *video_args,
+                "-map", "1:a",
+                *encoder_video_args(encoder_plan),
+                *ENCODER_PROFILE['audio_args'],
                 "-avoid_negative_ts", "make_zero",
-                "-movflags", "+faststart", "-y", output_path
+                *output_container_args(encode_path),
+                *preview_args
             ]
         
+        prepare_clip_output(encode_path)
+        
         # FFmpeg'i çalıştır
         print(f"🔄 FFmpeg başlatılıyor...")
         print(f"🔧 FFmpeg komutu: {' '.join(cmd[:10])}...")  # İlk 10 parametreyi göster
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300, encoding='utf-8', errors='replace')
+        with timed('clip.ffmpeg', mode='download' if use_download_mode else 'url'):
+            result = run_ffmpeg(cmd, duration, on_progress, encoder_plan)
         
         # Geçici dosyaları temizle (indirme modu)
         if use_download_mode:
@@ -574,90 +2853,80 @@ def cut_clip_from_url(video_url, audio_url, video_id, start, end, title, resolut
             print(f"📋 FFmpeg stdout: {stdout_preview}")
         
         if result.returncode != 0:
-            # Daha detaylı hata analizi
+            # Daha detaylı hata analizi (sınıf retry politikasında kullanılır)
             error_details = result.stderr if result.stderr else "Bilinmeyen FFmpeg hatası"
-            
-            # Daha detaylı hata analizi
-            if "Invalid data found when processing input" in error_details:
-                error_msg = f"FFmpeg hatası: Video/audio stream'e erişilemiyor. URL'ler geçersiz olabilir. Detay: {error_details[:300]}"
-            elif "Connection refused" in error_details or "HTTP error" in error_details:
-                error_msg = f"FFmpeg hatası: URL'lere bağlanılamıyor. Network sorunu olabilir. Detay: {error_details[:300]}"
-            elif "No such file or directory" in error_details:
-                error_msg = f"FFmpeg hatası: Input dosyası bulunamıyor. Detay: {error_details[:300]}"
-            elif "SSL" in error_details or "certificate" in error_details:
-                error_msg = f"FFmpeg hatası: SSL sertifika sorunu. Detay: {error_details[:300]}"
-            elif "403" in error_details or "Forbidden" in error_details:
-                error_msg = f"FFmpeg hatası: URL'lere erişim reddedildi (403). Detay: {error_details[:300]}"
-            elif "404" in error_details or "Not Found" in error_details:
-                error_msg = f"FFmpeg hatası: URL bulunamadı (404). Detay: {error_details[:300]}"
-            elif "timeout" in error_details.lower() or "timed out" in error_details.lower():
-                error_msg = f"FFmpeg hatası: Bağlantı zaman aşımı. Detay: {error_details[:300]}"
-            else:
-                # Tam hata mesajını göster
-                error_msg = f"FFmpeg hatası (code {result.returncode}): {error_details[:800]}"
+            error_class, error_msg = classify_ffmpeg_error(error_details, result.returncode)
             
             print(f"❌ {error_msg}")
             print(f"🔍 Kullanılan video URL: {video_url[:100]}...")
             print(f"🔍 Kullanılan audio URL: {audio_url[:100]}...")
             
             # Hatalı dosyayı temizle
-            if output_path and os.path.exists(output_path):
+            if encode_path and os.path.exists(encode_path):
                 try:
-                    os.remove(output_path)
+                    remove_clip_output(encode_path)
                 except:
                     pass
-            return {"success": False, "error": error_msg}
+            return {"success": False, "error": error_msg, "error_class": error_class}
         
         # Dosya oluşturuldu mu ve boyutu 0'dan büyük mü kontrol et
-        if not os.path.exists(output_path):
+        if not os.path.exists(encode_path):
             error_msg = "Dosya oluşturulamıyor"
             print(f"❌ {error_msg}")
             return {"success": False, "error": error_msg}
         
-        file_size = os.path.getsize(output_path)
+        file_size = clip_output_size(encode_path)
         if file_size == 0:
             error_msg = "Dosya boş oluşturuldu (0 byte)"
             print(f"❌ {error_msg}")
             try:
-                os.remove(output_path)  # Boş dosyayı sil
+                remove_clip_output(encode_path)  # Boş dosyayı sil
             except:
                 pass
             return {"success": False, "error": error_msg}
         
+        finish_clip_output(encode_path, output_path)
         print(f"✅ Kesit oluşturuldu: {output_file} ({file_size} bytes, {round(file_size / (1024 * 1024), 2)} MB)")
-        return {
+        result = {
             "success": True,
             "filename": output_file,
             "video_info": {
                 "title": title,
-                "resolution": resolution,
+                "resolution": REELS_RESOLUTION,
+                "source_resolution": resolution,
                 "file_size": file_size,
                 "file_size_mb": round(file_size / (1024 * 1024), 2)
             }
         }
+        if preview_names:
+            result["previews"] = collect_previews(preview_names, duration)
+        return result
     
-    except subprocess.TimeoutExpired:
-        error_msg = f"İşlem timeout (>5 dakika): {start}s - {end}s"
+    except subprocess.TimeoutExpired as e:
+        if isinstance(e, FFmpegStalledError):
+            error_msg = f"FFmpeg {int(e.timeout)}s boyunca ilerlemedi: {start}s - {end}s"
+        else:
+            error_msg = f"İşlem timeout (>{int(e.timeout)} saniye): {start}s - {end}s"
         print(f"❌ {error_msg}")
         # Timeout durumunda dosyaları temizle
         try:
-            if output_path and os.path.exists(output_path):
-                os.remove(output_path)
+            if encode_path and os.path.exists(encode_path):
+                remove_clip_output(encode_path)
             if temp_video and os.path.exists(temp_video):
                 os.remove(temp_video)
             if temp_audio and os.path.exists(temp_audio):
                 os.remove(temp_audio)
         except:
             pass
-        return {"success": False, "error": error_msg}
+        return {"success": False, "error": error_msg, "error_class": "stall" if isinstance(e, FFmpegStalledError) else "encode_timeout"}
             
     except Exception as e:
         error_msg = f"Hata: {str(e)}"
         print(f"❌ {error_msg}")
         # Hata durumunda dosyaları temizle
         try:
-            if output_path and os.path.exists(output_path):
-                os.remove(output_path)
+            if encode_path and os.path.exists(encode_path):
+                remove_clip_output(encode_path)
             if temp_video and os.path.exists(temp_video):
                 os.remove(temp_video)
             if temp_audio and os.path.exists(temp_audio):
@@ -665,56 +2934,91 @@ def cut_clip_from_url(video_url, audio_url, video_id, start, end, title, resolut
         except:
             pass
         return {"success": False, "error": error_msg}
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
 
-def cut_clip_from_local_file(temp_file, video_id, start, end, title, resolution):
+def cut_clip_from_local_file(temp_file, video_id, start, end, title, resolution, keyframes=None, probe=None, on_progress=None, previews=None,
+                             crop_track=None, output_format='mp4'):
     """Local dosyadan kesit oluştur (Instagram Reels formatında 9:16)"""
+    with clip_output_lock(video_id, start, end, crop_track, output_format):
+        return _cut_clip_from_local_file(temp_file, video_id, start, end, title, resolution, keyframes, probe, on_progress, previews,
+                                         crop_track, output_format)
+
+def _cut_clip_from_local_file(temp_file, video_id, start, end, title, resolution, keyframes=None, probe=None, on_progress=None, previews=None,
+                              crop_track=None, output_format='mp4'):
     output_path = None
+    encode_path = None
     
     try:
-        output_file = generate_clip_filename(video_id, start, end)
+        output_file = generate_clip_filename(video_id, start, end, 'crop' if crop_track else 'letterbox')
+        if output_format == 'hls':
+            output_file = hls_playlist_name(output_file)
         output_path = os.path.join(CLIPS_FOLDER, output_file)
+        # Yarım kalmış (ENDLIST'siz) HLS playlist'i mevcut kesit sayılmaz
+        if output_format == 'hls' and os.path.exists(output_path) and not read_hls_playlist(output_path)[1]:
+            prepare_clip_output(output_path)
         
         # Eğer dosya zaten varsa, tekrar kesme
         if os.path.exists(output_path):
-            file_size = os.path.getsize(output_path)
+            file_size = clip_output_size(output_path)
             if file_size > 0:
                 print(f"✅ Kesit zaten mevcut: {output_file}")
-                return {
+                CACHE_LOOKUPS.labels(cache='clip', result='hit').inc()
+                result = {
                     "success": True,
                     "filename": output_file,
                     "video_info": {
                         "title": title,
-                        "resolution": "1080x1920 (9:16)",
+                        "resolution": REELS_RESOLUTION,
+                        "source_resolution": resolution,
                         "file_size": file_size,
                         "file_size_mb": round(file_size / (1024 * 1024), 2)
                     }
                 }
+                if previews:
+                    result["previews"] = ensure_previews(output_file, previews, end - start)
+                return result
             else:
-                os.remove(output_path)
+                remove_clip_output(output_path)
+        CACHE_LOOKUPS.labels(cache='clip', result='miss').inc()
+        # Encode geçici dosyaya yazılır, bitince son ada taşınır - yarım dosya cache hit sayılmasın
+        encode_path = partial_output_path(output_path)
         
         duration = end - start
+        encoder_plan = plan_encoder(duration, probe)
+        # Önceki keyframe'e hızlı seek + kalan kısım için hassas output seek
+        input_seek, output_seek = seek_args(start, keyframes)
+        offset = float(output_seek[1]) if output_seek else 0
+        # Crop modunda kırpma penceresi yörüngeyi izler (filtre zamanı input seek noktasından başlar)
+        video_filter = reframe_filter(crop_track, float(input_seek[1]), offset + duration) if crop_track else None
+        
+        # İstenen önizlemeler aynı decode'dan ek çıktı olarak üretilir
+        preview_names = preview_filenames(output_file, requested_previews(previews))
+        video_args, preview_args = reels_video_args(preview_names, duration, offset, video_filter)
         
         # Instagram Reels formatında kes (9:16 letterbox - üst/alt siyah bar)
         cmd = [
             "ffmpeg",
-            "-ss", str(start),
+            "-filter_threads", str(encoder_plan['filter_threads']),
+            *input_seek,
             "-i", temp_file,
+            *output_seek,
             "-t", str(duration),
             # Video filtreleri - Letterbox format (tüm içerik görünsün)
-            "-vf", "scale=1080:1920:force_original_aspect_ratio=decrease,pad=1080:1920:(ow-iw)/2:(oh-ih)/2:black",
-            "-c:v", "libx264",  # H.264 codec (Instagram uyumlu)
-            "-preset", "fast",  # Encoding hızı
-            "-crf", "23",       # Kalite (18-28 arası, 23 iyi)
-            "-c:a", "aac",      # AAC audio codec
-            "-b:a", "128k",     # Audio bitrate
-            "-ar", "44100",     # Audio sample rate
+            *video_args,
+            "-map", "0:a:0?",
+            *encoder_video_args(encoder_plan),  # H.264 (preset/threads host'a göre)
+            *ENCODER_PROFILE['audio_args'],     # AAC 128k 44.1kHz
             "-avoid_negative_ts", "make_zero",
-            "-movflags", "+faststart", 
-            "-y", output_path
+            *output_container_args(encode_path),
+            *preview_args
         ]
         
+        prepare_clip_output(encode_path)
         print(f"🔧 FFmpeg komutu: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300, encoding='utf-8', errors='replace')
+        with timed('clip.ffmpeg', mode='local'):
+            result = run_ffmpeg(cmd, duration, on_progress, encoder_plan)
         
         # FFmpeg stderr'ini logla
         if result.stderr:
@@ -729,69 +3033,74 @@ def cut_clip_from_local_file(temp_file, video_id, start, end, title, resolution)
             error_msg = f"FFmpeg hatası (code {result.returncode}): {error_details[:500]}"
             print(f"❌ {error_msg}")
             
-            if output_path and os.path.exists(output_path):
+            if encode_path and os.path.exists(encode_path):
                 try:
-                    os.remove(output_path)
+                    remove_clip_output(encode_path)
                 except:
                     pass
-            return {"success": False, "error": error_msg}
+            return {"success": False, "error": error_msg, "error_class": classify_ffmpeg_error(error_details)[0]}
         
         # Dosya kontrolü
-        if not os.path.exists(output_path):
+        if not os.path.exists(encode_path):
             return {"success": False, "error": "Dosya oluşturulamadı"}
         
-        file_size = os.path.getsize(output_path)
+        file_size = clip_output_size(encode_path)
         if file_size == 0:
             try:
-                os.remove(output_path)
+                remove_clip_output(encode_path)
             except:
                 pass
             return {"success": False, "error": "Dosya boş oluşturuldu"}
         
+        finish_clip_output(encode_path, output_path)
         print(f"✅ Instagram Reels kesiti oluşturuldu: {output_file} ({round(file_size / (1024 * 1024), 2)} MB)")
-        return {
+        result = {
             "success": True,
             "filename": output_file,
             "video_info": {
                 "title": title,
-                "resolution": "1080x1920 (9:16)",
+                "resolution": REELS_RESOLUTION,
+                "source_resolution": resolution,
                 "file_size": file_size,
                 "file_size_mb": round(file_size / (1024 * 1024), 2)
             }
         }
+        if preview_names:
+            result["previews"] = collect_previews(preview_names, duration)
+        return result
     
-    except subprocess.TimeoutExpired:
-        error_msg = f"FFmpeg timeout: {start}s - {end}s"
+    except subprocess.TimeoutExpired as e:
+        if isinstance(e, FFmpegStalledError):
+            error_msg = f"FFmpeg {int(e.timeout)}s boyunca ilerlemedi: {start}s - {end}s"
+        else:
+            error_msg = f"FFmpeg timeout (>{int(e.timeout)} saniye): {start}s - {end}s"
         print(f"❌ {error_msg}")
-        if output_path and os.path.exists(output_path):
+        if encode_path and os.path.exists(encode_path):
             try:
-                os.remove(output_path)
+                remove_clip_output(encode_path)
             except:
                 pass
-        return {"success": False, "error": error_msg}
+        return {"success": False, "error": error_msg, "error_class": "stall" if isinstance(e, FFmpegStalledError) else "encode_timeout"}
             
     except Exception as e:
         error_msg = f"Hata: {str(e)}"
         print(f"❌ {error_msg}")
-        if output_path and os.path.exists(output_path):
+        if encode_path and os.path.exists(encode_path):
             try:
-                os.remove(output_path)
+                remove_clip_output(encode_path)
             except:
                 pass
         return {"success": False, "error": error_msg}
 
-def cleanup_job(job_id):
-    """Job'u 10 dakika sonra sil"""
-    time.sleep(600)  # 10 dakika bekle
-    job = get_job(job_id)
-    if job:
-        print(f"🗑️ Job siliniyor: {job_id}")
-        delete_job(job_id)
-
 def process_clips_async(job_id, video_id, clips, video_url, audio_url, title, resolution):
     """Clipleri async olarak işle - TEK İNDİRME MANTIGI"""
     job = None
     temp_file = None
+    cancelled = False
+    recorder = SpanRecorder()
+    previous_recorder = set_timing_recorder(recorder)
+    previous_job = set_current_job(job_id)
+    job_counter = time.perf_counter()
     
     try:
         results = []
@@ -803,18 +3112,90 @@ def process_clips_async(job_id, video_id, clips, video_url, audio_url, title, re
             print(f"❌ Job bulunamadı: {job_id}")
             return
         
+        # İstek aşamasında (URL çözme vb.) toplanan span'lere devam et
+        recorder = SpanRecorder(job.get('timings'))
+        set_timing_recorder(recorder)
+        try:
+            created_at = datetime.fromisoformat(job['created_at'])
+            record_span('job.queue_wait', created_at.timestamp(), max((datetime.now() - created_at).total_seconds(), 0))
+        except (KeyError, TypeError, ValueError):
+            pass
+        
+        # Önceki çalıştırmadan (restart öncesi) kalan clip durumları - biten clipler tekrar kesilmez
+        clip_states = job.get('clip_states') or initial_clip_states(clips)
+        for clip_state in clip_states:
+            output = clip_state.get('output')
+            if clip_state['state'] == 'running':
+                # Tek dosyalık çıktılar geçici adla yazılır, son yol başka job'un bitmiş kesiti olabilir.
+                # Sadece yerinde yazılan HLS'in ENDLIST'siz klasörü yarım encode'dur (kilit: başka worker yazıyor olabilir)
+                if output and output.endswith('.m3u8'):
+                    with output_lock(output):
+                        playlist_path = os.path.join(CLIPS_FOLDER, output)
+                        if os.path.exists(playlist_path) and not read_hls_playlist(playlist_path)[1]:
+                            remove_clip_output(playlist_path)
+                clip_state['state'] = 'pending'
+            elif clip_state['state'] == 'done' and not (output and os.path.exists(os.path.join(CLIPS_FOLDER, output))):
+                clip_state['state'] = 'pending'
+        completed = set()
+        for clip_state in clip_states:
+            if clip_state['state'] == 'done':
+                results.append(clip_state['result'])
+            elif clip_state['state'] == 'failed':
+                errors.append({
+                    'index': clip_state['index'],
+                    'error': clip_state.get('error'),
+                    'clip': {'start': clip_state['start'], 'end': clip_state['end']}
+                })
+            else:
+                continue
+            completed.add(clip_state['index'])
+        if completed:
+            print(f"♻️ Job devam ettiriliyor: {len(completed)}/{len(clips)} clip önceki çalıştırmada bitmiş")
+        
         job['status'] = 'processing'
         job['total'] = len(clips)
-        job['processed'] = 0
+        job['processed'] = len(completed)
+        job['progress'] = round(len(completed) * 100 / max(len(clips), 1), 1)
+        job['clip_states'] = clip_states
         save_job(job_id, job)
+        JOB_HEARTBEAT.add(job_id)
+        
+        priority = job.get('priority', 'interactive')
+        client_id = job.get('client_id', 'anonymous')
+        previews = job.get('previews', DEFAULT_PREVIEWS)
+        mode = job.get('mode', 'video')
+        audio_format = job.get('audio_format', 'm4a')
+        framing = job.get('framing', 'letterbox')
+        output_format = job.get('output', 'mp4')
+        if mode == 'audio':
+            previews = []  # ses job'unda görsel önizleme yok
         
-        print(f"🔄 Processing started for job {job_id} with {len(clips)} clips")
+        print(f"🔄 Processing started for job {job_id} with {len(clips)} clips ({mode})")
+        
+        # Analiz cache'teyse (örn. job kuyruktayken başka job çıkardı) kaynağa hiç dokunulmaz
+        cached_analysis = get_source_analysis(video_id, None, build=False) if mode == 'analysis' else None
+        
+        # Kaynağı bir kez probe et (URL'de sadece header okunur), imkansız aralıkları encode'dan önce ele
+        # Ses kaynağı probe edilmez - video_id bazlı probe cache'ini ses stream'i ile kirletmesin
+        probe = get_source_probe(video_id, video_url, build=not cached_analysis) if mode != 'audio' else None
+        resolution = probe_resolution(probe, resolution)
+        range_errors = {}
+        for idx, clip in enumerate(clips):
+            if clip.get('start') is not None and clip.get('end') is not None:
+                range_error = validate_clip_range(clip.get('start'), clip.get('end'), probe)
+                if range_error:
+                    range_errors[idx] = range_error
+        has_valid_clips = (mode == 'analysis' and not cached_analysis) or any(
+            clip.get('start') is not None and clip.get('end') is not None and idx not in range_errors and idx not in completed
+            for idx, clip in enumerate(clips)
+        )
+        # ETA için encode edilecek clip süreleri
+        clip_seconds = [
+            0 if idx in range_errors or idx in completed else max(clip_duration(clip.get('start'), clip.get('end')) or 0, 0)
+            for idx, clip in enumerate(clips)
+        ]
         
-        # Platform kontrolü
-        import platform
-        is_arm64 = platform.machine() in ['aarch64', 'arm64']
-        is_windows = platform.system() == 'Windows'
-        use_download_mode = is_arm64 or is_windows
+        use_download_mode = USE_DOWNLOAD_MODE
         
         # User-Agent rotation (bot detection önlemi)
         user_agents = [
@@ -824,100 +3205,181 @@ def process_clips_async(job_id, video_id, clips, video_url, audio_url, title, re
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:133.0) Gecko/20100101 Firefox/133.0",
             "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:133.0) Gecko/20100101 Firefox/133.0"
         ]
-        import random
         user_agent = random.choice(user_agents)
         print(f"🔄 Kullanılan User-Agent: {user_agent[:50]}...")
         
-        if use_download_mode:
-            if is_windows:
+        keyframes = None
+        if cached_analysis:
+            print(f"♻️ Analiz cache'te - indirme ve probe atlanıyor")
+            SCHEDULER.source_ready(job_id)
+        elif not has_valid_clips:
+            print(f"⚠️ Geçerli clip yok - indirme ve encode atlanıyor")
+            SCHEDULER.source_ready(job_id)
+        elif use_download_mode:
+            if IS_WINDOWS:
                 print(f"🔧 Windows tespit edildi - tek indirme modu")
             else:
                 print(f"🔧 ARM64 tespit edildi - tek indirme modu")
             
-            # Geçici dosya ismi (JOB için tek dosya - video+audio birlikte)
-            if is_windows:
-                import tempfile
-                temp_dir = tempfile.gettempdir()
-                temp_file = os.path.join(temp_dir, f"{video_id}_full.mp4")
-            else:
-                temp_file = f"/tmp/{video_id}_full.mp4"
+            # Geçici dosya job'un kendi çalışma alanında (aynı videoyu işleyen diğer job'lar ezemez)
+            temp_file = os.path.join(WORKSPACE.job_dir(job_id), f"{video_id}_audio.m4a" if mode == 'audio' else f"{video_id}_full.mp4")
             
-            # 1. TEK SEFERLIK DOSYA İNDİR (video+audio birlikte)
-            print(f"📥 Tam dosya indiriliyor... (video+audio birlikte)")
-            try:
-                # SaveNow.to için headers
-                headers = {
-                    'User-Agent': user_agent,
-                    'Accept': '*/*',
-                    'Accept-Language': 'tr-TR,tr;q=0.9,en-US;q=0.8,en;q=0.7',
-                    'Accept-Encoding': 'gzip, deflate, br',
-                    'Cache-Control': 'no-cache',
-                    'Pragma': 'no-cache',
-                    'DNT': '1',
-                    'Connection': 'keep-alive',
-                    'Sec-Fetch-Dest': 'video',
-                    'Sec-Fetch-Mode': 'no-cors',
-                    'Sec-Fetch-Site': 'cross-site',
-                    'Referer': 'https://downloaderto.com/',
-                    'Origin': 'https://downloaderto.com'
-                }
-                
-                # Güçlü retry mekanizması
-                max_retries = 5
-                for attempt in range(max_retries):
-                    try:
-                        print(f"📥 Dosya indirme denemesi {attempt + 1}/{max_retries}")
-                        
-                        # Her denemede farklı delay
-                        if attempt > 0:
-                            delay = attempt * 2  # 2, 4, 6, 8 saniye
-                            print(f"⏳ {delay} saniye bekleniyor...")
-                            time.sleep(delay)
-                        
-                        # Session kullan (cookie persistence)
-                        session = requests.Session()
-                        session.headers.update(headers)
-                        
-                        # video_url ve audio_url aynı (SaveNow.to'dan)
-                        response = session.get(video_url, stream=True, verify=False, timeout=300)
-                        response.raise_for_status()
-                        break  # Başarılı ise döngüden çık
-                        
-                    except requests.exceptions.HTTPError as http_err:
-                        if response.status_code == 403:
-                            print(f"❌ 403 Forbidden - Deneme {attempt + 1}")
+            # Önceki çalıştırmadan (restart öncesi) tam inmiş kaynak kaldıysa tekrar indirme
+            if os.path.exists(temp_file) and os.path.getsize(temp_file) > 0:
+                print(f"♻️ Önceki çalıştırmadan kalan kaynak kullanılıyor: {temp_file}")
+            else:
+                # 1. TEK SEFERLIK DOSYA İNDİR (video+audio birlikte)
+                print(f"📥 Tam dosya indiriliyor... (video+audio birlikte)")
+                try:
+                    # SaveNow.to için headers
+                    headers = {
+                        'User-Agent': user_agent,
+                        'Accept': '*/*',
+                        'Accept-Language': 'tr-TR,tr;q=0.9,en-US;q=0.8,en;q=0.7',
+                        'Accept-Encoding': 'gzip, deflate, br',
+                        'Cache-Control': 'no-cache',
+                        'Pragma': 'no-cache',
+                        'DNT': '1',
+                        'Connection': 'keep-alive',
+                        'Sec-Fetch-Dest': 'video',
+                        'Sec-Fetch-Mode': 'no-cors',
+                        'Sec-Fetch-Site': 'cross-site',
+                        'Referer': 'https://downloaderto.com/',
+                        'Origin': 'https://downloaderto.com'
+                    }
+                    
+                    # Güçlü retry mekanizması
+                    max_retries = 5
+                    urls_refreshed = False
+                    for attempt in range(max_retries):
+                        try:
+                            print(f"📥 Dosya indirme denemesi {attempt + 1}/{max_retries}")
+                            
+                            # Her denemede farklı delay
+                            if attempt > 0:
+                                delay = attempt * 2  # 2, 4, 6, 8 saniye
+                                print(f"⏳ {delay} saniye bekleniyor...")
+                                time.sleep(delay)
+                            
+                            # Session kullan (cookie persistence)
+                            session = requests.Session()
+                            session.headers.update(headers)
+                            
+                            # video_url ve audio_url aynı (SaveNow.to'dan)
+                            response = session.get(video_url, stream=True, verify=False, timeout=300)
+                            response.raise_for_status()
+                            # Diski doldurmadan önce kota kontrolü (boyut bilinmiyorsa tahmini değer)
+                            WORKSPACE.ensure_space(int(response.headers.get('Content-Length') or 0))
+                            break  # Başarılı ise döngüden çık
+                            
+                        except requests.exceptions.HTTPError as http_err:
+                            if response.status_code in (403, 404):
+                                print(f"❌ {response.status_code} - Deneme {attempt + 1}")
+                                if attempt < max_retries - 1:
+                                    # İmzalı URL'nin süresi dolmuş olabilir - bir kez yeniden çöz
+                                    if not urls_refreshed:
+                                        urls_refreshed = True
+                                        url_result = resolve_source_urls(video_id, mode)
+                                        if url_result.get('success'):
+                                            print(f"🔁 Video URL'leri yeniden çözüldü")
+                                            video_url, audio_url = url_result['video_url'], url_result['audio_url']
+                                    continue
+                            raise http_err
+                        except WorkspaceFullError:
+                            raise
+                        except Exception as e:
                             if attempt < max_retries - 1:
+                                print(f"❌ Hata: {str(e)[:100]} - Tekrar deneniyor...")
                                 continue
-                        raise http_err
-                    except Exception as e:
-                        if attempt < max_retries - 1:
-                            print(f"❌ Hata: {str(e)[:100]} - Tekrar deneniyor...")
-                            continue
-                        raise e
-                
-                with open(temp_file, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                
-                print(f"✅ Tam dosya indirildi: {os.path.getsize(temp_file)} bytes")
-                
-            except Exception as e:
-                error_msg = f"Dosya indirme hatası: {str(e)[:200]}"
-                print(f"❌ {error_msg}")
-                # Tüm job'u failed yap
+                            raise e
+                    
+                    # Önce .part'a yaz - process indirme ortasında ölürse yarım dosya kaynak sanılmasın
+                    with timed('job.download') as span, SCHEDULER.download_slot() as download, open(temp_file + '.part', 'wb') as f:
+                        span['bytes'] = 0
+                        for chunk in response.iter_content(chunk_size=8192):
+                            if chunk:
+                                f.write(chunk)
+                                download.add(len(chunk))
+                                span['bytes'] += len(chunk)
+                    os.replace(temp_file + '.part', temp_file)
+                    
+                    DOWNLOAD_BYTES.labels(kind='full').inc(span['bytes'])
+                    print(f"✅ Tam dosya indirildi: {os.path.getsize(temp_file)} bytes")
+                    
+                except Exception as e:
+                    error_msg = f"Dosya indirme hatası: {str(e)[:200]}"
+                    print(f"❌ {error_msg}")
+                    # Tüm job'u failed yap
+                    job = get_job(job_id)
+                    if job:
+                        job['status'] = 'failed'
+                        job['error'] = error_msg
+                        job['completed_at'] = datetime.now().isoformat()
+                        job['timings'] = recorder.summary()
+                        save_job(job_id, job)
+                    JOBS_TOTAL.labels(status='failed').inc()
+                    return
+            
+            print(f"🎬 Tüm clipler tek dosyadan kesilecek!")
+            SCHEDULER.source_ready(job_id)
+            
+            # Local dosyada index çıkarmak ucuz - her zaman oluştur
+            if mode == 'video':
+                keyframes = get_keyframe_index(video_id, temp_file)
+        elif mode == 'video':
+            # URL üzerinden index tüm dosyayı okur; sadece birden fazla clip'e bölünecekse
+            # ve GOP uzunsa (kısa GOP'ta tek -ss zaten hızlı) değer
+            short_gop = bool(probe and probe.get('keyframe_interval') and probe['keyframe_interval'] <= SHORT_GOP_SECONDS)
+            keyframes = get_keyframe_index(video_id, video_url, build=len(clips) > 1 and not short_gop)
+        
+        # Crop modunda kırpma yörüngesi kaynak başına bir kez çıkarılır (tüm clipler paylaşır)
+        crop_track = None
+        if mode == 'video' and framing == 'crop' and has_valid_clips:
+            try:
+                with SCHEDULER.cpu_slot(priority, client_id, cost=max((probe or {}).get('duration') or 1, 1)):
+                    if is_job_cancelled(job_id):
+                        raise JobCancelledError(job_id)
+                    crop_track = get_crop_track(video_id, temp_file if use_download_mode else video_url, probe)
+            except JobCancelledError:
+                cancelled = True
+            if not crop_track and not cancelled:
+                print(f"⚠️ Kırpma yörüngesi yok (kaynak dikey veya analiz başarısız) - letterbox kullanılıyor")
+                framing = 'letterbox'
+        
+        # Analiz job'u: kesim yok, kaynak bir kez taranır (sonuç video_id bazında cache'lenir)
+        analysis_result = None
+        if mode == 'analysis':
+            analysis = cached_analysis
+            try:
+                if not analysis:
+                    with SCHEDULER.cpu_slot(priority, client_id, cost=max((probe or {}).get('duration') or 1, 1)):
+                        if is_job_cancelled(job_id):
+                            raise JobCancelledError(job_id)
+                        analysis = get_source_analysis(video_id, temp_file if use_download_mode else video_url, probe)
+            except JobCancelledError:
+                cancelled = True
+            if not analysis and not cancelled:
                 job = get_job(job_id)
                 if job:
                     job['status'] = 'failed'
-                    job['error'] = error_msg
+                    job['error'] = 'Kaynak analiz edilemedi'
                     job['completed_at'] = datetime.now().isoformat()
+                    job['timings'] = recorder.summary()
                     save_job(job_id, job)
+                JOBS_TOTAL.labels(status='failed').inc()
                 return
-            
-            print(f"🎬 Tüm clipler tek dosyadan kesilecek!")
+            if analysis:
+                analysis_result = build_analysis_result(analysis, job.get('analysis_options'))
         
         # 3. TÜM CLİPLERİ KES
         for idx, clip in enumerate(clips):
+            if cancelled or is_job_cancelled(job_id):
+                cancelled = True
+                break
+            if idx in completed:
+                continue
+            
+            clip_outcome = None
             try:
                 start = clip.get('start')
                 end = clip.get('end')
@@ -928,15 +3390,81 @@ def process_clips_async(job_id, video_id, clips, video_url, audio_url, title, re
                         'error': 'start ve end değerleri gerekli',
                         'clip': clip
                     })
+                    clip_outcome = {'state': 'failed', 'error': errors[-1]['error']}
+                    continue
+                
+                if idx in range_errors:
+                    errors.append({
+                        'index': idx,
+                        'error': range_errors[idx],
+                        'clip': clip
+                    })
+                    clip_outcome = {'state': 'failed', 'error': range_errors[idx]}
+                    CLIP_ERRORS.labels(error_class='invalid_range').inc()
                     continue
                 
                 print(f"✂️ Clip {idx+1}/{len(clips)}: {start}s - {end}s")
+                output_file = job_clip_filenames(video_id, [clip], mode, audio_format, framing, output_format)[0]
+                update_clip_state(job_id, idx, 'running', output=output_file)
                 
-                # Local dosyadan veya URL'den kes
-                if use_download_mode:
-                    result = cut_clip_from_local_file(temp_file, video_id, start, end, title, resolution)
-                else:
-                    result = cut_clip_from_url(video_url, audio_url, video_id, start, end, title, resolution)
+                # Local dosyadan veya URL'den kes (CPU slot'u adil kuyruktan alınır)
+                # Başarısız olursa hata sınıfına göre tekrar dene (CLIP_RETRY_POLICY)
+                attempt = 0
+                while True:
+                    with timed('clip.cut', index=idx, attempt=attempt):
+                        wait_started = time.time()
+                        wait_counter = time.perf_counter()
+                        with SCHEDULER.cpu_slot(priority, client_id, cost=max(clip_duration(start, end) or 1, 1)):
+                            record_span('clip.cpu_wait', wait_started, time.perf_counter() - wait_counter, index=idx)
+                            # Slot beklerken iptal edildiyse encode'a hiç başlama
+                            if is_job_cancelled(job_id):
+                                raise JobCancelledError(job_id)
+                            on_progress = ClipProgress(job_id, idx, remaining_after=sum(clip_seconds[idx + 1:]))
+                            if mode == 'audio':
+                                result = cut_audio_clip(temp_file if use_download_mode else audio_url, video_id, start, end, title,
+                                                        audio_format=audio_format, on_progress=on_progress)
+                            elif use_download_mode:
+                                result = cut_clip_from_local_file(temp_file, video_id, start, end, title, resolution,
+                                                                  keyframes=keyframes, probe=probe, on_progress=on_progress,
+                                                                  previews=previews, crop_track=crop_track, output_format=output_format)
+                            else:
+                                result = cut_clip_from_url(video_url, audio_url, video_id, start, end, title, resolution,
+                                                           keyframes=keyframes, probe=probe, on_progress=on_progress,
+                                                           previews=previews, crop_track=crop_track, output_format=output_format)
+                    
+                    # ffmpeg iptal yüzünden öldürüldüyse hata sayma
+                    if not result.get('success') and is_job_cancelled(job_id):
+                        raise JobCancelledError(job_id)
+                    
+                    error_class = result.get('error_class')
+                    action = None if result.get('success') else clip_retry_action(error_class, attempt)
+                    if action == 'refresh_urls' and use_download_mode:
+                        action = None  # yerel kaynakta yenilenecek URL yok
+                    if action is None:
+                        break
+                    
+                    CLIP_RETRIES.labels(error_class=error_class, action=action).inc()
+                    attempt += 1
+                    delay = 0
+                    if action == 'refresh_urls':
+                        # İmzalı URL'nin süresi dolmuş olabilir - yeni URL'ler sonraki clipler için de kullanılır
+                        print(f"🔁 Clip {idx+1}: {error_class} - kaynak URL'leri yeniden çözülüyor")
+                        with timed('clip.refresh_urls', index=idx):
+                            url_result = resolve_source_urls(video_id, mode)
+                        if not url_result.get('success'):
+                            print(f"❌ URL'ler yenilenemedi: {url_result.get('error')}")
+                            break
+                        video_url, audio_url = url_result['video_url'], url_result['audio_url']
+                    else:
+                        delay = clip_retry_delay(attempt - 1)
+                    print(f"🔁 Clip {idx+1} tekrar deneniyor ({attempt}/{MAX_CLIP_RETRIES}, {error_class}, {delay:.1f}s sonra)")
+                    
+                    # Backoff sırasında da iptal kontrol edilir
+                    retry_at = time.monotonic() + delay
+                    while time.monotonic() < retry_at:
+                        if is_job_cancelled(job_id):
+                            raise JobCancelledError(job_id)
+                        time.sleep(max(0, min(CANCEL_POLL_SECONDS, retry_at - time.monotonic())))
                 
                 if result.get('success'):
                     filename = result['filename']
@@ -948,8 +3476,13 @@ def process_clips_async(job_id, video_id, clips, video_url, audio_url, title, re
                         'filename': filename,
                         'video_title': video_info.get('title'),
                         'resolution': video_info.get('resolution'),
+                        'source_resolution': video_info.get('source_resolution'),
                         'file_size_mb': video_info.get('file_size_mb')
                     })
+                    if result.get('previews'):
+                        results[-1]['previews'] = result['previews']
+                    clip_outcome = {'state': 'done', 'output': filename, 'result': results[-1], 'attempts': attempt + 1}
+                    CLIPS_TOTAL.labels(outcome='success').inc()
                     print(f"✅ Clip {idx+1} tamamlandı")
                 else:
                     error_msg = result.get('error', 'Bilinmeyen hata')
@@ -958,51 +3491,375 @@ def process_clips_async(job_id, video_id, clips, video_url, audio_url, title, re
                         'error': error_msg,
                         'clip': {'start': start, 'end': end}
                     })
+                    clip_outcome = {'state': 'failed', 'error': error_msg, 'error_class': error_class, 'attempts': attempt + 1}
+                    CLIPS_TOTAL.labels(outcome='failed').inc()
+                    CLIP_ERRORS.labels(error_class=result.get('error_class', 'other')).inc()
                     print(f"❌ Clip {idx+1} başarısız: {error_msg}")
                 
+            except JobCancelledError:
+                cancelled = True
+                print(f"🛑 Job iptal edildi, kalan clipler atlanıyor: {job_id}")
+                break
             except Exception as clip_error:
                 error_msg = f"Clip processing exception: {str(clip_error)}"
                 print(f"❌ {error_msg}")
+                CLIPS_TOTAL.labels(outcome='failed').inc()
+                CLIP_ERRORS.labels(error_class='exception').inc()
                 errors.append({
                     'index': idx,
                     'error': error_msg,
                     'clip': clip
                 })
+                clip_outcome = {'state': 'failed', 'error': error_msg}
             finally:
-                # Her durumda processed sayısını artır ve kaydet
+                # Her durumda processed sayısını artır ve clip durumuyla birlikte kaydet
                 job = get_job(job_id)
-                if job:
+                if job and not cancelled:
+                    if clip_outcome and job.get('clip_states'):
+                        job['clip_states'][idx].update(clip_outcome)
                     job['processed'] += 1
+                    job['progress'] = round(job['processed'] * 100 / max(job['total'], 1), 1)
+                    job.pop('current_clip', None)
+                    job['timings'] = recorder.summary()
                     save_job(job_id, job)
         
-        # Geçici dosyayı temizle
-        if use_download_mode:
-            try:
-                if temp_file and os.path.exists(temp_file):
-                    os.remove(temp_file)
-                    print(f"🗑️ Geçici dosya silindi")
-            except Exception as cleanup_error:
-                print(f"⚠️ Geçici dosya temizleme hatası: {cleanup_error}")
-        
-        # Job'u finished olarak işaretle
+        # Job'u finished (veya cancelled) olarak işaretle
         job = get_job(job_id)
         if job:
-            job['status'] = 'finished'
+            record_span('job.total', time.time() - (time.perf_counter() - job_counter), time.perf_counter() - job_counter)
+            job['status'] = 'cancelled' if cancelled else 'finished'
+            if not cancelled:
+                job['progress'] = 100
+            job.pop('current_clip', None)
+            job.pop('eta_seconds', None)
             job['results'] = results
             job['errors'] = errors
-            job['completed_at'] = datetime.now().isoformat()
+            if analysis_result is not None:
+                job['analysis'] = analysis_result
+            job['completed_at'] = job.get('completed_at') if cancelled and job.get('completed_at') else datetime.now().isoformat()
+            job['timings'] = recorder.summary()
             save_job(job_id, job)
-            print(f"✅ Job {job_id} tamamlandı: {len(results)} başarılı, {len(errors)} hata")
-        
-        # 10 dakika sonra job'u sil
-        cleanup_thread = threading.Thread(target=cleanup_job, args=(job_id,))
-        cleanup_thread.daemon = True
-        cleanup_thread.start()
+            JOBS_TOTAL.labels(status=job['status']).inc()
+            print(f"✅ Job {job_id} {'iptal edildi' if cancelled else 'tamamlandı'}: {len(results)} başarılı, {len(errors)} hata")
         
     except Exception as e:
         # Kritik hata - job'u failed olarak işaretle
         error_msg = f"Critical error in process_clips_async: {str(e)}"
         print(f"❌ {error_msg}")
+        try:
+            job = get_job(job_id)
+            if job:
+                job['status'] = 'failed'
+                job['error'] = error_msg
+                job['completed_at'] = datetime.now().isoformat()
+                job['timings'] = recorder.summary()
+                save_job(job_id, job)
+            JOBS_TOTAL.labels(status='failed').inc()
+        except Exception as save_error:
+            print(f"❌ Failed to save error state: {str(save_error)}")
+    finally:
+        # Geçici dosyalar her durumda (hata/iptal dahil) silinir
+        WORKSPACE.release(job_id)
+        JOB_HEARTBEAT.discard(job_id)
+        set_timing_recorder(previous_recorder)
+        set_current_job(previous_job)
+
+def compose_filename(segments, framing='letterbox'):
+    """Birleşik reel dosya adı - aynı segment listesi tekrar istenirse cache'ten döner"""
+    key = json.dumps([[s['video_id'], s['start'], s['end']] for s in segments] + [framing])
+    return f"compose-{hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]}.mp4"
+
+# Stream copy ile birleştirilecek segmentlerin aynı olması gereken parametreleri; hiçbir segment probe
+# edilemezse hepsi bu profile yeniden encode edilir
+COMPOSE_STREAM_PROFILE = {
+    'video': {'codec': 'h264', 'profile': 'High', 'width': REELS_WIDTH, 'height': REELS_HEIGHT, 'frame_rate': '30/1',
+              'time_base': '1/15360', 'pix_fmt': 'yuv420p'},
+    'audio': {'codec': 'aac', 'sample_rate': 44100, 'channels': 2}
+}
+
+_segment_probes = OrderedDict()  # (yol, dosya sürümü) -> probe
+_segment_probes_lock = threading.Lock()
+
+def probe_segment(path):
+    """Yerel segmentin stream parametreleri (dosya değişmedikçe bellekten), probe edilemezse None"""
+    key = (path, file_version(path))
+    with _segment_probes_lock:
+        if key in _segment_probes:
+            return _segment_probes[key]
+    try:
+        probe = probe_source(path)
+    except (OSError, ValueError, subprocess.TimeoutExpired) as e:
+        print(f"⚠️ Segment probe edilemedi ({os.path.basename(path)}): {str(e)[:200]}")
+        probe = None
+    with _segment_probes_lock:
+        _segment_probes[key] = probe
+        while len(_segment_probes) > 256:
+            _segment_probes.popitem(last=False)
+    return probe
+
+def segment_signature(probe):
+    """Concat demuxer + stream copy için eşleşmesi gereken codec/profil/çözünürlük/fps/timebase"""
+    video = (probe or {}).get('video') or {}
+    audio = (probe or {}).get('audio') or {}
+    return (
+        video.get('codec'), video.get('profile'), video.get('width'), video.get('height'),
+        video.get('frame_rate'), video.get('time_base'), video.get('pix_fmt'),
+        audio.get('codec'), audio.get('sample_rate'), audio.get('channels')
+    )
+
+def normalize_segment(path, reference, output_path, duration=None):
+    """Segmenti referans stream parametrelerine yeniden encode et (farklı fps/profilden gelen cache'li segmentler)"""
+    video = reference['video']
+    audio = reference.get('audio')
+    width, height = video['width'], video['height']
+    plan = plan_encoder(duration)
+    timescale = str(video.get('time_base') or '').partition('/')[2] or '15360'
+    cmd = [
+        "ffmpeg",
+        "-i", path,
+        "-vf", f"scale={width}:{height}:force_original_aspect_ratio=decrease,pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:black,"
+               f"setsar=1,fps={video.get('frame_rate') or '30/1'}",
+        *encoder_video_args(plan),
+        "-profile:v", (video.get('profile') or 'high').lower().replace('constrained ', ''),
+        "-pix_fmt", video.get('pix_fmt') or 'yuv420p',
+        "-video_track_timescale", timescale
+    ]
+    if audio:
+        cmd += ["-c:a", "aac", "-b:a", "128k", "-ar", str(audio.get('sample_rate') or 44100), "-ac", str(audio.get('channels') or 2)]
+    else:
+        cmd += ["-an"]
+    cmd += ["-movflags", "+faststart", "-y", output_path]
+    with timed('compose.normalize'):
+        return run_ffmpeg(cmd, duration, encoder_plan=plan)
+
+def prepare_concat_inputs(paths, scratch, durations, priority='interactive', client_id='anonymous'):
+    """
+    Stream copy'den önce segmentlerin parametrelerini karşılaştır, uymayanları referansa yeniden encode et
+    
+    Referans ilk probe edilebilen segmenttir. Dosya adı aynı profili garanti etmez (farklı fps'li kaynaklar,
+    yük durumuna göre seçilen preset) - uyumsuz segmentler stream copy'de bozuk zaman damgası üretir.
+    (yollar, yeniden encode edilen sayı, hata) döner.
+    """
+    probes = [probe_segment(path) for path in paths]
+    reference = next((probe for probe in probes if probe and probe.get('video')), None) or COMPOSE_STREAM_PROFILE
+    expected = segment_signature(reference)
+    prepared = []
+    normalized = 0
+    for index, (path, probe, duration) in enumerate(zip(paths, probes, durations)):
+        if probe and segment_signature(probe) == expected:
+            prepared.append(path)
+            continue
+        output_path = os.path.join(scratch, f"segment_{index:04d}.mp4")
+        with SCHEDULER.cpu_slot(priority, client_id, cost=max(duration or 1, 1)):
+            result = normalize_segment(path, reference, output_path, duration)
+        if result.returncode != 0:
+            _, error_msg = classify_ffmpeg_error(result.stderr or "Boş çıktı", result.returncode)
+            return None, normalized, error_msg
+        prepared.append(output_path)
+        normalized += 1
+    if normalized:
+        print(f"🔧 {normalized} segment stream parametreleri uymadığı için yeniden encode edildi")
+    return prepared, normalized, None
+
+def concat_segments(paths, output_path, duration=None):
+    """Segmentleri concat demuxer ile stream copy olarak birleştir (parametreleri önceden prepare_concat_inputs ile eşitlenmiş olmalı)"""
+    # Geçici adla yazılır, bitince son ada taşınır - büyüyen dosya aynı reel'i isteyen job'a bitmiş görünmesin
+    encode_path = partial_output_path(output_path)
+    with WORKSPACE.scratch(getattr(_job_context, 'job_id', None)) as scratch:
+        list_path = os.path.join(scratch, 'segments.txt')
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for path in paths:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        
+        cmd = [
+            "ffmpeg",
+            "-f", "concat", "-safe", "0",
+            "-i", list_path,
+            "-map", "0",
+            "-c", "copy",
+            "-movflags", "+faststart",
+            "-y", encode_path
+        ]
+        try:
+            with timed('compose.concat', segments=len(paths)):
+                result = run_ffmpeg(cmd, duration)
+        except Exception:
+            if os.path.exists(encode_path):
+                os.remove(encode_path)
+            raise
+    
+    if result.returncode != 0 or not os.path.exists(encode_path) or os.path.getsize(encode_path) == 0:
+        if os.path.exists(encode_path):
+            os.remove(encode_path)
+        error_class, error_msg = classify_ffmpeg_error(result.stderr or "Boş çıktı", result.returncode)
+        return {"success": False, "error": error_msg, "error_class": error_class}
+    finish_clip_output(encode_path, output_path)
+    return {"success": True}
+
+def process_compose_async(job_id):
+    """
+    Highlight reel: segmentleri (farklı videolardan olabilir) sırayla birleştir
+    
+    CLIPS_FOLDER'da aynı profille (dosya adı = video/aralık/framing) kesilmiş segmentler
+    tekrar encode edilmez; eksikler video başına bir alt job ile (indirme, retry, crop dahil)
+    kesilir. Stream parametreleri ilk segmente uymayanlar yeniden encode edildikten sonra
+    hepsi concat demuxer + stream copy ile tek dosyaya yazılır.
+    """
+    previous_job = set_current_job(job_id)
+    
+    try:
+        job = get_job(job_id)
+        if not job:
+            print(f"❌ Job bulunamadı: {job_id}")
+            return
+        
+        segments = job['segments']
+        framing = job.get('framing', 'letterbox')
+        filenames = [generate_clip_filename(s['video_id'], s['start'], s['end'], framing) for s in segments]
+        reused = sum(1 for name in filenames if os.path.exists(os.path.join(CLIPS_FOLDER, name)))
+        
+        job['status'] = 'processing'
+        job['processed'] = reused
+        job['progress'] = round(reused * 100 / max(len(segments), 1), 1)
+        save_job(job_id, job)
+        JOB_HEARTBEAT.add(job_id)
+        print(f"🎞️ Compose başladı: {len(segments)} segment, {reused} tanesi cache'te")
+        
+        # Video başına bir alt job (ID'ler sabit - restart sonrası aynı alt job kaldığı yerden devam eder)
+        video_ids = list(dict.fromkeys(s['video_id'] for s in segments))
+        errors = []
+        cancelled = False
+        for number, video_id in enumerate(video_ids):
+            missing = [
+                {'start': s['start'], 'end': s['end']}
+                for s, name in zip(segments, filenames)
+                if s['video_id'] == video_id and not os.path.exists(os.path.join(CLIPS_FOLDER, name))
+            ]
+            missing = [clip for position, clip in enumerate(missing) if clip not in missing[:position]]
+            if not missing:
+                continue
+            if is_job_cancelled(job_id):
+                cancelled = True
+                break
+            
+            child_id = f"{job_id}-{number}"
+            child = get_job(child_id)
+            if not child or child.get('status') not in ('pending', 'processing'):
+                child = {
+                    'job_id': child_id,
+                    'video_id': video_id,
+                    'compose_id': job_id,
+                    'status': 'pending',
+                    'priority': job.get('priority', 'interactive'),
+                    'client_id': job.get('client_id', 'anonymous'),
+                    'previews': [],
+                    'framing': framing,
+                    'created_at': datetime.now().isoformat(),
+                    'total': len(missing),
+                    'processed': 0,
+                    'clip_filenames': job_clip_filenames(video_id, missing, framing=framing),
+                    'clip_states': initial_clip_states(missing)
+                }
+                save_job(child_id, child)
+            job = get_job(job_id)
+            if child_id not in job.setdefault('children', []):
+                job['children'].append(child_id)
+                save_job(job_id, job)
+            
+            url_result = resolve_source_urls(video_id)
+            if not url_result.get('success'):
+                errors.append({'video_id': video_id, 'error': url_result.get('error', 'Video URL alınamadı')})
+                continue
+            # Zaten scheduler worker'ındayız - alt job kuyruğa girmeden burada işlenir (encode'lar CPU slot'u bekler)
+            process_clips_async(child_id, video_id, [{'start': c['start'], 'end': c['end']} for c in child['clip_states']],
+                                url_result['video_url'], url_result['audio_url'],
+                                url_result.get('title', 'Unknown'), url_result.get('resolution', '720p'))
+            
+            child = get_job(child_id) or {}
+            if child.get('status') == 'cancelled':
+                cancelled = True
+                break
+            for error in child.get('errors') or []:
+                errors.append(dict(error, video_id=video_id))
+            if child.get('status') == 'failed':
+                errors.append({'video_id': video_id, 'error': child.get('error')})
+            
+            job = get_job(job_id)
+            job['processed'] = sum(1 for name in filenames if os.path.exists(os.path.join(CLIPS_FOLDER, name)))
+            job['progress'] = round(job['processed'] * 100 / max(len(segments), 1), 1)
+            save_job(job_id, job)
+        
+        job = get_job(job_id)
+        if not job:
+            return
+        if framing == 'crop':
+            # Kırpma yörüngesi çıkarılamayan videolar letterbox kesildi - o segmentler letterbox kullanılır
+            filenames = [
+                name if os.path.exists(os.path.join(CLIPS_FOLDER, name)) else generate_clip_filename(s['video_id'], s['start'], s['end'])
+                for s, name in zip(segments, filenames)
+            ]
+        missing_segments = [
+            {'index': idx, 'video_id': s['video_id'], 'start': s['start'], 'end': s['end']}
+            for idx, (s, name) in enumerate(zip(segments, filenames))
+            if not os.path.exists(os.path.join(CLIPS_FOLDER, name))
+        ]
+        
+        if cancelled or is_job_cancelled(job_id):
+            job['status'] = 'cancelled'
+        elif missing_segments:
+            job['status'] = 'failed'
+            job['error'] = f"{len(missing_segments)} segment oluşturulamadı"
+            job['errors'] = errors or missing_segments
+        else:
+            output_file = compose_filename(segments, framing)
+            output_path = os.path.join(CLIPS_FOLDER, output_file)
+            duration = sum(clip_duration(s['start'], s['end']) or 0 for s in segments)
+            normalized = 0
+            # Aynı segment listesini birleştiren başka job (başka worker'da olabilir) bitene kadar bekle
+            with output_lock(output_file):
+                if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+                    print(f"✅ Birleşik reel zaten mevcut: {output_file}")
+                    result = {"success": True}
+                else:
+                    with WORKSPACE.scratch(job_id) as scratch:
+                        paths, normalized, error_msg = prepare_concat_inputs(
+                            [os.path.join(CLIPS_FOLDER, name) for name in filenames], scratch,
+                            [clip_duration(s['start'], s['end']) for s in segments],
+                            job.get('priority', 'interactive'), job.get('client_id', 'anonymous')
+                        )
+                        if paths is None:
+                            result = {"success": False, "error": error_msg}
+                        else:
+                            result = concat_segments(paths, output_path, duration)
+            
+            if result.get('success'):
+                file_size = os.path.getsize(output_path)
+                job['status'] = 'finished'
+                job['progress'] = 100
+                job['results'] = [{
+                    'start': 0,
+                    'end': round(duration, 3),
+                    'filename': output_file,
+                    'segments': len(segments),
+                    'reused_segments': reused,
+                    'normalized_segments': normalized,
+                    'resolution': REELS_RESOLUTION,
+                    'file_size_mb': round(file_size / (1024 * 1024), 2)
+                }]
+                job['errors'] = []
+                print(f"✅ Compose tamamlandı: {output_file} ({len(segments)} segment, {reused} cache'ten)")
+            else:
+                job['status'] = 'failed'
+                job['error'] = f"Birleştirme hatası: {result.get('error')}"
+        
+        job['completed_at'] = datetime.now().isoformat()
+        save_job(job_id, job)
+        JOBS_TOTAL.labels(status=job['status']).inc()
+    
+    except Exception as e:
+        error_msg = f"Critical error in process_compose_async: {str(e)}"
+        print(f"❌ {error_msg}")
         try:
             job = get_job(job_id)
             if job:
@@ -1010,8 +3867,794 @@ def process_clips_async(job_id, video_id, clips, video_url, audio_url, title, re
                 job['error'] = error_msg
                 job['completed_at'] = datetime.now().isoformat()
                 save_job(job_id, job)
+            JOBS_TOTAL.labels(status='failed').inc()
         except Exception as save_error:
             print(f"❌ Failed to save error state: {str(save_error)}")
+    finally:
+        WORKSPACE.release(job_id)
+        JOB_HEARTBEAT.discard(job_id)
+        set_current_job(previous_job)
+
+class QueueFullError(Exception):
+    """Scheduler kuyruğu dolu - istemci retry_after saniye sonra tekrar denemeli"""
+    
+    def __init__(self, retry_after):
+        super().__init__(f"Kuyruk dolu, {retry_after} saniye sonra tekrar deneyin")
+        self.retry_after = retry_after
+
+class FairQueue:
+    """
+    Öncelik sınıfı + istemci bazında adil kuyruk (start-time fair queuing)
+    
+    Önce öncelik sınıfına bakılır (interactive > bulk). Aynı sınıf içinde her
+    istemcinin sanal zamanı, aldığı servis (cost) kadar ilerler; en geride kalan
+    istemci sıradaki hakkı alır. Böylece büyük bir batch, diğer istemcilerin
+    işlerini arkasında bekletmez.
+    """
+    
+    def __init__(self):
+        self._entries = []
+        self._finish = {}
+        self._vtime = 0.0
+        self._seq = 0
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def push(self, item, priority, client_id, cost=1.0):
+        self._seq += 1
+        entry = {'item': item, 'priority': priority, 'client_id': client_id, 'cost': cost, 'seq': self._seq}
+        self._entries.append(entry)
+        return entry
+    
+    def ordered(self):
+        """Kuyruğu servis sırasına göre döndür"""
+        return sorted(self._entries, key=self._key)
+    
+    def peek(self, predicate=None):
+        """Sıradaki (predicate'i sağlayan) girdi"""
+        for entry in self.ordered():
+            if predicate is None or predicate(entry):
+                return entry
+        return None
+    
+    def pop(self, entry):
+        """Girdiyi kuyruktan çıkar ve istemcinin sanal zamanını ilerlet"""
+        start = self._start_tag(entry)
+        self._entries.remove(entry)
+        self._finish[entry['client_id']] = start + entry['cost']
+        self._vtime = start
+        if not self._entries:
+            # Kuyruk boşaldı (idle) - sanal zaman en ileri bitişe atlar, geçmiş servis sonraki işleri cezalandırmaz
+            self._vtime = max(self._finish.values())
+        # Sanal zamanın gerisinde kalan istemcilerin kaydı artık sırayı etkilemez
+        for client_id in [client_id for client_id, finish in self._finish.items() if finish <= self._vtime]:
+            del self._finish[client_id]
+        return entry['item']
+    
+    def remove(self, entry):
+        """Servis vermeden çıkar (iptal)"""
+        if entry in self._entries:
+            self._entries.remove(entry)
+    
+    def _start_tag(self, entry):
+        return max(self._finish.get(entry['client_id'], 0.0), self._vtime)
+    
+    def _key(self, entry):
+        return (PRIORITY_CLASSES.get(entry['priority'], len(PRIORITY_CLASSES)), self._start_tag(entry), entry['seq'])
+
+class HostSemaphore:
+    """
+    Aynı host'taki process'ler arası sayaçlı semafor
+    
+    SCHEDULER_STATE_DIR/<ad>-<n>.lock dosyalarından biri flock ile tutulur; process ölürse kilidi
+    kernel bırakır. fcntl yoksa (Windows) limit process içi kalır.
+    """
+    
+    def __init__(self, name, slots):
+        self.name = name
+        self.slots = slots
+    
+    def _path(self, index):
+        return os.path.join(SCHEDULER_STATE_DIR, f"{self.name}-{index}.lock")
+    
+    def _try_lock(self, index):
+        lock_file = open(self._path(index), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return lock_file
+        except OSError:
+            lock_file.close()
+            return None
+    
+    @contextmanager
+    def slot(self):
+        """Boş slot açılana kadar bekle"""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(SCHEDULER_STATE_DIR, exist_ok=True)
+        held = None
+        while held is None:
+            held = next(filter(None, (self._try_lock(index) for index in range(self.slots))), None)
+            if held is None:
+                time.sleep(HOST_SLOT_POLL_SECONDS)
+        try:
+            yield
+        finally:
+            fcntl.flock(held, fcntl.LOCK_UN)
+            held.close()
+    
+    def in_use(self):
+        """Host genelinde tutulan slot sayısı (fcntl yoksa None)"""
+        if fcntl is None:
+            return None
+        os.makedirs(SCHEDULER_STATE_DIR, exist_ok=True)
+        used = 0
+        for index in range(self.slots):
+            lock_file = self._try_lock(index)
+            if lock_file is None:
+                used += 1
+            else:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+        return used
+
+class HostReservations:
+    """
+    Process'ler arası rezervasyon kümesi (örn. kaynağını henüz indirmemiş job'lar)
+    
+    Her kayıt SCHEDULER_STATE_DIR/<ad>-<anahtar>.lock üzerinde flock tutar; len() host geneli sayar ve
+    sahibi ölmüş (kilidi bırakılmış) kayıtları siler. fcntl yoksa sadece bu process'in kayıtları sayılır.
+    """
+    
+    def __init__(self, name):
+        self.name = name
+        self._held = {}
+    
+    def _path(self, key):
+        return os.path.join(SCHEDULER_STATE_DIR, f"{self.name}-{key}.lock")
+    
+    def add(self, key):
+        if key in self._held:
+            return
+        lock_file = None
+        if fcntl is not None:
+            os.makedirs(SCHEDULER_STATE_DIR, exist_ok=True)
+            lock_file = open(self._path(key), 'a')
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        self._held[key] = lock_file
+    
+    def discard(self, key):
+        lock_file = self._held.pop(key, None)
+        if lock_file is not None:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+    
+    def __contains__(self, key):
+        return key in self._held
+    
+    def __len__(self):
+        if fcntl is None or not os.path.isdir(SCHEDULER_STATE_DIR):
+            return len(self._held)
+        count = 0
+        prefix = f"{self.name}-"
+        for name in os.listdir(SCHEDULER_STATE_DIR):
+            if not (name.startswith(prefix) and name.endswith('.lock')):
+                continue
+            if name[len(prefix):-len('.lock')] in self._held:
+                count += 1
+                continue
+            path = os.path.join(SCHEDULER_STATE_DIR, name)
+            try:
+                with open(path, 'a') as lock_file:
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        count += 1  # başka process'te canlı kayıt
+                        continue
+                    os.remove(path)  # sahibi ölmüş
+            except OSError:
+                pass
+        return count
+
+class JobScheduler:
+    """
+    Process genelinde paylaşılan job kuyruğu - tüm job'lar aynı worker havuzundan geçer
+    
+    Job'lar ancak kaynaklar uygunsa başlatılır (admission control):
+    - CPU slot'ları: aynı anda çalışan FFmpeg encode sayısı (host geneli - tüm gunicorn worker'ları)
+    - İndirme: eşzamanlı indirme sayısı (host geneli) ve bant genişliği (process başına)
+    - Disk: geçici klasörde minimum boş alan (rezerv host genelindeki indirilecek kaynaklara göre)
+    Kuyruk MAX_QUEUE_SIZE'ı aşarsa yeni job kabul edilmez (429).
+    
+    Hem job kuyruğu hem CPU slot'ları FairQueue ile dağıtılır; aynı anda aktif
+    birden fazla job'un clipleri encode sırasında birbirine karışır (clip bazında
+    interleave). Bulk job'lar, interactive job'lar için ayrılan worker'ları kullanamaz.
+    """
+    
+    def __init__(self, max_workers, cpu_slots, max_downloads, max_queue_size, interactive_reserved=0):
+        self.max_workers = max_workers
+        self.cpu_slots = cpu_slots
+        self.max_downloads = max_downloads
+        self.max_queue_size = max_queue_size
+        self.interactive_reserved = interactive_reserved
+        self._queue = FairQueue()
+        self._cpu_waiters = FairQueue()
+        self._active = {}
+        self._workers = []
+        self._cpu_in_use = 0
+        self._downloads = {}
+        self._awaiting_source = HostReservations('source')  # kaynağını henüz indirmemiş aktif job'lar (disk rezervi)
+        self._host_cpu = HostSemaphore('cpu', cpu_slots)
+        self._host_downloads = HostSemaphore('download', max_downloads)
+        self._avg_job_seconds = DEFAULT_JOB_SECONDS
+        self._cond = threading.Condition()
+    
+    def submit(self, job_id, target, args, priority='interactive', client_id='anonymous', cost=1.0, force=False):
+        """Job'u kuyruğa ekle, kaynaklar uygun olunca çalıştırılır"""
+        with self._cond:
+            if not force and len(self._queue) >= self.max_queue_size:
+                raise QueueFullError(self._retry_after())
+            self._ensure_workers()
+            self._queue.push((job_id, target, args), priority, client_id, cost)
+            self._publish_gauges()
+            self._cond.notify_all()
+            return len(self._queue)
+    
+    def check_capacity(self, count=1):
+        """count adet job daha kabul edilebilir mi? Edilemezse retry_after (saniye) döner"""
+        with self._cond:
+            if len(self._queue) + count > self.max_queue_size:
+                return self._retry_after()
+        return None
+    
+    def queue_position(self, job_id):
+        """Kuyruktaki sıra (1'den başlar), kuyrukta değilse None"""
+        with self._cond:
+            for position, entry in enumerate(self._queue.ordered(), start=1):
+                if entry['item'][0] == job_id:
+                    return position
+        return None
+    
+    def estimated_start(self, job_id):
+        """Kuyruktaki job için tahmini başlama zamanı (ISO format)"""
+        position = self.queue_position(job_id)
+        if position is None:
+            return None
+        wait = self._estimate_wait(position)
+        return datetime.fromtimestamp(time.time() + wait).isoformat()
+    
+    @contextmanager
+    def cpu_slot(self, priority='interactive', client_id='anonymous', cost=1.0):
+        """FFmpeg encode için CPU slot'u al (sıra adil kuyruğa göre gelir)"""
+        with self._cond:
+            entry = self._cpu_waiters.push(None, priority, client_id, cost)
+            self._publish_gauges()
+            while not (self._cpu_in_use < self.cpu_slots and self._cpu_waiters.peek() is entry):
+                self._cond.wait()
+            self._cpu_waiters.pop(entry)
+            self._cpu_in_use += 1
+            self._publish_gauges()
+            # Sıradaki bekleyen de boş slot varsa uyansın
+            self._cond.notify_all()
+        try:
+            # Process içi sıra adil kuyruktan, toplam encode sayısı diğer worker'larla paylaşılan slotlardan
+            with self._host_cpu.slot():
+                yield
+        finally:
+            with self._cond:
+                self._cpu_in_use -= 1
+                self._publish_gauges()
+                self._cond.notify_all()
+    
+    def cancel(self, job_id):
+        """Kuyruktaki job'u çıkar, kuyrukta yoksa False"""
+        with self._cond:
+            for entry in self._queue.ordered():
+                if entry['item'][0] == job_id:
+                    self._queue.remove(entry)
+                    self._publish_gauges()
+                    self._cond.notify_all()
+                    return True
+        return False
+    
+    def cpu_in_use(self):
+        """Şu an çalışan encode sayısı"""
+        with self._cond:
+            return self._cpu_in_use
+    
+    def source_ready(self, job_id):
+        """Job'un kaynağı indi (veya indirme gerekmedi) - disk rezervini bırak"""
+        with self._cond:
+            if job_id in self._awaiting_source:
+                self._awaiting_source.discard(job_id)
+                self._cond.notify_all()
+    
+    @contextmanager
+    def download_slot(self):
+        """İndirmeyi kaydet - bant genişliği ölçümü için tracker döner"""
+        tracker = DownloadTracker()
+        with self._host_downloads.slot():
+            with self._cond:
+                self._downloads[id(tracker)] = tracker
+                self._publish_gauges()
+            try:
+                yield tracker
+            finally:
+                with self._cond:
+                    self._downloads.pop(id(tracker), None)
+                    self._publish_gauges()
+                    self._cond.notify_all()
+    
+    def stats(self):
+        """Kuyruk, aktif job ve kaynak kullanımı"""
+        with self._cond:
+            return {
+                'queued': len(self._queue),
+                'active': len(self._active),
+                'active_by_priority': {
+                    priority: sum(1 for active in self._active.values() if active['priority'] == priority)
+                    for priority in PRIORITY_CLASSES
+                },
+                'max_workers': self.max_workers,
+                'max_queue_size': self.max_queue_size,
+                'cpu_slots': self.cpu_slots,
+                'cpu_in_use': self._cpu_in_use,
+                'host_cpu_in_use': self._host_cpu.in_use(),
+                'cpu_waiting': len(self._cpu_waiters),
+                'downloads_in_flight': len(self._downloads),
+                'download_bytes_per_sec': int(self._download_rate()),
+                'temp_free_mb': int(self._temp_free_bytes() / (1024 * 1024)),
+                'avg_job_seconds': round(self._avg_job_seconds, 1)
+            }
+    
+    def _publish_gauges(self):
+        # Prometheus gauge'ları (multiprocess'te worker'lar arası toplanır)
+        QUEUE_DEPTH.set(len(self._queue))
+        JOBS_ACTIVE.set(len(self._active))
+        CPU_SLOTS_IN_USE.set(self._cpu_in_use)
+        CPU_WAITING.set(len(self._cpu_waiters))
+        DOWNLOADS_IN_FLIGHT.set(len(self._downloads))
+    
+    def _retry_after(self):
+        return max(1, int(math.ceil(self._estimate_wait(len(self._queue) + 1))))
+    
+    def _estimate_wait(self, position):
+        # Önündeki job'lar worker sayısı kadar paralel ilerler
+        rounds = (position - 1) // max(1, self.max_workers)
+        if len(self._active) < self.max_workers and rounds == 0:
+            return 0
+        return (rounds + 1) * self._avg_job_seconds
+    
+    def _download_rate(self):
+        return sum(tracker.rate() for tracker in self._downloads.values())
+    
+    def _temp_free_bytes(self):
+        return WORKSPACE.free_bytes()
+    
+    def _can_admit(self):
+        if len(self._active) >= self.max_workers:
+            return False
+        # İndirme slotları diğer worker'larla paylaşılır (fcntl yoksa process içi sayı)
+        downloads = self._host_downloads.in_use()
+        if (len(self._downloads) if downloads is None else downloads) >= self.max_downloads:
+            return False
+        if MAX_DOWNLOAD_BYTES_PER_SEC and self._download_rate() >= MAX_DOWNLOAD_BYTES_PER_SEC:
+            return False
+        if not USE_DOWNLOAD_MODE:
+            # URL modunda kaynak geçici klasöre yazılmaz
+            return True
+        # Kaynağını henüz indirmemiş (indirmesi süren dahil, tüm worker'lardaki) job'lar için yer ayır
+        reserved = len(self._awaiting_source) * ESTIMATED_SOURCE_BYTES
+        return self._temp_free_bytes() - reserved >= MIN_FREE_TEMP_BYTES + ESTIMATED_SOURCE_BYTES
+    
+    def _can_start(self, entry):
+        if entry['priority'] == 'interactive':
+            return True
+        # Bulk job'lar interactive için ayrılan worker'lara giremez
+        active_bulk = sum(1 for active in self._active.values() if active['priority'] != 'interactive')
+        return active_bulk < self.max_workers - self.interactive_reserved
+    
+    def _next_entry(self):
+        if not self._can_admit():
+            return None
+        return self._queue.peek(self._can_start)
+    
+    def _ensure_workers(self):
+        # Worker thread'leri ilk submit'te başlat (import sırasında thread açma)
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(target=self._worker_loop, daemon=True)
+            worker.start()
+            self._workers.append(worker)
+    
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                # Disk/bant genişliği dışarıdan değişebilir, periyodik tekrar kontrol et
+                entry = self._next_entry()
+                while entry is None:
+                    self._cond.wait(timeout=ADMISSION_POLL_SECONDS)
+                    entry = self._next_entry()
+                job_id, target, args = self._queue.pop(entry)
+                self._active[job_id] = {'started_at': time.time(), 'priority': entry['priority']}
+                if USE_DOWNLOAD_MODE:
+                    self._awaiting_source.add(job_id)
+                self._publish_gauges()
+            try:
+                # Başka bir worker'da iptal edilmiş olabilir
+                if is_job_cancelled(job_id):
+                    print(f"🛑 İptal edilmiş job atlandı: {job_id}")
+                    JOB_HEARTBEAT.discard(job_id)
+                else:
+                    target(*args)
+            except Exception as e:
+                print(f"❌ Scheduler job hatası ({job_id}): {str(e)}")
+            finally:
+                with self._cond:
+                    active = self._active.pop(job_id, None)
+                    self._awaiting_source.discard(job_id)
+                    if active:
+                        # Ortalama job süresi (tahmini başlama zamanı için)
+                        self._avg_job_seconds = 0.8 * self._avg_job_seconds + 0.2 * (time.time() - active['started_at'])
+                    self._publish_gauges()
+                    self._cond.notify_all()
+
+class DownloadTracker:
+    """Devam eden bir indirmenin byte sayacı"""
+    
+    def __init__(self):
+        self.started_at = time.time()
+        self.bytes = 0
+    
+    def add(self, count):
+        self.bytes += count
+    
+    def rate(self):
+        elapsed = time.time() - self.started_at
+        return self.bytes / elapsed if elapsed > 0 else 0
+
+SCHEDULER = JobScheduler(MAX_ACTIVE_JOBS, CPU_SLOTS, MAX_CONCURRENT_DOWNLOADS, MAX_QUEUE_SIZE, INTERACTIVE_RESERVED_WORKERS)
+
+def get_client_id():
+    """İstemciyi API key, X-Client-Id header'ı veya IP ile tanımla"""
+    api_key = request.headers.get('X-API-Key')
+    if api_key:
+        # API key'i job dosyalarına açık yazma
+        return 'key:' + hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+    client_id = request.headers.get('X-Client-Id')
+    if client_id:
+        return f"client:{client_id[:64]}"
+    return f"ip:{request.remote_addr}"
+
+def resolve_priority(requested, clip_count, default=None):
+    """
+    İstekteki priority'yi doğrula, yoksa clip sayısına göre belirle
+    
+    INTERACTIVE_MAX_CLIPS'ten büyük işler istense de bulk'a düşürülür (ayrılan worker'ları büyük işler dolduramaz).
+    """
+    if requested and requested not in PRIORITY_CLASSES:
+        return None
+    priority = requested or default or 'interactive'
+    if priority == 'interactive' and clip_count > INTERACTIVE_MAX_CLIPS:
+        return 'bulk'
+    return priority
+
+_url_resolver = None
+_url_resolver_lock = threading.Lock()
+
+def get_url_resolver():
+    """URL çözümleme için paylaşılan thread havuzu (create-clips, analyze, batch, recovery)"""
+    global _url_resolver
+    with _url_resolver_lock:
+        if _url_resolver is None:
+            _url_resolver = ThreadPoolExecutor(max_workers=URL_RESOLVE_WORKERS, thread_name_prefix='url-resolver')
+        return _url_resolver
+
+def group_batch_entries(entries):
+    """Batch girdilerini video_id'ye göre birleştir, tekrar eden clipleri at"""
+    grouped = {}
+    for entry in entries:
+        video_id = entry.get('video_id')
+        if not video_id:
+            continue
+        video_clips = grouped.setdefault(video_id, [])
+        for clip in entry.get('clips') or []:
+            if clip not in video_clips:
+                video_clips.append(clip)
+    return {video_id: clips for video_id, clips in grouped.items() if clips}
+
+def resolve_and_schedule_job(job_id, video_id, clips):
+    """Kaynak URL'lerini (job moduna göre) çöz ve job'u scheduler'a gönder"""
+    recorder = SpanRecorder()
+    previous_recorder = set_timing_recorder(recorder)
+    try:
+        with timed('request.resolve_urls'):
+            url_result = resolve_source_urls(video_id, (get_job(job_id) or {}).get('mode', 'video'))
+    finally:
+        set_timing_recorder(previous_recorder)
+    
+    if not url_result.get('success'):
+        job = get_job(job_id)
+        if job:
+            job['status'] = 'failed'
+            job['error'] = url_result.get('error', 'Video URL alınamadı')
+            job['completed_at'] = datetime.now().isoformat()
+            job['timings'] = recorder.summary()
+            save_job(job_id, job)
+        JOB_HEARTBEAT.discard(job_id)
+        return
+    
+    # İstek (tekil veya batch) kabul edilirken kapasite kontrol edildi, kuyruk limiti burada uygulanmaz
+    job = get_job(job_id) or {}
+    if job:
+        job['timings'] = recorder.summary()
+        save_job(job_id, job)
+    SCHEDULER.submit(job_id, process_clips_async, (
+        job_id, video_id, clips,
+        url_result['video_url'], url_result['audio_url'],
+        url_result.get('title', 'Unknown'), url_result.get('resolution', '720p')
+    ), priority=job.get('priority', 'bulk'), client_id=job.get('client_id', 'anonymous'), cost=max(len(clips), 1), force=True)
+
+def job_last_seen(job_id):
+    """Job'un sahibinden son haber (heartbeat veya job kaydı yazımı), bilinmiyorsa None"""
+    mtimes = []
+    for path in (heartbeat_path(job_id), job_path(job_id)):
+        try:
+            mtimes.append(os.path.getmtime(path))
+        except OSError:
+            pass
+    return max(mtimes) if mtimes else None
+
+def is_job_orphaned(job_id, job, now=None):
+    """pending/processing job'un sahibi process ölmüş mü (heartbeat JOB_STALE_SECONDS'tan eski)"""
+    if not job or job.get('status') not in ('pending', 'processing'):
+        return False
+    if job.get('compose_id'):
+        return False  # compose alt job'u - compose job'u devam ettirilince o da devam eder
+    last_seen = job_last_seen(job_id)
+    return last_seen is not None and (now or time.time()) - last_seen > JOB_STALE_SECONDS
+
+def resume_job(job_id, job):
+    """Sahipsiz job'u kaldığı yerden devam ettir - sadece bitmemiş clipler kesilir"""
+    if is_job_cancelled(job_id):
+        job['status'] = 'cancelled'
+        job['completed_at'] = datetime.now().isoformat()
+        save_job(job_id, job)
+        return False
+    
+    job['recoveries'] = job.get('recoveries', 0) + 1
+    if job['recoveries'] > MAX_JOB_RECOVERIES or (not job.get('clip_states') and job.get('mode') not in ('analysis', 'compose')):
+        job['status'] = 'failed'
+        job['error'] = 'Job yeniden başlatmadan sonra kurtarılamadı'
+        job['completed_at'] = datetime.now().isoformat()
+        save_job(job_id, job)
+        JOBS_TOTAL.labels(status='failed').inc()
+        print(f"❌ Job kurtarılamadı: {job_id}")
+        return False
+    
+    job['status'] = 'pending'
+    job.pop('current_clip', None)
+    job.pop('eta_seconds', None)
+    save_job(job_id, job)
+    JOB_HEARTBEAT.add(job_id)
+    
+    if job.get('mode') == 'compose':
+        # Cache'teki segmentler atlanır, alt job'lar kaldığı yerden devam eder
+        SCHEDULER.submit(job_id, process_compose_async, (job_id,), priority=job.get('priority', 'bulk'),
+                         client_id=job.get('client_id', 'anonymous'), cost=len(job.get('segments', [])), force=True)
+        return True
+    
+    # İmzalı kaynak URL'lerinin süresi dolmuş olabilir - yeniden çöz
+    clips = [{'start': clip_state['start'], 'end': clip_state['end']} for clip_state in job.get('clip_states') or []]
+    get_url_resolver().submit(resolve_and_schedule_job, job_id, job['video_id'], clips)
+    return True
+
+def recover_jobs():
+    """Sahipsiz kalmış pending/processing job'ları bul ve devam ettir, devam ettirilen job ID'lerini döndür"""
+    recovered = []
+    if not os.path.isdir(JOBS_FOLDER):
+        return recovered
+    
+    for name in os.listdir(JOBS_FOLDER):
+        if not name.endswith('.json'):
+            continue
+        job_id = name[:-len('.json')]
+        try:
+            if not is_job_orphaned(job_id, get_job(job_id)):
+                continue
+        except (OSError, ValueError):
+            continue
+        
+        # Aynı anda tarayan diğer gunicorn worker'larından sadece biri alsın
+        claim_path = os.path.join(JOBS_FOLDER, f"{job_id}.recover")
+        try:
+            fd = os.open(claim_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            # Claim'i alan process de ölmüş olabilir
+            try:
+                if time.time() - os.path.getmtime(claim_path) > JOB_STALE_SECONDS:
+                    os.remove(claim_path)
+            except OSError:
+                pass
+            continue
+        os.close(fd)
+        
+        try:
+            # Claim alınana kadar başka worker devam ettirmiş olabilir
+            job = get_job(job_id)
+            if is_job_orphaned(job_id, job):
+                print(f"♻️ Sahipsiz job bulundu, devam ettiriliyor: {job_id} ({job['status']})")
+                if resume_job(job_id, job):
+                    recovered.append(job_id)
+        except Exception as e:
+            print(f"❌ Job kurtarma hatası ({job_id}): {str(e)}")
+        finally:
+            try:
+                os.remove(claim_path)
+            except OSError:
+                pass
+    
+    return recovered
+
+_recovery_thread = None
+_recovery_thread_lock = threading.Lock()
+
+def start_job_recovery():
+    """Sahipsiz job taramasını ve job reaper'ı arka planda başlat (process başına bir kez)"""
+    global _recovery_thread
+    init_app()
+    JOB_REAPER.start()
+    with _recovery_thread_lock:
+        if _recovery_thread is None:
+            _recovery_thread = threading.Thread(target=_recovery_loop, name='job-recovery', daemon=True)
+            _recovery_thread.start()
+
+def _recovery_loop():
+    # Restart'tan hemen sonra eski process'in heartbeat'leri henüz eskimemiş olabilir, periyodik tekrar tara
+    while True:
+        try:
+            WORKSPACE.sweep()
+            sweep_partial_outputs()
+            recover_jobs()
+        except Exception as e:
+            print(f"❌ Job kurtarma taraması hatası: {str(e)}")
+        time.sleep(JOB_RECOVERY_INTERVAL)
+
+def queue_full_response(retry_after):
+    """Kuyruk dolu - 429 ve Retry-After header'ı döndür"""
+    response = jsonify({
+        'success': False,
+        'error': 'Sunucu kapasitesi dolu, lütfen daha sonra tekrar deneyin',
+        'retry_after': retry_after
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+def build_job_response(job_id, job):
+    """check-job yanıtını oluştur (batch durumunda da kullanılır)"""
+    response = {
+        'success': True,
+        'job_id': job_id,
+        'video_id': job['video_id'],
+        'status': job['status'],
+        'created_at': job['created_at'],
+        'total': job['total'],
+        'processed': job['processed'],
+        'clip_filenames': job.get('clip_filenames', [])
+    }
+    
+    if job.get('priority'):
+        response['priority'] = job['priority']
+    
+    if 'progress' in job:
+        response['progress'] = job['progress']
+    
+    if job.get('clip_states'):
+        # Sonuç detayı zaten clips/errors altında
+        response['clip_states'] = [
+            {key: value for key, value in clip_state.items() if key != 'result'}
+            for clip_state in job['clip_states']
+        ]
+        if job.get('output') == 'hls':
+            # İlk segment yazılır yazılmaz playlist oynatılabilir (encode sürerken de)
+            for clip_state in response['clip_states']:
+                output = clip_state.get('output')
+                if output and read_hls_playlist(os.path.join(CLIPS_FOLDER, output))[0] > 0:
+                    clip_state['playlist_url'] = url_for('serve_clip', filename=output, _external=True)
+    if job.get('recoveries'):
+        response['recoveries'] = job['recoveries']
+    
+    if job['status'] == 'pending':
+        position = SCHEDULER.queue_position(job_id)
+        if position is not None:
+            response['queue_position'] = position
+            response['estimated_start_at'] = SCHEDULER.estimated_start(job_id)
+    elif job['status'] == 'processing':
+        if job.get('current_clip'):
+            response['current_clip'] = job['current_clip']
+        if job.get('eta_seconds') is not None:
+            response['eta_seconds'] = job['eta_seconds']
+    elif job['status'] in ('finished', 'cancelled'):
+        response['completed_at'] = job.get('completed_at')
+        # URL'leri düzgün oluştur
+        clips_with_urls = []
+        for clip in job.get('results', []):
+            clip_copy = clip.copy()
+            clip_copy['url'] = url_for('serve_clip', filename=clip['filename'], _external=True)
+            if clip.get('previews'):
+                clip_copy['previews'] = {
+                    kind: url_for('serve_clip', filename=filename, _external=True)
+                    for kind, filename in clip['previews'].items()
+                }
+            clips_with_urls.append(clip_copy)
+        response['clips'] = clips_with_urls
+        response['errors'] = job.get('errors')
+        response['error_count'] = len(job.get('errors', []))
+        if job.get('analysis'):
+            response['analysis'] = job['analysis']
+    elif job['status'] == 'failed':
+        response['error'] = job.get('error')
+    
+    if job.get('timings'):
+        response['timings'] = job['timings']
+    if job.get('expires_at'):
+        response['expires_at'] = datetime.fromtimestamp(job['expires_at']).isoformat()
+    
+    return response
+
+_initialized = False
+_init_lock = threading.Lock()
+
+def init_app():
+    """
+    Tek seferlik başlangıç işleri (import sırasında değil)
+    
+    Cache klasörleri, HLS MIME tipleri ve SSL uyarıları. Thread açmaz - gunicorn --preload ile
+    master'da çalışıp fork edilen worker'lar tarafından paylaşılabilir; thread'ler worker'da başlar.
+    """
+    global _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        for folder in (CLIPS_FOLDER, JOBS_FOLDER, BATCHES_FOLDER, KEYFRAMES_FOLDER, PROBES_FOLDER, ANALYSIS_FOLDER, REFRAME_FOLDER):
+            Path(folder).mkdir(exist_ok=True)
+        mimetypes.add_type('application/vnd.apple.mpegurl', '.m3u8')
+        mimetypes.add_type('video/iso.segment', '.m4s')
+        # SSL uyarılarını bastır
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        _initialized = True
+
+def create_app():
+    """App factory - gunicorn 'app:create_app()' veya asgi.py"""
+    init_app()
+    return app
+
+@app.before_request
+def ensure_initialized():
+    # 'app:app' ile doğrudan çalıştırılırsa ilk istekte başlat
+    init_app()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """HTTP istek sayısı ve süresini Prometheus'a yaz"""
+    started = g.pop('request_started', None)
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    HTTP_REQUESTS.labels(endpoint=endpoint, method=request.method, status=response.status_code).inc()
+    if started is not None:
+        HTTP_LATENCY.labels(endpoint=endpoint).observe(time.perf_counter() - started)
+    return response
 
 @app.route('/api/create-clips', methods=['POST'])
 def create_clips():
@@ -1026,8 +4669,16 @@ def create_clips():
                 "start": 0.32,
                 "end": 41.56
             }
-        ]
+        ],
+        "priority": "interactive",  // opsiyonel: interactive | bulk
+        "previews": ["thumbnail", "webp", "sprite"],  // opsiyonel: poster, animasyonlu WebP, sprite + VTT
+        "mode": "audio",  // opsiyonel: video (varsayılan) | audio - sadece ses kesiti
+        "audio_format": "flac",  // opsiyonel: m4a (varsayılan) | flac | wav (16 kHz mono, ASR için)
+        "framing": "crop",  // opsiyonel: letterbox (varsayılan) | crop - içeriği takip eden 9:16 kırpma
+        "output": "hls"  // opsiyonel: mp4 (varsayılan) | hls - encode sürerken oynatılabilen fMP4 segmentler
     }
+    
+    İstemci X-API-Key veya X-Client-Id header'ı ile tanımlanır (adil kuyruk için).
     """
     try:
         data = request.json
@@ -1040,19 +4691,43 @@ def create_clips():
                 'error': 'video_id ve clips gerekli'
             }), 400
         
-        # Video URL'lerini al (sadece 1 kere API'ye istek)
-        url_result = get_video_urls(video_id)
+        priority = resolve_priority(data.get('priority'), len(clips))
+        if not priority:
+            return jsonify({
+                'success': False,
+                'error': f"priority şunlardan biri olmalı: {', '.join(PRIORITY_CLASSES)}"
+            }), 400
+        previews = data.get('previews', DEFAULT_PREVIEWS)
+        if not isinstance(previews, list) or any(kind not in PREVIEW_KINDS for kind in previews):
+            return jsonify({
+                'success': False,
+                'error': f"previews şunlardan oluşan bir liste olmalı: {', '.join(PREVIEW_KINDS)}"
+            }), 400
+        mode = data.get('mode', 'video')
+        audio_format = data.get('audio_format', 'm4a')
+        framing = data.get('framing', DEFAULT_FRAMING)
+        output_format = data.get('output', 'mp4')
+        mode_error = validate_job_mode(mode, audio_format, framing, output_format)
+        if mode_error:
+            return jsonify({
+                'success': False,
+                'error': mode_error
+            }), 400
+        client_id = get_client_id()
         
-        if not url_result.get('success'):
+        # İmkansız aralıkları (cache'teki probe'a göre) indirmeden reddet
+        invalid_clips = find_invalid_clips(video_id, clips)
+        if invalid_clips:
             return jsonify({
                 'success': False,
-                'error': url_result.get('error', 'Video URL alınamadı')
-            }), 500
+                'error': 'Geçersiz clip aralıkları',
+                'invalid_clips': invalid_clips
+            }), 400
         
-        video_url = url_result['video_url']
-        audio_url = url_result['audio_url']
-        title = url_result.get('title', 'Unknown')
-        resolution = url_result.get('resolution', '720p')
+        # Kuyruk doluysa URL çözümlemeye hiç başlama
+        retry_after = SCHEDULER.check_capacity()
+        if retry_after is not None:
+            return queue_full_response(retry_after)
         
         # Job ID oluştur
         job_id = str(uuid.uuid4())
@@ -1062,20 +4737,25 @@ def create_clips():
             'job_id': job_id,
             'video_id': video_id,
             'status': 'pending',
+            'priority': priority,
+            'client_id': client_id,
+            'previews': previews,
+            'mode': mode,
+            'audio_format': audio_format,
+            'framing': framing,
+            'output': output_format,
             'created_at': datetime.now().isoformat(),
             'total': len(clips),
             'processed': 0,
-            'clip_filenames': [generate_clip_filename(video_id, c.get('start'), c.get('end')) for c in clips if c.get('start') is not None and c.get('end') is not None]
+            'clip_filenames': job_clip_filenames(video_id, clips, mode, audio_format, framing, output_format),
+            'clip_states': initial_clip_states(clips)
         }
         save_job(job_id, job_data)
+        JOB_HEARTBEAT.add(job_id)
         
-        # Async olarak işle
-        thread = threading.Thread(
-            target=process_clips_async,
-            args=(job_id, video_id, clips, video_url, audio_url, title, resolution)
-        )
-        thread.daemon = True
-        thread.start()
+        # URL çözümleme (provider polling'i dakikalar sürebilir) istek thread'inde değil resolver havuzunda -
+        # URL'ler hazır olunca job scheduler'a girer, çözümlenemezse job failed olur
+        get_url_resolver().submit(resolve_and_schedule_job, job_id, video_id, clips)
         
         # Hemen job ID döndür
         return jsonify({
@@ -1083,6 +4763,7 @@ def create_clips():
             'job_id': job_id,
             'video_id': video_id,
             'status': 'pending',
+            'priority': priority,
             'total_clips': len(clips),
             'message': 'Job başlatıldı. /api/check-job/<job_id> ile durumu kontrol edin.',
             'clip_filenames': job_data['clip_filenames']
@@ -1094,6 +4775,271 @@ def create_clips():
             'error': str(e)
         }), 500
 
+@app.route('/api/analyze', methods=['POST'])
+def analyze_video():
+    """
+    Sessizlik/sahne analizi job'u oluştur - kesim yapmaz, clip sınırı önerir
+    
+    Request body:
+    {
+        "video_id": "KDV_-rXGy7A",
+        "min_duration": 15,  // opsiyonel: önerilen clip süresi aralığı
+        "max_duration": 60,
+        "clips": [{"start": 0.32, "end": 41.56}],  // opsiyonel: en yakın sessizlik/kesmeye snap edilir
+        "snap_tolerance": 2  // opsiyonel: saniye
+    }
+    
+    Sonuç /api/check-job/<job_id> yanıtında "analysis" altında döner. Analiz video_id başına cache'lenir.
+    """
+    try:
+        data = request.json or {}
+        video_id = data.get('video_id')
+        clips = data.get('clips') or []
+        
+        if not video_id:
+            return jsonify({
+                'success': False,
+                'error': 'video_id gerekli'
+            }), 400
+        
+        try:
+            min_duration = float(data.get('min_duration', ANALYSIS_MIN_CLIP))
+            max_duration = float(data.get('max_duration', ANALYSIS_MAX_CLIP))
+            snap_tolerance = float(data.get('snap_tolerance', ANALYSIS_SNAP_TOLERANCE))
+        except (TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'error': 'min_duration, max_duration ve snap_tolerance sayı olmalı'
+            }), 400
+        if min_duration <= 0 or max_duration < min_duration or snap_tolerance < 0:
+            return jsonify({
+                'success': False,
+                'error': '0 < min_duration <= max_duration ve snap_tolerance >= 0 olmalı'
+            }), 400
+        
+        if not isinstance(clips, list):
+            return jsonify({
+                'success': False,
+                'error': 'clips bir liste olmalı'
+            }), 400
+        invalid_clips = []
+        for idx, clip in enumerate(clips):
+            error = validate_clip_range(clip.get('start'), clip.get('end')) if isinstance(clip, dict) else 'clip bir obje olmalı'
+            if error:
+                invalid_clips.append({'index': idx, 'error': error, 'clip': clip})
+        if invalid_clips:
+            return jsonify({
+                'success': False,
+                'error': 'Geçersiz clip aralıkları',
+                'invalid_clips': invalid_clips
+            }), 400
+        
+        priority = resolve_priority(data.get('priority'), 1)
+        if not priority:
+            return jsonify({
+                'success': False,
+                'error': f"priority şunlardan biri olmalı: {', '.join(PRIORITY_CLASSES)}"
+            }), 400
+        client_id = get_client_id()
+        analysis_options = {
+            'min_duration': min_duration,
+            'max_duration': max_duration,
+            'snap_tolerance': snap_tolerance,
+            'clips': clips
+        }
+        
+        # Cache'te analiz varsa URL çözümleme, probe ve indirme yok - job hemen biter
+        cached_analysis = get_source_analysis(video_id, None, build=False)
+        if cached_analysis:
+            job_id = str(uuid.uuid4())
+            now = datetime.now().isoformat()
+            save_job(job_id, {
+                'job_id': job_id,
+                'video_id': video_id,
+                'status': 'finished',
+                'priority': priority,
+                'client_id': client_id,
+                'mode': 'analysis',
+                'analysis_options': analysis_options,
+                'created_at': now,
+                'completed_at': now,
+                'total': 0,
+                'processed': 0,
+                'progress': 100,
+                'clip_filenames': [],
+                'clip_states': [],
+                'results': [],
+                'errors': [],
+                'analysis': build_analysis_result(cached_analysis, analysis_options)
+            })
+            JOBS_TOTAL.labels(status='finished').inc()
+            return jsonify({
+                'success': True,
+                'job_id': job_id,
+                'video_id': video_id,
+                'status': 'finished',
+                'priority': priority,
+                'cached': True,
+                'message': 'Analiz cache\'ten döndü. /api/check-job/<job_id> ile sonucu alın.'
+            })
+        
+        retry_after = SCHEDULER.check_capacity()
+        if retry_after is not None:
+            return queue_full_response(retry_after)
+        
+        job_id = str(uuid.uuid4())
+        job_data = {
+            'job_id': job_id,
+            'video_id': video_id,
+            'status': 'pending',
+            'priority': priority,
+            'client_id': client_id,
+            'mode': 'analysis',
+            'analysis_options': analysis_options,
+            'created_at': datetime.now().isoformat(),
+            'total': 0,
+            'processed': 0,
+            'clip_filenames': [],
+            'clip_states': []
+        }
+        save_job(job_id, job_data)
+        JOB_HEARTBEAT.add(job_id)
+        
+        # create-clips gibi: URL çözümleme resolver havuzunda, istek hemen döner
+        get_url_resolver().submit(resolve_and_schedule_job, job_id, video_id, [])
+        
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'video_id': video_id,
+            'status': 'pending',
+            'priority': priority,
+            'message': 'Analiz başlatıldı. /api/check-job/<job_id> ile durumu kontrol edin.'
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/compose', methods=['POST'])
+def compose_reel():
+    """
+    Birden fazla aralıktan (bir veya daha fazla video) tek bir highlight reel oluştur (async)
+    
+    Request body:
+    {
+        "segments": [
+            {"video_id": "KDV_-rXGy7A", "start": 0.32, "end": 41.56},
+            {"video_id": "Z3TMbaX_X0k", "start": 10, "end": 25}
+        ],
+        "framing": "letterbox",  // opsiyonel: letterbox | crop (tüm segmentler için)
+        "priority": "interactive"  // opsiyonel
+    }
+    
+    Daha önce aynı profille kesilmiş segmentler tekrar encode edilmez; birleştirme stream copy ile yapılır.
+    """
+    try:
+        data = request.json or {}
+        segments = data.get('segments')
+        
+        if not isinstance(segments, list) or not segments:
+            return jsonify({
+                'success': False,
+                'error': 'segments listesi gerekli'
+            }), 400
+        
+        invalid_segments = []
+        for idx, segment in enumerate(segments):
+            if not isinstance(segment, dict) or not segment.get('video_id'):
+                error = 'video_id, start ve end gerekli'
+            else:
+                error = validate_clip_range(segment.get('start'), segment.get('end'))
+            if error:
+                invalid_segments.append({'index': idx, 'error': error, 'segment': segment})
+        if invalid_segments:
+            return jsonify({
+                'success': False,
+                'error': 'Geçersiz segmentler',
+                'invalid_segments': invalid_segments
+            }), 400
+        segments = [{'video_id': s['video_id'], 'start': s['start'], 'end': s['end']} for s in segments]
+        
+        framing = data.get('framing', DEFAULT_FRAMING)
+        mode_error = validate_job_mode('video', 'm4a', framing)
+        if mode_error:
+            return jsonify({
+                'success': False,
+                'error': mode_error
+            }), 400
+        priority = resolve_priority(data.get('priority'), len(segments))
+        if not priority:
+            return jsonify({
+                'success': False,
+                'error': f"priority şunlardan biri olmalı: {', '.join(PRIORITY_CLASSES)}"
+            }), 400
+        client_id = get_client_id()
+        
+        # İmkansız aralıkları (cache'teki probe'a göre) indirmeden reddet
+        invalid_segments = []
+        for idx, segment in enumerate(segments):
+            for item in find_invalid_clips(segment['video_id'], [segment]):
+                invalid_segments.append(dict(item, index=idx))
+        if invalid_segments:
+            return jsonify({
+                'success': False,
+                'error': 'Geçersiz clip aralıkları',
+                'invalid_segments': invalid_segments
+            }), 400
+        
+        retry_after = SCHEDULER.check_capacity()
+        if retry_after is not None:
+            return queue_full_response(retry_after)
+        
+        job_id = str(uuid.uuid4())
+        output_file = compose_filename(segments, framing)
+        job_data = {
+            'job_id': job_id,
+            'video_id': ','.join(dict.fromkeys(s['video_id'] for s in segments)),
+            'status': 'pending',
+            'priority': priority,
+            'client_id': client_id,
+            'mode': 'compose',
+            'framing': framing,
+            'segments': segments,
+            'created_at': datetime.now().isoformat(),
+            'total': len(segments),
+            'processed': 0,
+            'clip_filenames': [output_file]
+        }
+        save_job(job_id, job_data)
+        JOB_HEARTBEAT.add(job_id)
+        
+        try:
+            SCHEDULER.submit(job_id, process_compose_async, (job_id,), priority=priority, client_id=client_id, cost=len(segments))
+        except QueueFullError as e:
+            JOB_HEARTBEAT.discard(job_id)
+            delete_job(job_id)
+            return queue_full_response(e.retry_after)
+        
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status': 'pending',
+            'priority': priority,
+            'estimated_start_at': SCHEDULER.estimated_start(job_id),
+            'total_segments': len(segments),
+            'message': 'Compose job\'u başlatıldı. /api/check-job/<job_id> ile durumu kontrol edin.',
+            'clip_filenames': job_data['clip_filenames']
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/check-job/<job_id>', methods=['GET'])
 def check_job(job_id):
     """Job durumunu kontrol et"""
@@ -1105,36 +5051,272 @@ def check_job(job_id):
             'error': 'Job bulunamadı'
         }), 404
     
-    response = {
+    return jsonify(build_job_response(job_id, job))
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def delete_or_cancel_job(job_id):
+    """Aktif job'u iptal et (kuyruktan çıkar, çalışan ffmpeg'leri öldür), bitmiş job'u sil"""
+    job = get_job(job_id)
+    
+    if not job:
+        return jsonify({
+            'success': False,
+            'error': 'Job bulunamadı'
+        }), 404
+    
+    if job['status'] not in ('pending', 'processing'):
+        delete_job(job_id)
+        print(f"🗑️ Job silindi: {job_id}")
+        return jsonify({
+            'success': True,
+            'message': f"Job {job_id} silindi"
+        })
+    
+    dequeued = cancel_job(job_id)
+    job = get_job(job_id) or job
+    job['status'] = 'cancelled'
+    job['completed_at'] = datetime.now().isoformat()
+    job.pop('current_clip', None)
+    job.pop('eta_seconds', None)
+    save_job(job_id, job)
+    if dequeued:
+        JOB_HEARTBEAT.discard(job_id)
+        JOBS_TOTAL.labels(status='cancelled').inc()
+    print(f"🛑 Job iptal edildi: {job_id}")
+    
+    return jsonify({
         'success': True,
         'job_id': job_id,
-        'video_id': job['video_id'],
-        'status': job['status'],
-        'created_at': job['created_at'],
-        'total': job['total'],
-        'processed': job['processed'],
-        'clip_filenames': job.get('clip_filenames', [])
+        'status': 'cancelled',
+        'message': f"Job {job_id} iptal edildi"
+    })
+
+@app.route('/api/batches', methods=['POST'])
+def create_batch():
+    """
+    Birden fazla video için toplu kesit job'u oluştur
+    
+    Request body:
+    {
+        "videos": [
+            {"video_id": "KDV_-rXGy7A", "clips": [{"start": 0.32, "end": 41.56}]},
+            {"video_id": "Z3TMbaX_X0k", "clips": [{"start": 0, "end": 10}]}
+        ],
+        "priority": "bulk",  // opsiyonel, varsayılan bulk
+        "previews": ["thumbnail"],  // opsiyonel, tüm videolar için
+        "mode": "audio",  // opsiyonel, tüm videolar için
+        "audio_format": "wav",
+        "framing": "crop",
+        "output": "mp4"
     }
+    """
+    try:
+        data = request.json or {}
+        entries = data.get('videos', [])
+        
+        if not isinstance(entries, list) or not entries:
+            return jsonify({
+                'success': False,
+                'error': 'videos listesi gerekli'
+            }), 400
+        
+        # Aynı video birden fazla kez gelirse tek job'da birleştir
+        grouped = group_batch_entries(entries)
+        if not grouped:
+            return jsonify({
+                'success': False,
+                'error': 'Her video için video_id ve clips gerekli'
+            }), 400
+        
+        priority = resolve_priority(data.get('priority'), sum(len(clips) for clips in grouped.values()), default='bulk')
+        if not priority:
+            return jsonify({
+                'success': False,
+                'error': f"priority şunlardan biri olmalı: {', '.join(PRIORITY_CLASSES)}"
+            }), 400
+        previews = data.get('previews', DEFAULT_PREVIEWS)
+        if not isinstance(previews, list) or any(kind not in PREVIEW_KINDS for kind in previews):
+            return jsonify({
+                'success': False,
+                'error': f"previews şunlardan oluşan bir liste olmalı: {', '.join(PREVIEW_KINDS)}"
+            }), 400
+        mode = data.get('mode', 'video')
+        audio_format = data.get('audio_format', 'm4a')
+        framing = data.get('framing', DEFAULT_FRAMING)
+        output_format = data.get('output', 'mp4')
+        mode_error = validate_job_mode(mode, audio_format, framing, output_format)
+        if mode_error:
+            return jsonify({
+                'success': False,
+                'error': mode_error
+            }), 400
+        client_id = get_client_id()
+        
+        # Eksik/imkansız aralıkları (cache'teki probe'a göre) indirmeden reddet
+        invalid_clips = []
+        for video_id, clips in grouped.items():
+            invalid_clips += [dict(item, video_id=video_id) for item in find_invalid_clips(video_id, clips, require_range=True)]
+        if invalid_clips:
+            return jsonify({
+                'success': False,
+                'error': 'Geçersiz clip aralıkları',
+                'invalid_clips': invalid_clips
+            }), 400
+        
+        retry_after = SCHEDULER.check_capacity(len(grouped))
+        if retry_after is not None:
+            return queue_full_response(retry_after)
+        
+        batch_id = str(uuid.uuid4())
+        created_at = datetime.now().isoformat()
+        jobs = []
+        
+        for video_id, clips in grouped.items():
+            job_id = str(uuid.uuid4())
+            job_data = {
+                'job_id': job_id,
+                'video_id': video_id,
+                'batch_id': batch_id,
+                'status': 'pending',
+                'priority': priority,
+                'client_id': client_id,
+                'previews': previews,
+                'mode': mode,
+                'audio_format': audio_format,
+                'framing': framing,
+                'output': output_format,
+                'created_at': created_at,
+                'total': len(clips),
+                'processed': 0,
+                'clip_filenames': job_clip_filenames(video_id, clips, mode, audio_format, framing, output_format),
+                'clip_states': initial_clip_states(clips)
+            }
+            save_job(job_id, job_data)
+            JOB_HEARTBEAT.add(job_id)
+            jobs.append({
+                'job_id': job_id,
+                'video_id': video_id,
+                'total_clips': len(clips),
+                'clip_filenames': job_data['clip_filenames']
+            })
+        
+        total_clips = sum(job['total_clips'] for job in jobs)
+        save_batch(batch_id, {
+            'batch_id': batch_id,
+            'created_at': created_at,
+            'job_ids': [job['job_id'] for job in jobs],
+            'total_clips': total_clips,
+            'expires_at': time.time() + BATCH_TTL_SECONDS
+        })
+        
+        # URL'leri paralel çöz, hazır olan job scheduler'a girsin
+        resolver = get_url_resolver()
+        for job in jobs:
+            resolver.submit(resolve_and_schedule_job, job['job_id'], job['video_id'], grouped[job['video_id']])
+        
+        print(f"📦 Batch oluşturuldu: {batch_id} ({len(jobs)} video, {total_clips} clip)")
+        
+        return jsonify({
+            'success': True,
+            'batch_id': batch_id,
+            'status': 'pending',
+            'priority': priority,
+            'total_videos': len(jobs),
+            'total_clips': total_clips,
+            'jobs': jobs,
+            'message': 'Batch başlatıldı. /api/batches/<batch_id> ile durumu kontrol edin.'
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/batches/<batch_id>', methods=['GET'])
+def check_batch(batch_id):
+    """Batch durumunu ve job bazında ilerlemeyi döndür"""
+    batch = get_batch(batch_id)
     
-    if job['status'] == 'finished':
-        response['completed_at'] = job.get('completed_at')
-        # URL'leri düzgün oluştur
-        clips_with_urls = []
-        for clip in job.get('results', []):
-            clip_copy = clip.copy()
-            clip_copy['url'] = url_for('serve_clip', filename=clip['filename'], _external=True)
-            clips_with_urls.append(clip_copy)
-        response['clips'] = clips_with_urls
-        response['errors'] = job.get('errors')
-        response['error_count'] = len(job.get('errors', []))
-    elif job['status'] == 'failed':
-        response['error'] = job.get('error')
+    if not batch:
+        return jsonify({
+            'success': False,
+            'error': 'Batch bulunamadı'
+        }), 404
+    
+    jobs = []
+    statuses = []
+    total = 0
+    processed = 0
+    progress_units = 0
+    
+    for job_id in batch.get('job_ids', []):
+        job = get_job(job_id)
+        if not job:
+            # Job cleanup ile silinmiş olabilir
+            statuses.append('expired')
+            jobs.append({'job_id': job_id, 'status': 'expired'})
+            continue
+        job_response = build_job_response(job_id, job)
+        job_response.pop('success', None)
+        jobs.append(job_response)
+        statuses.append(job['status'])
+        total += job.get('total', 0)
+        processed += job.get('processed', 0)
+        # Encode edilmekte olan clip'in kısmi ilerlemesi de sayılır
+        progress_units += job.get('total', 0) * job.get('progress', 0) / 100 if 'progress' in job else job.get('processed', 0)
+    
+    if all(status in ('finished', 'failed', 'cancelled', 'expired') for status in statuses):
+        status = 'finished'
+    elif 'processing' in statuses or processed > 0:
+        status = 'processing'
+    else:
+        status = 'pending'
     
-    return jsonify(response)
+    return jsonify({
+        'success': True,
+        'batch_id': batch_id,
+        'status': status,
+        'created_at': batch['created_at'],
+        'total': total,
+        'processed': processed,
+        'progress': round(progress_units * 100 / total, 1) if total else 0,
+        'failed_jobs': statuses.count('failed'),
+        'jobs': jobs
+    })
+
+@app.route('/api/scheduler', methods=['GET'])
+def scheduler_status():
+    """Scheduler kuyruk ve kaynak durumunu döndür"""
+    return jsonify({
+        'success': True,
+        'scheduler': SCHEDULER.stats()
+    })
+
+@app.route('/api/timings', methods=['GET'])
+def timings_status():
+    """Process genelinde aşama sürelerini (span istatistikleri) döndür"""
+    return jsonify({
+        'success': True,
+        'timings': timing_stats()
+    })
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrikleri (gunicorn'da tüm worker'ların toplamı)"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
 
-@app.route('/clips/<filename>')
+@app.route('/clips/<path:filename>')
 def serve_clip(filename):
-    """Kesit dosyasını sun"""
+    """Kesit dosyasını sun (HLS: <clip>_hls/ altındaki playlist ve segmentler)"""
+    if filename.endswith('.m3u8'):
+        # Event playlist encode sürerken büyür - player her seferinde tazesini almalı
+        return send_from_directory(CLIPS_FOLDER, filename, max_age=0)
     return send_from_directory(CLIPS_FOLDER, filename)
 
 @app.route('/api/clips', methods=['GET'])
@@ -1142,14 +5324,35 @@ def list_clips():
     """Mevcut kesitleri listele"""
     clips = []
     for filename in os.listdir(CLIPS_FOLDER):
-        if filename.endswith('.mp4'):
+        if filename.endswith(CLIP_EXTENSIONS):
             file_path = os.path.join(CLIPS_FOLDER, filename)
             file_size = os.path.getsize(file_path)
-            clips.append({
+            clip_entry = {
                 'filename': filename,
                 'url': url_for('serve_clip', filename=filename, _external=True),
                 'size': file_size
-            })
+            }
+            # Clip ile birlikte üretilmiş önizlemeler
+            previews = {
+                kind: url_for('serve_clip', filename=preview, _external=True)
+                for kind, preview in preview_filenames(filename, PREVIEW_KINDS).items()
+                if os.path.exists(os.path.join(CLIPS_FOLDER, preview))
+            }
+            if previews:
+                clip_entry['previews'] = previews
+            clips.append(clip_entry)
+        elif filename.endswith('_hls'):
+            # Sadece encode'u bitmiş HLS çıktıları (ENDLIST yazılmış)
+            playlist = f"{filename}/{HLS_PLAYLIST}"
+            playlist_path = os.path.join(CLIPS_FOLDER, playlist)
+            segments, complete = read_hls_playlist(playlist_path)
+            if complete:
+                clips.append({
+                    'filename': playlist,
+                    'url': url_for('serve_clip', filename=playlist, _external=True),
+                    'size': clip_output_size(playlist_path),
+                    'segments': segments
+                })
     
     return jsonify({
         'success': True,
@@ -1157,15 +5360,16 @@ def list_clips():
         'total': len(clips)
     })
 
-@app.route('/api/clips/<filename>', methods=['DELETE'])
+@app.route('/api/clips/<path:filename>', methods=['DELETE'])
 def delete_clip(filename):
     """Clip dosyasını sil"""
     try:
-        # Güvenlik kontrolü - sadece .mp4 dosyaları
-        if not filename.endswith('.mp4'):
+        # Güvenlik kontrolü - sadece clip (.mp4), ses kesiti dosyaları ve <clip>_hls/index.m3u8
+        is_hls = filename.endswith(f"_hls/{HLS_PLAYLIST}") and filename.count('/') == 1
+        if not (is_hls or ('/' not in filename and filename.endswith(CLIP_EXTENSIONS))):
             return jsonify({
                 'success': False,
-                'error': 'Sadece .mp4 dosyaları silinebilir'
+                'error': f"Sadece {', '.join(CLIP_EXTENSIONS)} dosyaları ve HLS playlist'leri silinebilir"
             }), 400
         
         file_path = os.path.join(CLIPS_FOLDER, filename)
@@ -1177,8 +5381,11 @@ def delete_clip(filename):
                 'error': 'Dosya bulunamadı'
             }), 404
         
-        # Dosyayı sil
-        os.remove(file_path)
+        # Dosyayı (ve önizlemelerini) sil - HLS'te tüm segment klasörü
+        remove_clip_output(file_path)
+        for preview in preview_filenames(filename, PREVIEW_KINDS).values():
+            if os.path.exists(os.path.join(CLIPS_FOLDER, preview)):
+                os.remove(os.path.join(CLIPS_FOLDER, preview))
         print(f"🗑️ Clip silindi: {filename}")
         
         return jsonify({
@@ -1199,7 +5406,7 @@ def clear_all_clips():
         deleted_count = 0
         
         for filename in os.listdir(CLIPS_FOLDER):
-            if filename.endswith('.mp4'):
+            if filename.endswith(CLIP_EXTENSIONS):
                 file_path = os.path.join(CLIPS_FOLDER, filename)
                 try:
                     os.remove(file_path)
@@ -1207,6 +5414,16 @@ def clear_all_clips():
                     print(f"🗑️ Silindi: {filename}")
                 except Exception as e:
                     print(f"⚠️ Silinemedi {filename}: {e}")
+            elif filename.endswith('_hls') and os.path.isdir(os.path.join(CLIPS_FOLDER, filename)):
+                shutil.rmtree(os.path.join(CLIPS_FOLDER, filename), ignore_errors=True)
+                deleted_count += 1
+                print(f"🗑️ Silindi: {filename}/")
+            elif filename.endswith(('.jpg', '.webp', '.vtt')):
+                # Önizlemeler clip sayısına dahil değil
+                try:
+                    os.remove(os.path.join(CLIPS_FOLDER, filename))
+                except OSError as e:
+                    print(f"⚠️ Silinemedi {filename}: {e}")
         
         return jsonify({
             'success': True,
@@ -1229,6 +5446,14 @@ def index():
         'endpoints': {
             'POST /api/create-clips': 'Kesitler oluştur (async, job ID döndürür)',
             'GET /api/check-job/<job_id>': 'Job durumunu kontrol et',
+            'DELETE /api/jobs/<job_id>': 'Job\'u iptal et (bitmişse sil)',
+            'POST /api/batches': 'Birden fazla video için toplu kesit job\'u oluştur',
+            'POST /api/analyze': 'Sessizlik/sahne analizi ile clip sınırı öner (async)',
+            'POST /api/compose': 'Birden fazla aralığı tek highlight reel\'de birleştir (async)',
+            'GET /api/batches/<batch_id>': 'Batch durumunu kontrol et',
+            'GET /api/scheduler': 'Kuyruk ve kaynak kullanımını göster',
+            'GET /api/timings': 'Aşama sürelerinin (span) istatistiklerini göster',
+            'GET /metrics': 'Prometheus metrikleri',
             'GET /api/clips': 'Mevcut kesitleri listele',
             'GET /clips/<filename>': 'Kesit dosyasını indir',
             'DELETE /api/clips/<filename>': 'Belirli clip dosyasını sil',
@@ -1237,4 +5462,7 @@ def index():
     })
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # Debug reloader'da sadece asıl sunucu process'i job kurtarsın
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_job_recovery()
+    create_app().run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
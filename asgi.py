@@ -0,0 +1,340 @@
+"""
+ASGI ön yüzü (uvicorn / gunicorn UvicornWorker)
+
+Bağlantılar event loop'ta tutulur: long-poll check-job, SSE job olayları ve clip
+indirmeleri worker thread'i işgal etmez. Flask view'ları ASGI_VIEW_THREADS boyutlu ayrı bir
+havuzda çalışır; check-job yanıtı, job kayıtlarını okuma ve dosya parçaları ASGI_WORKER_THREADS
+boyutlu I/O havuzunda kalır, böylece dolu view havuzu long-poll/SSE ve clip indirmelerini
+bekletmez. Provider çağrıları (URL çözümleme) view'larda değil app'in resolver havuzunda yapılır. JSON endpoint'leri Flask
+view'larını kullandığı için yanıt sözleşmeleri WSGI sürümüyle aynıdır.
+
+Çalıştırma:
+    gunicorn -w 4 -k uvicorn_worker.UvicornWorker asgi:application
+    uvicorn asgi:application --port 5000
+"""
+import asyncio
+import io
+import json
+import mimetypes
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from urllib.parse import parse_qs
+
+from werkzeug.security import safe_join
+
+import app as api
+
+api.create_app()  # tek seferlik init (gunicorn --preload ile master'da)
+
+ASGI_WORKER_THREADS = int(os.environ.get('ASGI_WORKER_THREADS', '32'))  # job okuma + dosya I/O
+ASGI_VIEW_THREADS = int(os.environ.get('ASGI_VIEW_THREADS', '8'))  # Flask view'ları / provider çağrıları
+ASGI_MAX_WAIT_SECONDS = float(os.environ.get('ASGI_MAX_WAIT_SECONDS', '30'))  # long-poll üst sınırı
+ASGI_POLL_SECONDS = 0.5  # long-poll/SSE'de job kaydını kontrol aralığı
+SSE_KEEPALIVE_SECONDS = 15  # proxy'ler boşta bağlantıyı kapatmasın
+FILE_CHUNK_BYTES = 256 * 1024
+
+_executor = ThreadPoolExecutor(max_workers=ASGI_WORKER_THREADS, thread_name_prefix='asgi-worker')
+_view_executor = ThreadPoolExecutor(max_workers=ASGI_VIEW_THREADS, thread_name_prefix='asgi-view')
+
+async def run_blocking(func, *args):
+    """Kısa engelleyici I/O'yu (job kaydı, dosya parçası) thread havuzunda çalıştır, event loop'u bekletme"""
+    return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+
+async def run_view(func, *args):
+    """Flask view'ını ayrı havuzda çalıştır - yavaş provider çağrıları I/O havuzunu doldurmasın"""
+    return await asyncio.get_running_loop().run_in_executor(_view_executor, func, *args)
+
+class Request:
+    """ASGI scope + okunmuş body"""
+    
+    def __init__(self, scope, body=b''):
+        self.scope = scope
+        self.body = body
+        self.method = scope['method']
+        self.path = scope['path']
+        self.query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        self.headers = {}
+        for name, value in scope.get('headers', []):
+            key = name.decode('latin-1').lower()
+            value = value.decode('latin-1')
+            self.headers[key] = f"{self.headers[key]},{value}" if key in self.headers else value
+    
+    def query_value(self, name, default=None):
+        values = self.query.get(name)
+        return values[0] if values else default
+
+async def read_body(receive):
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        body.extend(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return bytes(body)
+
+async def send_response(send, status, headers, body=b''):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(k.encode('latin-1'), str(v).encode('latin-1')) for k, v in headers]})
+    await send({'type': 'http.response.body', 'body': body})
+
+async def send_json(send, payload, status=200):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    await send_response(send, status, [('Content-Type', 'application/json'), ('Content-Length', len(body))], body)
+
+def wsgi_environ(request):
+    """ASGI isteğinden Flask'ın beklediği WSGI environ'u"""
+    scope = request.scope
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client')
+    environ = {
+        'REQUEST_METHOD': request.method,
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': request.path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0] if client else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(request.body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    for name, value in request.headers.items():
+        key = name.upper().replace('-', '_')
+        environ[key if key in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f"HTTP_{key}"] = value
+    return environ
+
+def call_flask(request):
+    """İsteği Flask uygulamasına ver (thread havuzunda çağrılır) -> (status, headers, body)"""
+    started = {}
+    
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = headers
+    
+    result = api.app(wsgi_environ(request), start_response)
+    try:
+        body = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return started['status'], started['headers'], body
+
+async def flask_view(request, send):
+    """JSON endpoint'leri: Flask view'ı view havuzunda, aynı yanıt sözleşmesiyle"""
+    status, headers, body = await run_view(call_flask, request)
+    await send_response(send, status, headers, body)
+
+def job_snapshot(job):
+    """Long-poll/SSE için job'un istemciye görünen değişimi"""
+    if not job:
+        return None
+    return (job.get('status'), job.get('processed'), job.get('progress'),
+            (job.get('current_clip') or {}).get('progress'))
+
+async def check_job(request, send, receive, job_id):
+    """?wait=<saniye> verilirse job değişene (veya bitene) kadar bağlantıyı bekletir"""
+    try:
+        wait = min(float(request.query_value('wait', 0)), ASGI_MAX_WAIT_SECONDS)
+    except ValueError:
+        wait = 0
+    if wait > 0:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        job = await run_blocking(api.get_job, job_id)
+        snapshot = job_snapshot(job)
+        while job and job['status'] not in api.TERMINAL_JOB_STATUSES and loop.time() < deadline:
+            await asyncio.sleep(ASGI_POLL_SECONDS)
+            job = await run_blocking(api.get_job, job_id)
+            if job_snapshot(job) != snapshot:
+                break
+    # Yanıt sadece job kaydını okur - view havuzu yavaş provider çağrılarıyla dolu olsa da I/O havuzunda cevaplanır
+    status, headers, body = await run_blocking(call_flask, request)
+    await send_response(send, status, headers, body)
+
+def job_event(request, job_id):
+    """SSE olayı için check-job yanıtı (url_for için Flask request context'i gerekir)"""
+    job = api.get_job(job_id)
+    if not job:
+        return None, None
+    environ = wsgi_environ(request)
+    with api.app.request_context(environ):
+        return job, api.build_job_response(job_id, job)
+
+async def job_events(request, send, receive, job_id):
+    """Job durumunu Server-Sent Events olarak yayınla, job bitince akışı kapat"""
+    job, payload = await run_blocking(job_event, request, job_id)
+    if not job:
+        await send_json(send, {'success': False, 'error': 'Job bulunamadı'}, 404)
+        return
+    
+    disconnected = asyncio.Event()
+    
+    async def watch_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        disconnected.set()
+    
+    watcher = asyncio.ensure_future(watch_disconnect())
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [
+        (b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no')
+    ]})
+    try:
+        snapshot = None
+        last_sent = time.monotonic()
+        while not disconnected.is_set():
+            if job_snapshot(job) != snapshot:
+                snapshot = job_snapshot(job)
+                data = json.dumps(payload, ensure_ascii=False)
+                await send({'type': 'http.response.body', 'body': f"event: job\ndata: {data}\n\n".encode('utf-8'), 'more_body': True})
+                last_sent = time.monotonic()
+                if job['status'] in api.TERMINAL_JOB_STATUSES:
+                    break
+            elif time.monotonic() - last_sent >= SSE_KEEPALIVE_SECONDS:
+                await send({'type': 'http.response.body', 'body': b": keepalive\n\n", 'more_body': True})
+                last_sent = time.monotonic()
+            
+            try:
+                await asyncio.wait_for(disconnected.wait(), ASGI_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            job, payload = await run_blocking(job_event, request, job_id)
+            if not job:
+                break  # job silindi
+    finally:
+        watcher.cancel()
+    await send({'type': 'http.response.body', 'body': b''})
+
+def parse_range(header, size):
+    """Tek aralıklı 'bytes=a-b' header'ı -> (start, end) dahil, geçersizse None"""
+    match = re.fullmatch(r'bytes=(\d*)-(\d*)', header.strip())
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    if not match.group(1):
+        start, end = max(size - int(match.group(2)), 0), size - 1
+    else:
+        start = int(match.group(1))
+        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+    return (start, end) if start <= end and start < size else None
+
+def read_chunk(f, length):
+    return f.read(length)
+
+async def serve_clip(request, send, receive, filename):
+    """Clip dosyasını parça parça (Range destekli) gönder - yavaş istemci thread tutmaz"""
+    path = safe_join(api.CLIPS_FOLDER, filename)
+    try:
+        stat = await run_blocking(os.stat, path) if path else None
+    except OSError:
+        stat = None
+    if stat is None or not os.path.isfile(path):
+        await send_response(send, 404, [('Content-Type', 'text/plain; charset=utf-8')], b'Not Found')
+        return
+    
+    size = stat.st_size
+    headers = [
+        ('Content-Type', mimetypes.guess_type(path)[0] or 'application/octet-stream'),
+        ('Accept-Ranges', 'bytes'),
+        ('Last-Modified', formatdate(stat.st_mtime, usegmt=True)),
+        # Event playlist encode sürerken büyür (Flask tarafındaki max_age=0 ile aynı)
+        ('Cache-Control', 'no-cache, max-age=0' if filename.endswith('.m3u8') else 'no-cache')
+    ]
+    status, start, end = 200, 0, size - 1
+    if request.headers.get('range') and size:
+        byte_range = parse_range(request.headers['range'], size)
+        if byte_range is None:
+            await send_response(send, 416, [('Content-Range', f"bytes */{size}")])
+            return
+        status, (start, end) = 206, byte_range
+        headers.append(('Content-Range', f"bytes {start}-{end}/{size}"))
+    headers.append(('Content-Length', end - start + 1 if size else 0))
+    
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(k.encode('latin-1'), str(v).encode('latin-1')) for k, v in headers]})
+    if request.method == 'HEAD' or not size:
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+    
+    f = await run_blocking(open, path, 'rb')
+    try:
+        await run_blocking(f.seek, start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await run_blocking(read_chunk, f, min(FILE_CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': remaining > 0})
+        if remaining > 0:
+            await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        await run_blocking(f.close)
+
+# (method'lar, path regex, handler, Prometheus endpoint etiketi) - eşleşmeyen istekler Flask'a gider
+# Etiketi None olanlar yanıtı Flask'tan aldığı için metrikleri Flask'ın after_request'i yazar
+ROUTES = [
+    (('GET',), re.compile(r'/api/check-job/(?P<job_id>[^/]+)'), check_job, None),
+    (('GET',), re.compile(r'/api/jobs/(?P<job_id>[^/]+)/events'), job_events, '/api/jobs/<job_id>/events'),
+    (('GET', 'HEAD'), re.compile(r'/clips/(?P<filename>.+)'), serve_clip, '/clips/<path:filename>')
+]
+
+def match_route(method, path):
+    for methods, pattern, handler, endpoint in ROUTES:
+        match = pattern.fullmatch(path)
+        if match and method in methods:
+            return handler, endpoint, match.groupdict()
+    return None, None, {}
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # gunicorn post_worker_init ile aynı - process başına bir kez çalışır
+            api.start_job_recovery()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            # Ertelenmiş job yazımları kaybolmasın
+            await run_blocking(api.JOB_STORE.flush)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def application(scope, receive, send):
+    """ASGI giriş noktası"""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+    
+    request = Request(scope, await read_body(receive))
+    handler, endpoint, params = match_route(request.method, request.path)
+    if handler is None:
+        await flask_view(request, send)
+        return
+    if endpoint is None:
+        await handler(request, send, receive, **params)
+        return
+    
+    started = time.perf_counter()
+    status = {}
+    
+    async def tracked_send(message):
+        if message['type'] == 'http.response.start':
+            status['code'] = message['status']
+        await send(message)
+    
+    try:
+        await handler(request, tracked_send, receive, **params)
+    finally:
+        api.HTTP_REQUESTS.labels(endpoint=endpoint, method=request.method, status=status.get('code', 500)).inc()
+        api.HTTP_LATENCY.labels(endpoint=endpoint).observe(time.perf_counter() - started)
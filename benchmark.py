@@ -0,0 +1,470 @@
+"""
+Offline benchmark for the clip pipeline
+Generates synthetic sources with ffmpeg testsrc2, serves them from a local
+SaveNow stub (ajax/download.php + progress endpoint) and drives
+/api/create-clips on a local gunicorn server. Results are written as JSON
+so runs can be compared between commits.
+
+Usage:
+    python benchmark.py [--jobs 8] [--clips 3] [--clip-seconds 15] [--concurrency 4]
+    python benchmark.py --compare benchmark_old.json
+    python benchmark.py --startup [--runs 5] [--compare startup_old.json]
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import resource
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_FPS = 30
+SAMPLE_SECONDS = 0.5
+POLL_SECONDS = 0.5
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def generate_source(path, seconds):
+    """Create a synthetic 720p source with audio (same shape as a SaveNow download)"""
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size=1280x720:rate={SOURCE_FPS}",
+        "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=44100",
+        "-t", str(seconds),
+        "-c:v", "libx264", "-preset", "ultrafast", "-g", str(SOURCE_FPS * 4),
+        "-c:a", "aac", "-shortest", "-movflags", "+faststart", "-y", path
+    ]
+    subprocess.run(cmd, check=True)
+
+class SaveNowStub(BaseHTTPRequestHandler):
+    """Mimics p.savenow.to: download.php -> progress_url -> download_url (with Range support)"""
+    sources = []
+    base_url = ''
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+
+        if url.path == '/ajax/download.php':
+            video_id = parse_qs(urlparse(query.get('url', [''])[0]).query).get('v', ['unknown'])[0]
+            return self._json({
+                'success': True,
+                'id': video_id,
+                'title': f"Benchmark {video_id}",
+                'progress_url': f"{self.base_url}/api/progress?id={video_id}"
+            })
+
+        if url.path == '/api/progress':
+            video_id = query.get('id', ['unknown'])[0]
+            return self._json({
+                'success': 1,
+                'progress': 1000,
+                'text': 'Finished',
+                'download_url': f"{self.base_url}/files/{video_id}.mp4"
+            })
+
+        if url.path.startswith('/files/'):
+            return self._file(self._source_for(url.path[len('/files/'):-len('.mp4')]))
+
+        self.send_error(404)
+
+    def _source_for(self, video_id):
+        # Her job farklı video_id kullanır (cache'ler soğuk), kaynaklar döngüsel paylaşılır
+        match = re.search(r'(\d+)$', video_id)
+        index = int(match.group(1)) if match else 0
+        return self.sources[index % len(self.sources)]
+
+    def _json(self, data):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _file(self, path):
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        match = re.match(r'bytes=(\d*)-(\d*)', self.headers.get('Range', ''))
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            else:
+                start = max(0, size - int(match.group(2)))
+            if start >= size:
+                self.send_response(416)
+                self.send_header('Content-Range', f"bytes */{size}")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+
+        with open(path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            try:
+                while remaining > 0:
+                    chunk = f.read(min(64 * 1024, remaining))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+def process_tree(root_pid):
+    """root_pid ve tüm alt process'leri (/proc üzerinden, Linux)"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    pids, stack = [], [root_pid]
+    while stack:
+        pid = stack.pop()
+        pids.append(pid)
+        stack.extend(children.get(pid, []))
+    return pids
+
+def tree_rss_bytes(root_pid):
+    total = 0
+    for pid in process_tree(root_pid):
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            continue
+    return total
+
+def dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+    return total
+
+class ResourceSampler(threading.Thread):
+    """Sunucu process ağacının RSS'ini ve disk kullanımını periyodik ölç, tepe değerleri sakla"""
+
+    def __init__(self, server_pid, workdir):
+        super().__init__(daemon=True)
+        self.server_pid = server_pid
+        self.workdir = workdir
+        self.tmp_baseline = shutil.disk_usage(tempfile.gettempdir()).used
+        self.peak_rss = 0
+        self.peak_workdir = 0
+        self.peak_tmp = 0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.is_set():
+            if os.path.isdir('/proc'):
+                self.peak_rss = max(self.peak_rss, tree_rss_bytes(self.server_pid))
+            self.peak_workdir = max(self.peak_workdir, dir_size(self.workdir))
+            self.peak_tmp = max(self.peak_tmp, shutil.disk_usage(tempfile.gettempdir()).used - self.tmp_baseline)
+            self._done.wait(SAMPLE_SECONDS)
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+def start_server(workdir, port, workers, env, preload=True):
+    env = dict(env, GUNICORN_PRELOAD='1' if preload else '0')
+    cmd = [
+        sys.executable, "-m", "gunicorn",
+        "-c", os.path.join(REPO_DIR, "gunicorn.conf.py"),
+        "--chdir", workdir, "--pythonpath", REPO_DIR,
+        "-w", str(workers), "-b", f"127.0.0.1:{port}", "--timeout", "900",
+        "app:create_app()"
+    ]
+    log = open(os.path.join(workdir, "server.log"), 'w')
+    server = subprocess.Popen(cmd, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        if server.poll() is not None:
+            raise RuntimeError(f"Sunucu başlatılamadı, log: {os.path.join(workdir, 'server.log')}")
+        try:
+            requests.get(base_url + "/", timeout=1)
+            return server, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("Sunucu 20 saniyede hazır olmadı")
+
+# --startup: taze process'te ölçülen adımlar (setup süreye dahil değil)
+STARTUP_STEPS = {
+    'import_app_ms': ("", "import app"),
+    'create_app_ms': ("import app", "app.create_app()"),
+    'first_request_ms': ("import app; client = app.create_app().test_client()", "client.get('/')"),
+    'import_asgi_ms': ("", "import asgi"),
+}
+
+def time_in_subprocess(setup, statement, workdir, env):
+    code = f"import time\n{setup}\nt = time.perf_counter()\n{statement}\nprint(time.perf_counter() - t)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=workdir, env=env,
+                            capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1]) * 1000
+
+def time_to_first_200(workdir, workers, env, preload):
+    """Gunicorn'u başlatıp ilk 200 yanıtına kadar geçen süre"""
+    started = time.perf_counter()
+    server, _ = start_server(workdir, free_port(), workers, env, preload=preload)
+    elapsed = (time.perf_counter() - started) * 1000
+    server.terminate()
+    server.wait(timeout=60)
+    return elapsed
+
+def run_startup(args, commit):
+    """Import, app init, ilk istek ve gunicorn açılış süreleri (N çalıştırmanın medyanı)"""
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="clip_startup_") as workdir:
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [REPO_DIR, env.get('PYTHONPATH')]))
+        env['PROMETHEUS_MULTIPROC_DIR'] = os.path.join(workdir, "metrics")
+        env['WORKSPACE_ROOT'] = os.path.join(workdir, "work")
+        os.makedirs(env['PROMETHEUS_MULTIPROC_DIR'])
+        for name, (setup, statement) in STARTUP_STEPS.items():
+            samples = [time_in_subprocess(setup, statement, workdir, env) for _ in range(args.runs)]
+            results[name] = round(statistics.median(samples), 1)
+            print(f"{name:32s} {results[name]}")
+        for preload in (False, True):
+            name = f"gunicorn_first_200_{'preload' if preload else 'no_preload'}_ms"
+            samples = [time_to_first_200(workdir, args.workers, env, preload) for _ in range(args.runs)]
+            results[name] = round(statistics.median(samples), 1)
+            print(f"{name:32s} {results[name]}")
+    return {
+        'commit': commit,
+        'host': platform.node(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'measured_at': datetime.now().isoformat(),
+        'config': vars(args),
+        'results': results
+    }
+
+def run_job(base_url, index, args):
+    """Bir create-clips job'u gönder ve bitene kadar bekle"""
+    video_id = f"bench{index:04d}"
+    clips = [
+        {'start': k * args.clip_seconds, 'end': (k + 1) * args.clip_seconds}
+        for k in range(args.clips)
+    ]
+    submitted = time.time()
+    while True:
+        response = requests.post(base_url + "/api/create-clips", json={
+            'video_id': video_id, 'clips': clips, 'priority': args.priority
+        }, timeout=120)
+        if response.status_code != 429:
+            break
+        time.sleep(float(response.headers.get('Retry-After', '1')))
+    data = response.json()
+    if not data.get('success'):
+        return {'video_id': video_id, 'status': 'rejected', 'error': data.get('error'), 'latency': time.time() - submitted}
+
+    job_id = data['job_id']
+    while True:
+        time.sleep(POLL_SECONDS)
+        job = requests.get(f"{base_url}/api/check-job/{job_id}", timeout=30).json()
+        if job.get('status') in ('finished', 'failed'):
+            return {
+                'video_id': video_id,
+                'status': job['status'],
+                'clips_ok': len(job.get('clips') or []),
+                'clips_failed': job.get('error_count', 0) if job['status'] == 'finished' else args.clips,
+                'latency': time.time() - submitted,
+                'timings': (job.get('timings') or {}).get('totals', {})
+            }
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    rank = (len(values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return round(values[low] + (values[high] - values[low]) * (rank - low), 3)
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(current, previous_path):
+    with open(previous_path, 'r', encoding='utf-8') as f:
+        previous = json.load(f)
+    print(f"\n📊 Karşılaştırma: {previous.get('commit')} -> {current.get('commit')}")
+    for key, value in current['results'].items():
+        old = previous.get('results', {}).get(key)
+        if isinstance(value, (int, float)) and isinstance(old, (int, float)) and old:
+            print(f"{key:32s} {old:12.3f} -> {value:12.3f} ({(value - old) * 100 / old:+.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark for the clip pipeline")
+    parser.add_argument('--jobs', type=int, default=8, help="number of create-clips jobs")
+    parser.add_argument('--clips', type=int, default=3, help="clips per job")
+    parser.add_argument('--clip-seconds', type=float, default=15, help="length of each clip")
+    parser.add_argument('--concurrency', type=int, default=4, help="jobs submitted in parallel")
+    parser.add_argument('--sources', type=int, default=2, help="distinct synthetic source videos")
+    parser.add_argument('--workers', type=int, default=2, help="gunicorn workers")
+    parser.add_argument('--priority', default='bulk', choices=['interactive', 'bulk'])
+    parser.add_argument('--output', default=None, help="result file (default benchmark_<commit>.json)")
+    parser.add_argument('--compare', default=None, help="previous result file to diff against")
+    parser.add_argument('--startup', action='store_true', help="measure import/startup time instead of the pipeline")
+    parser.add_argument('--runs', type=int, default=5, help="fresh processes per startup step (median)")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    if args.startup:
+        print("="*60)
+        print("🏁 STARTUP BENCHMARK")
+        print("="*60)
+        result = run_startup(args, commit)
+        output = args.output or f"startup_{commit or datetime.now().strftime('%Y%m%d%H%M%S')}.json"
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Sonuçlar kaydedildi: {output}")
+        if args.compare:
+            compare(result, args.compare)
+        return
+
+    output = args.output or f"benchmark_{commit or datetime.now().strftime('%Y%m%d%H%M%S')}.json"
+    source_seconds = int(args.clips * args.clip_seconds + 5)
+
+    print("="*60)
+    print("🏁 CLIP PIPELINE BENCHMARK")
+    print("="*60)
+    print(f"Host: {platform.node()} ({platform.machine()}), commit: {commit}")
+
+    with tempfile.TemporaryDirectory(prefix="clip_bench_") as workdir:
+        sources_dir = os.path.join(workdir, "sources")
+        os.makedirs(sources_dir)
+        print(f"📥 {args.sources} synthetic kaynak oluşturuluyor ({source_seconds}s)...")
+        sources = []
+        for index in range(args.sources):
+            path = os.path.join(sources_dir, f"source{index}.mp4")
+            generate_source(path, source_seconds)
+            sources.append(path)
+
+        stub_port = free_port()
+        SaveNowStub.sources = sources
+        SaveNowStub.base_url = f"http://127.0.0.1:{stub_port}"
+        stub = ThreadingHTTPServer(('127.0.0.1', stub_port), SaveNowStub)
+        threading.Thread(target=stub.serve_forever, daemon=True).start()
+        print(f"🔌 SaveNow stub: {SaveNowStub.base_url}")
+
+        appdir = os.path.join(workdir, "app")
+        os.makedirs(appdir)
+        env = dict(os.environ)
+        env['SAVENOW_API_BASE'] = SaveNowStub.base_url
+        env['PROMETHEUS_MULTIPROC_DIR'] = os.path.join(workdir, "metrics")
+        env['WORKSPACE_ROOT'] = os.path.join(workdir, "work")  # indirme modunda geçici kaynaklar da ölçülsün
+
+        # Kaynak üretimi hariç, sunucu ağacının CPU süresi (worker'lar ve ffmpeg'ler dahil)
+        usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        server, base_url = start_server(appdir, free_port(), args.workers, env)
+        sampler = ResourceSampler(server.pid, appdir)
+        sampler.start()
+
+        print(f"🚀 {args.jobs} job x {args.clips} clip ({args.clip_seconds}s), eşzamanlı: {args.concurrency}")
+        started = time.time()
+        try:
+            with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                jobs = list(executor.map(lambda index: run_job(base_url, index, args), range(args.jobs)))
+        finally:
+            wall = time.time() - started
+            sampler.stop()
+            server.terminate()
+            server.wait(timeout=60)
+            stub.shutdown()
+        usage_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    cpu_seconds = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+    clips_ok = sum(job.get('clips_ok', 0) for job in jobs)
+    output_seconds = clips_ok * args.clip_seconds
+    latencies = [job['latency'] for job in jobs if job['status'] == 'finished']
+    stage_totals = {}
+    for job in jobs:
+        for name, total in job.get('timings', {}).items():
+            stage = stage_totals.setdefault(name, {'count': 0, 'total_ms': 0.0})
+            stage['count'] += total['count']
+            stage['total_ms'] = round(stage['total_ms'] + total['total_ms'], 1)
+
+    result = {
+        'commit': commit,
+        'host': platform.node(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'measured_at': datetime.now().isoformat(),
+        'config': vars(args),
+        'results': {
+            'wall_seconds': round(wall, 3),
+            'jobs_finished': len(latencies),
+            'jobs_failed': len(jobs) - len(latencies),
+            'clips_ok': clips_ok,
+            'clips_per_sec': round(clips_ok / wall, 3) if wall else 0,
+            'output_seconds_per_sec': round(output_seconds / wall, 3) if wall else 0,
+            'job_latency_p50': percentile(latencies, 50),
+            'job_latency_p95': percentile(latencies, 95),
+            'cpu_seconds': round(cpu_seconds, 3),
+            'cpu_seconds_per_output_second': round(cpu_seconds / output_seconds, 3) if output_seconds else None,
+            'peak_rss_mb': round(sampler.peak_rss / (1024 * 1024), 1),
+            'peak_workdir_mb': round(sampler.peak_workdir / (1024 * 1024), 1),
+            'peak_tmp_mb': round(max(sampler.peak_tmp, 0) / (1024 * 1024), 1)
+        },
+        'stages': stage_totals,
+        'jobs': jobs
+    }
+
+    print("\n" + "-"*60)
+    for key, value in result['results'].items():
+        print(f"{key:32s} {value}")
+
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Sonuçlar kaydedildi: {output}")
+
+    if args.compare:
+        compare(result, args.compare)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Encoder calibration script
+Measures libx264 frames/sec per preset on this host for the Reels profile
+and writes the results to ENCODER_CALIBRATION_FILE (read by app.plan_encoder)
+
+Usage:
+    python calibrate_encoder.py [--seconds 10] [--presets veryfast,fast]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import ENCODER_CALIBRATION_FILE, ENCODER_PROFILE, X264_PRESETS
+
+SOURCE_FPS = 30
+
+def generate_source(path, seconds):
+    """Create a synthetic 720p source (same as a typical SaveNow download)"""
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size=1280x720:rate={SOURCE_FPS}",
+        "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=44100",
+        "-t", str(seconds),
+        "-c:v", "libx264", "-preset", "ultrafast", "-crf", "18",
+        "-c:a", "aac", "-shortest", "-y", path
+    ]
+    subprocess.run(cmd, check=True)
+
+def measure_preset(source, preset, threads, seconds):
+    """Encode the source with the Reels profile and return frames/sec"""
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-filter_threads", str(max(1, threads // 2)),
+        "-i", source,
+        "-vf", ENCODER_PROFILE['video_filter'],
+        "-c:v", "libx264", "-preset", preset, "-crf", str(ENCODER_PROFILE['crf']),
+        "-threads", str(threads),
+        "-an", "-f", "null", "-"
+    ]
+    started = time.perf_counter()
+    subprocess.run(cmd, check=True)
+    elapsed = time.perf_counter() - started
+    return round(seconds * SOURCE_FPS / elapsed, 2)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure libx264 fps per preset on this host")
+    parser.add_argument('--seconds', type=int, default=10, help="synthetic source length")
+    parser.add_argument('--presets', default=','.join(X264_PRESETS), help="comma separated preset list")
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--output', default=ENCODER_CALIBRATION_FILE)
+    args = parser.parse_args()
+
+    presets = [p.strip() for p in args.presets.split(',') if p.strip()]
+
+    print("="*60)
+    print("🎛️ ENCODER CALIBRATION")
+    print("="*60)
+    print(f"Host: {platform.node()} ({platform.machine()}), threads: {args.threads}")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source = os.path.join(temp_dir, "calibration_source.mp4")
+        print(f"📥 Synthetic source oluşturuluyor ({args.seconds}s)...")
+        generate_source(source, args.seconds)
+
+        for preset in presets:
+            fps = measure_preset(source, preset, args.threads, args.seconds)
+            results[preset] = fps
+            print(f"✅ {preset:10s} {fps:8.2f} fps ({fps / SOURCE_FPS:.2f}x realtime)")
+
+    calibration = {
+        'host': platform.node(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'threads': args.threads,
+        'source_fps': SOURCE_FPS,
+        'profile': ENCODER_PROFILE['name'],
+        'measured_at': datetime.now().isoformat(),
+        'presets': results
+    }
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(calibration, f, ensure_ascii=False, indent=2)
+
+    print(f"\n💾 Kalibrasyon kaydedildi: {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""
+Gunicorn ayarları
+Prometheus metrikleri worker'lar arası PROMETHEUS_MULTIPROC_DIR üzerinden toplanır
+Her worker açılışta sahipsiz kalmış (çöken/restart edilen process'ten) job'ları devam ettirir
+"""
+import os
+import shutil
+import tempfile
+
+# Worker'lar fork edilmeden önce ayarlanmalı (app import edilirken okunur)
+PROMETHEUS_MULTIPROC_DIR = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'clip_api_metrics')
+)
+
+# App master'da bir kez import edilir, worker'lar fork ile paylaşır (worker başına import yok).
+# Thread'ler import'ta değil post_worker_init'te başlar, fork güvenli. GUNICORN_PRELOAD=0 ile kapatılır.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+# Önceki çalıştırmadan kalan metrik dosyalarını temizle - preload'da app on_starting'den önce
+# import edildiği için config yüklenirken yapılmalı. Master SIGHUP'ta config'i tekrar yükler
+# (USR2 ile başlayan yeni master da ortamı devralır); çalışan worker'ların metrikleri silinmesin
+# diye temizlik master zinciri başına bir kez yapılır.
+if not os.environ.get('CLIP_API_METRICS_MASTER'):
+    shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+    os.environ['CLIP_API_METRICS_MASTER'] = str(os.getpid())
+os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+def post_worker_init(worker):
+    # Worker fork edildikten sonra (preload'da modül master'dan gelir, thread'ler burada açılır)
+    from app import start_job_recovery
+    start_job_recovery()
+
+def child_exit(server, worker):
+    # Ölen worker'ın gauge değerleri toplama girmesin
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -7,6 +7,10 @@ import os
 import json
 import tempfile
 import shutil
+import subprocess
+import threading
+import time
+from datetime import datetime
 from pathlib import Path
 from unittest.mock import patch, MagicMock
 import sys
@@ -22,6 +26,15 @@ from app import (
     process_clips_async
 )
 
+# Testlerde reaper thread'i açılmasın - klasör yamaları arasında repo'daki jobs/ klasörünü tarayıp silebilir
+_reaper_start = patch('app.JOB_REAPER.start')
+
+def setUpModule():
+    _reaper_start.start()
+
+def tearDownModule():
+    _reaper_start.stop()
+
 class TestJobManagement(unittest.TestCase):
     """Test job file management functions"""
     
@@ -321,6 +334,2044 @@ class TestProcessClipsAsync(unittest.TestCase):
         self.assertEqual(len(final_job['errors']), 1)
         self.assertIn('exception', final_job['errors'][0]['error'].lower())
 
+class TestBatches(unittest.TestCase):
+    """Test bulk multi-video batch submission"""
+    
+    def setUp(self):
+        """Set up temporary jobs/batches folders and a test client"""
+        self.test_jobs_folder = tempfile.mkdtemp()
+        self.test_batches_folder = tempfile.mkdtemp()
+        
+        import app
+        self.original_jobs_folder = app.JOBS_FOLDER
+        self.original_batches_folder = app.BATCHES_FOLDER
+        app.JOBS_FOLDER = self.test_jobs_folder
+        app.BATCHES_FOLDER = self.test_batches_folder
+        self.client = app.app.test_client()
+    
+    def tearDown(self):
+        """Clean up"""
+        import app
+        app.JOBS_FOLDER = self.original_jobs_folder
+        app.BATCHES_FOLDER = self.original_batches_folder
+        shutil.rmtree(self.test_jobs_folder, ignore_errors=True)
+        shutil.rmtree(self.test_batches_folder, ignore_errors=True)
+    
+    def test_group_batch_entries_deduplicates(self):
+        """Duplicate videos are merged and duplicate clips dropped"""
+        from app import group_batch_entries
+        
+        grouped = group_batch_entries([
+            {'video_id': 'a', 'clips': [{'start': 0, 'end': 5}]},
+            {'video_id': 'b', 'clips': [{'start': 1, 'end': 2}]},
+            {'video_id': 'a', 'clips': [{'start': 0, 'end': 5}, {'start': 5, 'end': 10}]},
+            {'video_id': 'c', 'clips': []},
+        ])
+        
+        self.assertEqual(list(grouped.keys()), ['a', 'b'])
+        self.assertEqual(grouped['a'], [{'start': 0, 'end': 5}, {'start': 5, 'end': 10}])
+    
+    @patch('app.get_url_resolver')
+    def test_create_batch_and_check_status(self, mock_resolver):
+        """Batch creates one job per unique video and reports aggregate progress"""
+        mock_resolver.return_value = MagicMock()
+        
+        response = self.client.post('/api/batches', json={
+            'videos': [
+                {'video_id': 'a', 'clips': [{'start': 0, 'end': 5}]},
+                {'video_id': 'a', 'clips': [{'start': 5, 'end': 10}]},
+                {'video_id': 'b', 'clips': [{'start': 0, 'end': 5}]},
+            ]
+        })
+        data = response.get_json()
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['total_videos'], 2)
+        self.assertEqual(data['total_clips'], 3)
+        self.assertEqual(mock_resolver.return_value.submit.call_count, 2)
+        
+        # Bir job'u bitmiş gibi işaretle
+        job = get_job(data['jobs'][0]['job_id'])
+        job['status'] = 'finished'
+        job['processed'] = 2
+        save_job(job['job_id'], job)
+        
+        status = self.client.get(f"/api/batches/{data['batch_id']}").get_json()
+        self.assertEqual(status['status'], 'processing')
+        self.assertEqual(status['total'], 3)
+        self.assertEqual(status['processed'], 2)
+        self.assertEqual(len(status['jobs']), 2)
+    
+    def test_create_batch_requires_videos(self):
+        """Empty batches are rejected"""
+        response = self.client.post('/api/batches', json={'videos': []})
+        self.assertEqual(response.status_code, 400)
+    
+    @patch('app.get_url_resolver')
+    def test_create_batch_rejects_missing_ranges(self, mock_resolver):
+        """Clips without a valid start/end fail the whole batch up front"""
+        response = self.client.post('/api/batches', json={
+            'videos': [
+                {'video_id': 'a', 'clips': [{'start': 0, 'end': 5}, {'start': 3}]},
+                {'video_id': 'b', 'clips': [{'start': 'x', 'end': 5}]},
+            ]
+        })
+        data = response.get_json()
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([(item['video_id'], item['index']) for item in data['invalid_clips']], [('a', 1), ('b', 0)])
+        self.assertEqual(os.listdir(self.test_batches_folder), [])
+        mock_resolver.assert_not_called()
+
+class TestJobScheduler(unittest.TestCase):
+    """Test scheduler admission control and backpressure"""
+    
+    def setUp(self):
+        # Host geneli slot kilitleri çalışan başka process'lerle karışmasın
+        self.state_dir = tempfile.mkdtemp()
+        self.state_patch = patch('app.SCHEDULER_STATE_DIR', self.state_dir)
+        self.state_patch.start()
+    
+    def tearDown(self):
+        self.state_patch.stop()
+        shutil.rmtree(self.state_dir, ignore_errors=True)
+    
+    def test_queue_full_raises(self):
+        """Submissions beyond the queue limit are rejected with a retry hint"""
+        from app import JobScheduler, QueueFullError
+        
+        # Worker yok - job'lar kuyrukta bekler
+        scheduler = JobScheduler(0, 1, 1, 2)
+        scheduler.submit('job-1', lambda: None, ())
+        scheduler.submit('job-2', lambda: None, ())
+        
+        self.assertEqual(scheduler.queue_position('job-2'), 2)
+        self.assertIsNotNone(scheduler.check_capacity())
+        with self.assertRaises(QueueFullError) as ctx:
+            scheduler.submit('job-3', lambda: None, ())
+        self.assertGreaterEqual(ctx.exception.retry_after, 1)
+        
+        # Kabul edilmiş batch job'ları limiti aşabilir
+        scheduler.submit('job-3', lambda: None, (), force=True)
+        self.assertEqual(scheduler.stats()['queued'], 3)
+    
+    def test_disk_reserve_only_in_download_mode(self):
+        """Free temp space gates admission only while admitted jobs still have sources to download"""
+        from app import JobScheduler, MIN_FREE_TEMP_BYTES, ESTIMATED_SOURCE_BYTES
+        
+        scheduler = JobScheduler(4, 1, 4, 10)
+        scheduler._active['a'] = {'started_at': 0, 'priority': 'bulk'}
+        scheduler._awaiting_source.add('a')
+        free = MIN_FREE_TEMP_BYTES + ESTIMATED_SOURCE_BYTES
+        with patch.object(scheduler, '_temp_free_bytes', return_value=free):
+            with patch('app.USE_DOWNLOAD_MODE', False):
+                self.assertTrue(scheduler._can_admit())
+            with patch('app.USE_DOWNLOAD_MODE', True):
+                self.assertFalse(scheduler._can_admit())
+                scheduler.source_ready('a')
+                self.assertTrue(scheduler._can_admit())
+    
+    @unittest.skipIf(sys.platform == 'win32', 'flock gerekli')
+    def test_limits_are_shared_across_processes(self):
+        """CPU slots and the source disk reserve held by another worker process count against this one"""
+        from app import JobScheduler, MIN_FREE_TEMP_BYTES, ESTIMATED_SOURCE_BYTES
+        code = ("import sys, app\n"
+                "app.SCHEDULER_STATE_DIR = sys.argv[1]\n"
+                "scheduler = app.JobScheduler(1, 1, 1, 10)\n"
+                "scheduler._awaiting_source.add('other-job')\n"
+                "with scheduler.cpu_slot():\n"
+                "    print('encoding', flush=True)\n"
+                "    sys.stdin.read()\n")
+        env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+        other = subprocess.Popen([sys.executable, '-c', code, self.state_dir], env=env,
+                                 stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        scheduler = JobScheduler(1, 1, 1, 10)
+        acquired = threading.Event()
+        
+        def encode():
+            with scheduler.cpu_slot():
+                acquired.set()
+        
+        try:
+            self.assertEqual(other.stdout.readline().strip(), 'encoding')
+            self.assertEqual(scheduler.stats()['host_cpu_in_use'], 1)
+            with patch.object(scheduler, '_temp_free_bytes', return_value=MIN_FREE_TEMP_BYTES + ESTIMATED_SOURCE_BYTES), \
+                 patch('app.USE_DOWNLOAD_MODE', True):
+                self.assertFalse(scheduler._can_admit())  # diğer worker'ın indireceği kaynak için yer ayrıldı
+                worker = threading.Thread(target=encode)
+                worker.start()
+                self.assertFalse(acquired.wait(0.5))
+                other.stdin.close()  # diğer worker'ın encode'u bitti (process de çıkar)
+                self.assertTrue(acquired.wait(10))
+                worker.join(5)
+                other.wait(10)
+                self.assertTrue(scheduler._can_admit())  # ölen process'in rezervi sayılmaz
+        finally:
+            other.kill()
+            other.wait()
+    
+    def test_cpu_slots_limit_concurrency(self):
+        """No more encodes run at once than there are CPU slots"""
+        import threading
+        import time
+        from app import JobScheduler
+        
+        scheduler = JobScheduler(1, 2, 1, 10)
+        running = []
+        peak = []
+        lock = threading.Lock()
+        
+        def encode():
+            with scheduler.cpu_slot():
+                with lock:
+                    running.append(1)
+                    peak.append(len(running))
+                time.sleep(0.05)
+                with lock:
+                    running.pop()
+        
+        threads = [threading.Thread(target=encode) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        self.assertEqual(max(peak), 2)
+    
+    def test_fair_queue_interleaves_clients(self):
+        """A client with many queued jobs does not starve another client"""
+        from app import FairQueue
+        
+        queue = FairQueue()
+        for i in range(4):
+            queue.push(f"bulk-{i}", 'interactive', 'client-a')
+        queue.push('other', 'interactive', 'client-b')
+        
+        order = [queue.pop(queue.peek()) for _ in range(5)]
+        self.assertLess(order.index('other'), 2)
+    
+    def test_fair_queue_prunes_idle_clients(self):
+        """Finish tags behind the virtual time are dropped instead of kept per client forever"""
+        from app import FairQueue
+        
+        queue = FairQueue()
+        for i in range(50):
+            queue.push(f"job-{i}", 'interactive', f"client-{i}")
+            queue.pop(queue.peek())
+        self.assertLessEqual(len(queue._finish), 1)
+    
+    def test_explicit_interactive_is_capped(self):
+        """Large jobs cannot claim the interactive class"""
+        from app import resolve_priority, INTERACTIVE_MAX_CLIPS
+        
+        self.assertEqual(resolve_priority('interactive', INTERACTIVE_MAX_CLIPS), 'interactive')
+        self.assertEqual(resolve_priority('interactive', INTERACTIVE_MAX_CLIPS + 1), 'bulk')
+        self.assertEqual(resolve_priority(None, 1, default='bulk'), 'bulk')
+        self.assertIsNone(resolve_priority('urgent', 1))
+    
+    def test_fair_queue_prefers_interactive(self):
+        """Interactive work is served before bulk work"""
+        from app import FairQueue
+        
+        queue = FairQueue()
+        queue.push('bulk', 'bulk', 'client-a')
+        queue.push('interactive', 'interactive', 'client-b')
+        
+        self.assertEqual(queue.pop(queue.peek()), 'interactive')
+    
+    def test_bulk_cannot_use_reserved_workers(self):
+        """Bulk jobs leave the reserved worker free for interactive jobs"""
+        from app import JobScheduler
+        
+        scheduler = JobScheduler(2, 1, 1, 10, interactive_reserved=1)
+        scheduler._active['running'] = {'started_at': 0, 'priority': 'bulk'}
+        bulk = scheduler._queue.push(('bulk-2', None, ()), 'bulk', 'client-a')
+        interactive = scheduler._queue.push(('small', None, ()), 'interactive', 'client-b')
+        
+        self.assertFalse(scheduler._can_start(bulk))
+        self.assertTrue(scheduler._can_start(interactive))
+    
+    @patch('app.get_video_urls')
+    @patch('app.SCHEDULER')
+    def test_create_clips_returns_429_when_full(self, mock_scheduler, mock_get_urls):
+        """create-clips answers 429 with Retry-After before resolving URLs"""
+        import app
+        mock_scheduler.check_capacity.return_value = 30
+        
+        response = app.app.test_client().post('/api/create-clips', json={
+            'video_id': 'test-video',
+            'clips': [{'start': 0, 'end': 5}]
+        })
+        
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '30')
+        mock_get_urls.assert_not_called()
+    
+    @patch('app.resolve_source_urls')
+    @patch('app.get_url_resolver')
+    def test_create_clips_resolves_urls_in_background(self, mock_resolver, mock_resolve):
+        """create-clips and analyze return pending right away, URL resolution runs on the resolver pool"""
+        import app
+        test_jobs_folder = tempfile.mkdtemp()
+        try:
+            with patch.object(app, 'JOBS_FOLDER', test_jobs_folder), patch('app.SCHEDULER.check_capacity', return_value=None):
+                client = app.app.test_client()
+                clips = client.post('/api/create-clips', json={'video_id': 'v', 'clips': [{'start': 0, 'end': 5}]}).get_json()
+                analysis = client.post('/api/analyze', json={'video_id': 'v-new'}).get_json()
+                
+                self.assertEqual((clips['status'], analysis['status']), ('pending', 'pending'))
+                mock_resolve.assert_not_called()
+                self.assertEqual([call.args for call in mock_resolver.return_value.submit.call_args_list], [
+                    (app.resolve_and_schedule_job, clips['job_id'], 'v', [{'start': 0, 'end': 5}]),
+                    (app.resolve_and_schedule_job, analysis['job_id'], 'v-new', [])
+                ])
+                self.assertEqual(get_job(clips['job_id'])['status'], 'pending')
+                for job_id in (clips['job_id'], analysis['job_id']):
+                    app.JOB_HEARTBEAT.discard(job_id)
+        finally:
+            shutil.rmtree(test_jobs_folder, ignore_errors=True)
+
+class TestEncoderPlan(unittest.TestCase):
+    """Test libx264 tuning decisions"""
+    
+    def test_select_preset_without_calibration(self):
+        """Long clips fall back to a faster preset"""
+        from app import select_preset
+        
+        self.assertEqual(select_preset(30, 4), 'fast')
+        self.assertEqual(select_preset(600, 4), 'veryfast')
+    
+    def test_select_preset_with_calibration(self):
+        """The slowest preset that still meets the target speed is chosen"""
+        from app import select_preset
+        
+        calibration = {
+            'threads': 4,
+            'source_fps': 30,
+            'presets': {'ultrafast': 300, 'veryfast': 120, 'fast': 50, 'medium': 30}
+        }
+        # 4 thread: fast = 50/30 = 1.67x >= 1.5x hedef
+        self.assertEqual(select_preset(30, 4, calibration), 'fast')
+        # 1 thread: fast = 12.5/30 yetersiz, veryfast = 30/30 yetersiz, ultrafast yeterli
+        self.assertEqual(select_preset(30, 1, calibration), 'ultrafast')
+    
+    @patch('app.SCHEDULER')
+    def test_plan_splits_cores_between_encodes(self, mock_scheduler):
+        """Threads are divided by the CPU slot count, independent of how many encodes run right now"""
+        from app import plan_encoder, encoder_video_args
+        
+        mock_scheduler.cpu_slots = 4
+        
+        with patch('app.os.cpu_count', return_value=8), patch('app.load_encoder_calibration', return_value=None):
+            plans = []
+            for running in (1, 4):
+                mock_scheduler.cpu_in_use.return_value = running
+                plans.append(plan_encoder(20))
+        
+        self.assertEqual([plan['threads'] for plan in plans], [2, 2])
+        self.assertEqual(plans[0]['filter_threads'], 1)
+        args = encoder_video_args(plans[0])
+        self.assertEqual(args[args.index('-threads') + 1], '2')
+    
+    def test_timeout_follows_duration_and_speed(self):
+        """Long clips get more time than the old flat 300s, short clips much less"""
+        import app
+        from app import ffmpeg_timeout, expected_encode_speed, record_encode_speed
+        
+        self.assertGreater(ffmpeg_timeout(600, 0.5), 300)
+        self.assertEqual(ffmpeg_timeout(5, 2.0), app.FFMPEG_MIN_TIMEOUT)
+        self.assertEqual(ffmpeg_timeout(100000, 0.1), app.FFMPEG_MAX_TIMEOUT)
+        
+        calibration = {'threads': 4, 'source_fps': 30, 'presets': {'fast': 60}}
+        self.assertEqual(expected_encode_speed('fast', 4, calibration), 2.0)
+        with patch.dict(app._observed_speeds, clear=True):
+            record_encode_speed('fast', 4, 1.0)
+            self.assertEqual(expected_encode_speed('fast', 4, calibration), 1.0)
+
+class TestKeyframeSeek(unittest.TestCase):
+    """Test keyframe index and two-stage seek planning"""
+    
+    def setUp(self):
+        """Use a temporary keyframe cache"""
+        self.test_keyframes_folder = tempfile.mkdtemp()
+        import app
+        self.original_keyframes_folder = app.KEYFRAMES_FOLDER
+        app.KEYFRAMES_FOLDER = self.test_keyframes_folder
+    
+    def tearDown(self):
+        """Clean up"""
+        import app
+        app.KEYFRAMES_FOLDER = self.original_keyframes_folder
+        shutil.rmtree(self.test_keyframes_folder, ignore_errors=True)
+    
+    def test_plan_seek(self):
+        """Input seek lands on the preceding keyframe, output seek covers the rest"""
+        from app import plan_seek
+        
+        keyframes = [0.0, 2.0, 4.0, 6.0]
+        self.assertEqual(plan_seek(5.5, keyframes), (4.0, 1.5))
+        self.assertEqual(plan_seek(4, keyframes), (4.0, None))
+        self.assertEqual(plan_seek(7.25, None), (7.25, None))
+    
+    @patch('app.run_probe')
+    def test_keyframe_index_is_built_once(self, mock_run):
+        """ffprobe runs once per video, later calls use the cache"""
+        from app import get_keyframe_index
+        
+        mock_run.return_value = MagicMock(returncode=0, stdout="0.000000,K__\n0.033333,___\n2.000000,K__\nN/A,K__\n", stderr="")
+        
+        self.assertEqual(get_keyframe_index('vid', '/tmp/source.mp4'), [0.0, 2.0])
+        self.assertEqual(get_keyframe_index('vid', '/tmp/source.mp4'), [0.0, 2.0])
+        self.assertEqual(mock_run.call_count, 1)
+    
+    @patch('app.run_probe')
+    def test_keyframe_index_not_built_when_disabled(self, mock_run):
+        """URL sources with a single clip skip the full-file index scan"""
+        from app import get_keyframe_index
+        
+        self.assertIsNone(get_keyframe_index('vid', 'http://video.url', build=False))
+        mock_run.assert_not_called()
+    
+    @patch('app.run_probe')
+    def test_url_probes_send_source_headers(self, mock_run):
+        """ffprobe gets the same User-Agent/Referer as the cut commands, indexes are cached per source kind"""
+        import app
+        
+        mock_run.return_value = MagicMock(returncode=0, stdout="0.000000,K__\n", stderr="")
+        app.get_keyframe_index('vid', 'https://video.url/videoplayback')
+        app.build_keyframe_index('/tmp/source.mp4')
+        
+        url_cmd, local_cmd = (call.args[0] for call in mock_run.call_args_list)
+        self.assertEqual(url_cmd[url_cmd.index('-user_agent') + 1], app.SOURCE_USER_AGENT)
+        self.assertEqual(url_cmd[url_cmd.index('-referer') + 1], app.SOURCE_REFERER)
+        self.assertNotIn('-user_agent', local_cmd)
+        self.assertEqual(os.listdir(self.test_keyframes_folder), ['vid.url.json'])
+    
+    def test_supervisor_captures_probe_output(self):
+        """Probes run through the supervisor and still return their stdout"""
+        from app import run_probe
+        
+        result = run_probe([sys.executable, '-c', 'print("x" * 100000)'], timeout=30)
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.stdout.strip(), 'x' * 100000)
+
+class TestSourceProbe(unittest.TestCase):
+    """Test ffprobe metadata summary and clip range validation"""
+    
+    @patch('app.run_probe')
+    def test_url_probe_sends_source_headers(self, mock_run):
+        """The URL probe uses the cut commands' User-Agent/Referer and the supervised runner"""
+        import app
+        
+        mock_run.return_value = MagicMock(returncode=0, stdout='{"format": {"duration": "10"}}', stderr='')
+        probe = app.probe_source('https://video.url/videoplayback')
+        
+        cmd, timeout = mock_run.call_args.args
+        self.assertEqual(cmd[cmd.index('-referer') + 1], app.SOURCE_REFERER)
+        self.assertLess(cmd.index('-user_agent'), cmd.index('https://video.url/videoplayback'))
+        self.assertEqual(timeout, app.PROBE_TIMEOUT)
+        self.assertEqual(probe['duration'], 10.0)
+    
+    def test_summarize_probe(self):
+        """Duration, streams and GOP length are extracted from ffprobe JSON"""
+        from app import summarize_probe
+        
+        probe = summarize_probe({
+            'format': {'duration': '120.5', 'bit_rate': '1500000', 'format_name': 'mov,mp4,m4a,3gp,3g2,mj2'},
+            'streams': [
+                {'index': 0, 'codec_type': 'video', 'codec_name': 'h264', 'width': 1280, 'height': 720, 'avg_frame_rate': '30000/1001'},
+                {'index': 1, 'codec_type': 'audio', 'codec_name': 'aac', 'sample_rate': '44100', 'channels': 2}
+            ],
+            'packets': [
+                {'stream_index': 0, 'pts_time': '0.000000', 'flags': 'K__'},
+                {'stream_index': 1, 'pts_time': '0.500000', 'flags': 'K__'},
+                {'stream_index': 0, 'pts_time': '0.033367', 'flags': '___'},
+                {'stream_index': 0, 'pts_time': '4.004000', 'flags': 'K__'},
+                {'stream_index': 0, 'pts_time': '8.008000', 'flags': 'K__'}
+            ]
+        })
+        
+        self.assertEqual(probe['duration'], 120.5)
+        self.assertEqual(probe['video']['width'], 1280)
+        self.assertEqual(probe['video']['fps'], 29.97)
+        self.assertEqual(probe['audio']['sample_rate'], 44100)
+        self.assertEqual(probe['keyframe_interval'], 4.004)
+    
+    def test_validate_clip_range(self):
+        """Impossible ranges are rejected with or without a probe"""
+        from app import validate_clip_range
+        
+        probe = {'duration': 60.0}
+        self.assertIsNone(validate_clip_range(0, 10, probe))
+        self.assertIsNone(validate_clip_range(50, 60.3, probe))
+        self.assertIsNotNone(validate_clip_range(10, 10, None))
+        self.assertIsNotNone(validate_clip_range(-1, 10, None))
+        self.assertIsNotNone(validate_clip_range(65, 70, probe))
+        self.assertIsNotNone(validate_clip_range(50, 90, probe))
+        self.assertIsNotNone(validate_clip_range('a', 10, probe))
+    
+    @patch('app.get_keyframe_index', return_value=None)
+    @patch('app.get_source_probe', return_value={'duration': 30.0, 'video': {'width': 1280, 'height': 720}})
+    @patch('app.cut_clip_from_url')
+    def test_out_of_range_clips_are_not_encoded(self, mock_cut_clip, mock_probe, mock_keyframes):
+        """Clips past the source duration fail without running ffmpeg"""
+        import app
+        test_jobs_folder = tempfile.mkdtemp()
+        original_jobs_folder = app.JOBS_FOLDER
+        app.JOBS_FOLDER = test_jobs_folder
+        try:
+            mock_cut_clip.return_value = {'success': True, 'filename': 'v-0-10.mp4', 'video_info': {}}
+            save_job('probe-job', {'job_id': 'probe-job', 'video_id': 'v', 'status': 'pending', 'total': 2, 'processed': 0})
+            
+            process_clips_async('probe-job', 'v', [{'start': 0, 'end': 10}, {'start': 40, 'end': 50}],
+                                'http://video.url', 'http://audio.url', 'Test Video', '720p')
+            
+            job = get_job('probe-job')
+            self.assertEqual(mock_cut_clip.call_count, 1)
+            self.assertEqual(job['processed'], 2)
+            self.assertEqual(len(job['errors']), 1)
+            self.assertEqual(mock_cut_clip.call_args[0][6], '1280x720')
+        finally:
+            app.JOBS_FOLDER = original_jobs_folder
+            shutil.rmtree(test_jobs_folder, ignore_errors=True)
+    
+    def test_cutters_report_the_same_resolution(self):
+        """URL and local-file cuts report the output size as resolution and the probed source size separately"""
+        import app
+        test_clips_folder = tempfile.mkdtemp()
+        
+        def encode(cmd, *args, **kwargs):
+            with open(cmd[cmd.index('-y') + 1], 'wb') as f:
+                f.write(b'x' * 1024)
+            return subprocess.CompletedProcess(cmd, 0, '', '')
+        
+        try:
+            with patch.object(app, 'CLIPS_FOLDER', test_clips_folder), patch('app.USE_DOWNLOAD_MODE', False), \
+                 patch('app.run_ffmpeg', side_effect=encode):
+                from_url = app.cut_clip_from_url('http://video.url', 'http://audio.url', 'v', 0, 5, 'Test', '1280x720')
+                from_file = app.cut_clip_from_local_file('source.mp4', 'v', 5, 10, 'Test', '1280x720')
+                cached = app.cut_clip_from_local_file('source.mp4', 'v', 0, 5, 'Test', '1280x720')
+            
+            for result in (from_url, from_file, cached):
+                self.assertEqual(result['video_info']['resolution'], app.REELS_RESOLUTION)
+                self.assertEqual(result['video_info']['source_resolution'], '1280x720')
+        finally:
+            shutil.rmtree(test_clips_folder, ignore_errors=True)
+
+class TestTiming(unittest.TestCase):
+    """Test per-job span recording"""
+    
+    def test_span_recorder_totals(self):
+        """Spans are aggregated per name and survive a round-trip through the job record"""
+        from app import SpanRecorder
+        
+        recorder = SpanRecorder()
+        recorder.add('clip.ffmpeg', time.time(), 0.5, {'index': 0})
+        recorder.add('clip.ffmpeg', time.time(), 0.25, {'index': 1})
+        
+        restored = SpanRecorder(recorder.summary())
+        restored.add('job.save', time.time(), 0.01)
+        summary = restored.summary()
+        
+        self.assertEqual(len(summary['spans']), 3)
+        self.assertEqual(summary['spans'][1]['index'], 1)
+        self.assertEqual(summary['totals']['clip.ffmpeg'], {'count': 2, 'total_ms': 750.0})
+    
+    def test_timed_records_into_thread_recorder(self):
+        """timed() writes to the active recorder and the process-wide stats"""
+        from app import SpanRecorder, set_timing_recorder, timed, timing_stats
+        
+        recorder = SpanRecorder()
+        previous = set_timing_recorder(recorder)
+        try:
+            with timed('test.block', attempt=1) as span:
+                span['bytes'] = 42
+        finally:
+            set_timing_recorder(previous)
+        
+        span = recorder.summary()['spans'][0]
+        self.assertEqual(span['name'], 'test.block')
+        self.assertEqual(span['attempt'], 1)
+        self.assertEqual(span['bytes'], 42)
+        self.assertGreaterEqual(timing_stats()['test.block']['count'], 1)
+    
+    @patch('app.get_keyframe_index', return_value=None)
+    @patch('app.get_source_probe', return_value=None)
+    @patch('app.cut_clip_from_url')
+    def test_job_record_has_timings(self, mock_cut_clip, mock_probe, mock_keyframes):
+        """Finished jobs carry queue wait, per-clip cut and total spans"""
+        import app
+        test_jobs_folder = tempfile.mkdtemp()
+        original_jobs_folder = app.JOBS_FOLDER
+        app.JOBS_FOLDER = test_jobs_folder
+        try:
+            mock_cut_clip.return_value = {'success': True, 'filename': 'v-0-10.mp4', 'video_info': {}}
+            save_job('timing-job', {'job_id': 'timing-job', 'video_id': 'v', 'status': 'pending',
+                                    'created_at': datetime.now().isoformat(), 'total': 2, 'processed': 0,
+                                    'timings': {'spans': [], 'totals': {'request.resolve_urls': {'count': 1, 'total_ms': 12.0}}}})
+            
+            process_clips_async('timing-job', 'v', [{'start': 0, 'end': 10}, {'start': 10, 'end': 20}],
+                                'http://video.url', 'http://audio.url', 'Test Video', '720p')
+            
+            totals = get_job('timing-job')['timings']['totals']
+            self.assertEqual(totals['request.resolve_urls']['count'], 1)
+            self.assertEqual(totals['job.queue_wait']['count'], 1)
+            self.assertEqual(totals['clip.cut']['count'], 2)
+            self.assertEqual(totals['clip.cpu_wait']['count'], 2)
+            self.assertEqual(totals['job.total']['count'], 1)
+        finally:
+            app.JOBS_FOLDER = original_jobs_folder
+            shutil.rmtree(test_jobs_folder, ignore_errors=True)
+
+class TestMetrics(unittest.TestCase):
+    """Test Prometheus metrics export"""
+    
+    def test_metrics_endpoint(self):
+        """/metrics serves the Prometheus text format with scheduler gauges"""
+        import app
+        response = app.app.test_client().get('/metrics')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('text/plain', response.content_type)
+        body = response.get_data(as_text=True)
+        self.assertIn('clip_api_queue_depth', body)
+        self.assertIn('clip_api_stage_duration_seconds', body)
+    
+    def test_spans_feed_stage_histogram(self):
+        """Every timing span is observed in the stage histogram"""
+        from prometheus_client import REGISTRY
+        from app import record_span
+        
+        labels = {'stage': 'test.metrics'}
+        before = REGISTRY.get_sample_value('clip_api_stage_duration_seconds_count', labels) or 0
+        record_span('test.metrics', time.time(), 0.2)
+        
+        self.assertEqual(REGISTRY.get_sample_value('clip_api_stage_duration_seconds_count', labels), before + 1)
+    
+    @patch('app.get_video_urls', return_value={'success': False, 'error': 'offline'})
+    @patch('app.get_keyframe_index', return_value=None)
+    @patch('app.get_source_probe', return_value=None)
+    @patch('app.cut_clip_from_url')
+    def test_clip_errors_by_class(self, mock_cut_clip, mock_probe, mock_keyframes, mock_get_urls):
+        """Failed clips are counted under the error class returned by the cut"""
+        import app
+        from prometheus_client import REGISTRY
+        test_jobs_folder = tempfile.mkdtemp()
+        original_jobs_folder = app.JOBS_FOLDER
+        app.JOBS_FOLDER = test_jobs_folder
+        try:
+            labels = {'error_class': 'http_403'}
+            before = REGISTRY.get_sample_value('clip_api_clip_errors_total', labels) or 0
+            mock_cut_clip.return_value = {'success': False, 'error': '403', 'error_class': 'http_403'}
+            save_job('metrics-job', {'job_id': 'metrics-job', 'video_id': 'v', 'status': 'pending', 'total': 1, 'processed': 0})
+            
+            process_clips_async('metrics-job', 'v', [{'start': 0, 'end': 10}],
+                                'http://video.url', 'http://audio.url', 'Test Video', '720p')
+            
+            self.assertEqual(REGISTRY.get_sample_value('clip_api_clip_errors_total', labels), before + 1)
+        finally:
+            app.JOBS_FOLDER = original_jobs_folder
+            shutil.rmtree(test_jobs_folder, ignore_errors=True)
+
+class TestSaveNowProvider(unittest.TestCase):
+    """Test SaveNow provider configuration"""
+    
+    @patch('app.requests.get')
+    def test_api_base_is_configurable(self, mock_get):
+        """Requests go to SAVENOW_API_BASE (used by the offline benchmark stub)"""
+        import app
+        mock_get.return_value = MagicMock(status_code=503)
+        
+        with patch('app.SAVENOW_API_BASE', 'http://127.0.0.1:8099'):
+            result, error = app.get_video_urls_from_savenow('abc123')
+        
+        self.assertIsNone(result)
+        self.assertIn('503', error)
+        self.assertTrue(mock_get.call_args[0][0].startswith('http://127.0.0.1:8099/ajax/download.php?'))
+
+class TestFFmpegProgress(unittest.TestCase):
+    """Test streamed ffmpeg -progress parsing and job progress updates"""
+    
+    def test_parse_progress_report(self):
+        """out_time/speed/fps are parsed and converted to a clip fraction"""
+        from app import parse_progress_report
+        
+        report = parse_progress_report({'out_time_us': '5000000', 'speed': '2.5x', 'fps': '75.0', 'progress': 'continue'}, 20)
+        self.assertEqual(report['out_time'], 5.0)
+        self.assertEqual(report['speed'], 2.5)
+        self.assertEqual(report['fraction'], 0.25)
+        self.assertEqual(report['remaining'], 15.0)
+        
+        report = parse_progress_report({'out_time': '00:00:10.500000', 'speed': 'N/A', 'progress': 'end'}, 20)
+        self.assertEqual(report['out_time'], 10.5)
+        self.assertIsNone(report['speed'])
+        self.assertEqual(report['fraction'], 1)
+        self.assertIsNone(parse_progress_report({'out_time_us': 'N/A', 'out_time': 'N/A'}, 20))
+    
+    def test_supervisor_streams_progress(self):
+        """Progress blocks are reported as they arrive and only the stderr tail is kept"""
+        from app import FFMPEG_SUPERVISOR, FFMPEG_STDERR_LINES
+        script = (
+            "import sys\n"
+            "for i in range(%d): sys.stderr.write('line %%d\\n' %% i)\n"
+            "print('out_time_us=1000000'); print('speed=1x'); print('progress=continue')\n"
+            "print('out_time_us=2000000'); print('speed=1x'); print('progress=end')\n"
+        ) % (FFMPEG_STDERR_LINES + 50)
+        
+        reports = []
+        result = FFMPEG_SUPERVISOR.run([sys.executable, '-c', script], 2, reports.append, timeout=30)
+        
+        self.assertEqual([report['fraction'] for report in reports], [0.5, 1])
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(len(result.stderr.splitlines()), FFMPEG_STDERR_LINES)
+        self.assertTrue(result.stderr.startswith('line 50\n'))
+    
+    def test_supervisor_timeout_kills_process(self):
+        """A process past its timeout is killed and TimeoutExpired is raised"""
+        import subprocess
+        from app import FFMPEG_SUPERVISOR
+        
+        started = time.time()
+        with self.assertRaises(subprocess.TimeoutExpired):
+            FFMPEG_SUPERVISOR.run([sys.executable, '-c', 'import time; time.sleep(30)'], timeout=0.5)
+        self.assertLess(time.time() - started, 10)
+    
+    def test_supervisor_kills_stalled_process(self):
+        """A process whose out_time stops advancing is killed before its timeout"""
+        from app import FFMPEG_SUPERVISOR, FFmpegStalledError
+        script = "import time; print('out_time_us=1000000'); print('progress=continue', flush=True); time.sleep(30)"
+        
+        started = time.time()
+        with self.assertRaises(FFmpegStalledError):
+            FFMPEG_SUPERVISOR.run([sys.executable, '-c', script], 10, timeout=60, stall_timeout=1)
+        self.assertLess(time.time() - started, 10)
+    
+    def test_clip_progress_updates_job(self):
+        """Fractional job progress and ETA are written, saves are throttled"""
+        import app
+        test_jobs_folder = tempfile.mkdtemp()
+        original_jobs_folder = app.JOBS_FOLDER
+        app.JOBS_FOLDER = test_jobs_folder
+        try:
+            save_job('progress-job', {'job_id': 'progress-job', 'status': 'processing', 'total': 2, 'processed': 1})
+            progress = app.ClipProgress('progress-job', 1, remaining_after=0)
+            
+            progress({'out_time': 5.0, 'speed': 2.0, 'fps': 60.0, 'fraction': 0.5, 'remaining': 5.0})
+            progress({'out_time': 6.0, 'speed': 2.0, 'fps': 60.0, 'fraction': 0.6, 'remaining': 4.0})
+            
+            job = get_job('progress-job')
+            self.assertEqual(job['progress'], 75.0)
+            self.assertEqual(job['current_clip']['index'], 1)
+            self.assertEqual(job['eta_seconds'], 2.5)
+        finally:
+            app.JOBS_FOLDER = original_jobs_folder
+            shutil.rmtree(test_jobs_folder, ignore_errors=True)
+
+class TestJobCancellation(unittest.TestCase):
+    """Test DELETE /api/jobs/<job_id> cancellation"""
+    
+    def setUp(self):
+        import app
+        self.app = app
+        self.test_jobs_folder = tempfile.mkdtemp()
+        self.original_jobs_folder = app.JOBS_FOLDER
+        app.JOBS_FOLDER = self.test_jobs_folder
+    
+    def tearDown(self):
+        self.app.JOBS_FOLDER = self.original_jobs_folder
+        shutil.rmtree(self.test_jobs_folder, ignore_errors=True)
+    
+    def test_cancel_removes_queued_job(self):
+        """A queued job is dropped from the scheduler queue"""
+        from app import JobScheduler
+        scheduler = JobScheduler(max_workers=0, cpu_slots=1, max_downloads=1, max_queue_size=5)
+        scheduler.submit('queued-job', lambda: None, ())
+        
+        self.assertTrue(scheduler.cancel('queued-job'))
+        self.assertFalse(scheduler.cancel('queued-job'))
+        self.assertEqual(scheduler.stats()['queued'], 0)
+    
+    def test_cancel_kills_running_process(self):
+        """Running processes of the job are killed right away"""
+        from app import FFMPEG_SUPERVISOR, JobCancelledError
+        outcome = {}
+        
+        def run():
+            try:
+                FFMPEG_SUPERVISOR.run([sys.executable, '-c', 'import time; time.sleep(30)'], timeout=60, job_id='running-job')
+            except JobCancelledError:
+                outcome['cancelled'] = True
+        
+        worker = threading.Thread(target=run)
+        worker.start()
+        time.sleep(0.5)
+        started = time.time()
+        self.app.cancel_job('running-job')
+        worker.join(timeout=10)
+        
+        self.assertTrue(outcome.get('cancelled'))
+        self.assertLess(time.time() - started, 5)
+        self.assertTrue(self.app.is_job_cancelled('running-job'))
+    
+    def test_delete_endpoint(self):
+        """Active jobs are cancelled, finished jobs are deleted"""
+        client = self.app.app.test_client()
+        save_job('active-job', {'job_id': 'active-job', 'video_id': 'v', 'status': 'processing',
+                                'created_at': '2024-01-01T00:00:00', 'total': 1, 'processed': 0})
+        save_job('done-job', {'job_id': 'done-job', 'video_id': 'v', 'status': 'finished',
+                              'created_at': '2024-01-01T00:00:00', 'total': 1, 'processed': 1})
+        
+        response = client.delete('/api/jobs/active-job')
+        self.assertEqual(response.get_json()['status'], 'cancelled')
+        self.assertEqual(get_job('active-job')['status'], 'cancelled')
+        self.assertTrue(self.app.is_job_cancelled('active-job'))
+        
+        response = client.delete('/api/jobs/done-job')
+        self.assertTrue(response.get_json()['success'])
+        self.assertIsNone(get_job('done-job'))
+        self.assertEqual(client.delete('/api/jobs/missing-job').status_code, 404)
+
+class TestJobRecovery(unittest.TestCase):
+    """Test per-clip state and resuming orphaned jobs after a restart"""
+    
+    def setUp(self):
+        import app
+        self.app = app
+        self.test_jobs_folder = tempfile.mkdtemp()
+        self.test_clips_folder = tempfile.mkdtemp()
+        self.original_jobs_folder = app.JOBS_FOLDER
+        self.original_clips_folder = app.CLIPS_FOLDER
+        app.JOBS_FOLDER = self.test_jobs_folder
+        app.CLIPS_FOLDER = self.test_clips_folder
+    
+    def tearDown(self):
+        self.app.JOBS_FOLDER = self.original_jobs_folder
+        self.app.CLIPS_FOLDER = self.original_clips_folder
+        shutil.rmtree(self.test_jobs_folder, ignore_errors=True)
+        shutil.rmtree(self.test_clips_folder, ignore_errors=True)
+    
+    def make_job(self, job_id, status, clip_states, **extra):
+        job = {'job_id': job_id, 'video_id': 'v', 'status': status, 'created_at': datetime.now().isoformat(),
+               'total': len(clip_states), 'processed': 0, 'clip_states': clip_states}
+        job.update(extra)
+        save_job(job_id, job)
+        return job
+    
+    @patch('app.get_keyframe_index', return_value=None)
+    @patch('app.get_source_probe', return_value=None)
+    @patch('app.cut_clip_from_url')
+    def test_resume_skips_finished_clips(self, mock_cut_clip, mock_probe, mock_keyframes):
+        """Done clips are reused, the interrupted clip is redone without touching the shared output"""
+        done_result = {'start': 0, 'end': 10, 'filename': 'v-0-10_reels.mp4'}
+        for filename in ('v-0-10_reels.mp4', 'v-10-20_reels.mp4'):
+            with open(os.path.join(self.test_clips_folder, filename), 'wb') as f:
+                f.write(b'x' * 2048)
+        self.make_job('resume-job', 'processing', [
+            {'index': 0, 'start': 0, 'end': 10, 'state': 'done', 'output': 'v-0-10_reels.mp4', 'result': done_result},
+            {'index': 1, 'start': 10, 'end': 20, 'state': 'running', 'output': 'v-10-20_reels.mp4'},
+            {'index': 2, 'start': 20, 'end': 30, 'state': 'pending'}
+        ])
+        
+        def side_effect(video_url, audio_url, video_id, start, end, *args, **kwargs):
+            # Son yoldaki dosya yarım değil (encode'lar geçici adla yazılır), başka job'un kesiti silinmemeli
+            self.assertTrue(os.path.exists(os.path.join(self.test_clips_folder, 'v-10-20_reels.mp4')))
+            return {'success': True, 'filename': f"v-{start}-{end}_reels.mp4", 'video_info': {}}
+        mock_cut_clip.side_effect = side_effect
+        
+        process_clips_async('resume-job', 'v', [{'start': 0, 'end': 10}, {'start': 10, 'end': 20}, {'start': 20, 'end': 30}],
+                            'http://video.url', 'http://audio.url', 'Test Video', '720p')
+        
+        self.assertEqual([call.args[3] for call in mock_cut_clip.call_args_list], [10, 20])
+        job = get_job('resume-job')
+        self.assertEqual(job['status'], 'finished')
+        self.assertEqual(job['processed'], 3)
+        self.assertEqual(len(job['results']), 3)
+        self.assertEqual([clip_state['state'] for clip_state in job['clip_states']], ['done', 'done', 'done'])
+        self.assertEqual(job['clip_states'][2]['output'], 'v-20-30_reels.mp4')
+    
+    def test_encode_is_published_only_when_finished(self):
+        """Clips are encoded under a temporary name and renamed into place on success"""
+        output = os.path.join(self.test_clips_folder, 'v-0-10_reels.mp4')
+        
+        def encode(cmd, *args, **kwargs):
+            encode_path = cmd[cmd.index('-y') + 1]
+            self.assertNotEqual(encode_path, output)
+            self.assertFalse(os.path.exists(output))
+            with open(encode_path, 'wb') as f:
+                f.write(b'x' * 2048)
+            if encode.crash:
+                raise RuntimeError('worker öldü')
+            return subprocess.CompletedProcess(cmd, 0, '', '')
+        
+        with patch('app.run_ffmpeg', side_effect=encode):
+            encode.crash = True
+            self.assertFalse(self.app.cut_clip_from_local_file('source.mp4', 'v', 0, 10, 'Test', '720p')['success'])
+            self.assertFalse(os.path.exists(output))
+            encode.crash = False
+            self.assertTrue(self.app.cut_clip_from_local_file('source.mp4', 'v', 0, 10, 'Test', '720p')['success'])
+        
+        self.assertEqual(os.path.getsize(output), 2048)
+        self.assertEqual(os.listdir(os.path.join(self.test_clips_folder, '.partial')), [])
+    
+    def test_resume_clears_unfinished_hls_only(self):
+        """An interrupted HLS encode is reset on resume, a closed playlist is kept"""
+        for name, closed in (('v-0-10_reels_hls', False), ('v-10-20_reels_hls', True)):
+            os.makedirs(os.path.join(self.test_clips_folder, name))
+            with open(os.path.join(self.test_clips_folder, name, 'index.m3u8'), 'w') as f:
+                f.write('#EXTM3U\n#EXTINF:4.000000,\nseg_00000.m4s\n' + ('#EXT-X-ENDLIST\n' if closed else ''))
+        self.make_job('hls-job', 'processing', [
+            {'index': 0, 'start': 0, 'end': 10, 'state': 'running', 'output': 'v-0-10_reels_hls/index.m3u8'},
+            {'index': 1, 'start': 10, 'end': 20, 'state': 'running', 'output': 'v-10-20_reels_hls/index.m3u8'}
+        ], output='hls')
+        
+        with patch('app.cut_clip_from_url', return_value={'success': False, 'error': 'x'}), \
+             patch('app.get_source_probe', return_value=None), patch('app.get_keyframe_index', return_value=None):
+            process_clips_async('hls-job', 'v', [{'start': 0, 'end': 10}, {'start': 10, 'end': 20}],
+                                'http://video.url', 'http://audio.url', 'Test Video', '720p')
+        
+        self.assertFalse(os.path.exists(os.path.join(self.test_clips_folder, 'v-0-10_reels_hls')))
+        self.assertTrue(os.path.exists(os.path.join(self.test_clips_folder, 'v-10-20_reels_hls', 'index.m3u8')))
+    
+    @patch('app.get_url_resolver')
+    def test_recover_orphaned_job(self, mock_resolver):
+        """Jobs with a stale heartbeat are resumed once, live ones are left alone"""
+        clip_states = [{'index': 0, 'start': 0, 'end': 10, 'state': 'done'},
+                       {'index': 1, 'start': 10, 'end': 20, 'state': 'pending'}]
+        self.make_job('orphan-job', 'processing', clip_states)
+        self.make_job('live-job', 'processing', clip_states)
+        self.make_job('old-finished-job', 'finished', clip_states)
+        stale = time.time() - self.app.JOB_STALE_SECONDS - 10
+        for job_id in ('orphan-job', 'old-finished-job'):
+            os.utime(os.path.join(self.test_jobs_folder, f"{job_id}.json"), (stale, stale))
+        
+        try:
+            self.assertEqual(self.app.recover_jobs(), ['orphan-job'])
+            # Devam ettirilen job'un heartbeat'i taze, tekrar alınmaz
+            self.assertEqual(self.app.recover_jobs(), [])
+        finally:
+            self.app.JOB_HEARTBEAT.discard('orphan-job')
+        
+        args = mock_resolver.return_value.submit.call_args.args
+        self.assertEqual(args[0], self.app.resolve_and_schedule_job)
+        self.assertEqual(args[1:], ('orphan-job', 'v', [{'start': 0, 'end': 10}, {'start': 10, 'end': 20}]))
+        job = get_job('orphan-job')
+        self.assertEqual(job['status'], 'pending')
+        self.assertEqual(job['recoveries'], 1)
+        self.assertFalse(os.path.exists(os.path.join(self.test_jobs_folder, 'orphan-job.recover')))
+    
+    @patch('app.get_url_resolver')
+    def test_recovery_limit(self, mock_resolver):
+        """A job that keeps dying is failed instead of resumed forever"""
+        job = self.make_job('crashy-job', 'processing', [{'index': 0, 'start': 0, 'end': 10, 'state': 'pending'}],
+                            recoveries=self.app.MAX_JOB_RECOVERIES)
+        
+        self.assertFalse(self.app.resume_job('crashy-job', job))
+        self.assertEqual(get_job('crashy-job')['status'], 'failed')
+        mock_resolver.return_value.submit.assert_not_called()
+
+class TestClipRetry(unittest.TestCase):
+    """Test error-class-aware clip retries"""
+    
+    def setUp(self):
+        import app
+        self.app = app
+        self.test_jobs_folder = tempfile.mkdtemp()
+        self.original_jobs_folder = app.JOBS_FOLDER
+        self.original_backoff = app.CLIP_RETRY_BACKOFF
+        app.JOBS_FOLDER = self.test_jobs_folder
+        app.CLIP_RETRY_BACKOFF = 0
+    
+    def tearDown(self):
+        self.app.JOBS_FOLDER = self.original_jobs_folder
+        self.app.CLIP_RETRY_BACKOFF = self.original_backoff
+        shutil.rmtree(self.test_jobs_folder, ignore_errors=True)
+    
+    def run_job(self, job_id):
+        save_job(job_id, {'job_id': job_id, 'video_id': 'v', 'status': 'pending', 'total': 1, 'processed': 0})
+        process_clips_async(job_id, 'v', [{'start': 0, 'end': 10}],
+                            'http://old.video.url', 'http://old.audio.url', 'Test Video', '720p')
+        return get_job(job_id)
+    
+    def test_classify_ffmpeg_error(self):
+        """FFmpeg stderr is mapped to the retry policy classes"""
+        from app import classify_ffmpeg_error
+        self.assertEqual(classify_ffmpeg_error("Server returned 403 Forbidden (access denied)")[0], 'http_403')
+        self.assertEqual(classify_ffmpeg_error("Connection refused")[0], 'connection')
+        self.assertEqual(classify_ffmpeg_error("Connection timed out")[0], 'timeout')
+        self.assertEqual(classify_ffmpeg_error("Unknown encoder 'libfoo'", 1)[0], 'ffmpeg')
+        self.assertIsNone(self.app.clip_retry_action('ffmpeg', 0))
+        self.assertIsNone(self.app.clip_retry_action('connection', self.app.MAX_CLIP_RETRIES))
+    
+    @patch('app.get_keyframe_index', return_value=None)
+    @patch('app.get_source_probe', return_value=None)
+    @patch('app.cut_clip_from_url')
+    def test_transient_error_is_retried(self, mock_cut_clip, mock_probe, mock_keyframes):
+        """Network errors are retried and the clip succeeds"""
+        mock_cut_clip.side_effect = [
+            {'success': False, 'error': 'refused', 'error_class': 'connection'},
+            {'success': True, 'filename': 'v-0-10_reels.mp4', 'video_info': {}}
+        ]
+        
+        job = self.run_job('retry-job')
+        
+        self.assertEqual(mock_cut_clip.call_count, 2)
+        self.assertEqual(len(job['results']), 1)
+        self.assertEqual(job['clip_states'][0]['attempts'], 2)
+    
+    @patch('app.get_video_urls', return_value={'success': True, 'video_url': 'http://new.video.url',
+                                               'audio_url': 'http://new.audio.url'})
+    @patch('app.get_keyframe_index', return_value=None)
+    @patch('app.get_source_probe', return_value=None)
+    @patch('app.cut_clip_from_url')
+    def test_forbidden_refreshes_urls(self, mock_cut_clip, mock_probe, mock_keyframes, mock_get_urls):
+        """A 403 re-resolves the signed URLs before retrying"""
+        mock_cut_clip.side_effect = [
+            {'success': False, 'error': '403', 'error_class': 'http_403'},
+            {'success': True, 'filename': 'v-0-10_reels.mp4', 'video_info': {}}
+        ]
+        
+        job = self.run_job('refresh-job')
+        
+        mock_get_urls.assert_called_once_with('v')
+        self.assertEqual(mock_cut_clip.call_args_list[1].args[:2], ('http://new.video.url', 'http://new.audio.url'))
+        self.assertEqual(len(job['results']), 1)
+    
+    @patch('app.get_keyframe_index', return_value=None)
+    @patch('app.get_source_probe', return_value=None)
+    @patch('app.cut_clip_from_url')
+    def test_deterministic_error_fails_fast(self, mock_cut_clip, mock_probe, mock_keyframes):
+        """Encoder errors are not retried"""
+        mock_cut_clip.return_value = {'success': False, 'error': 'bad filter', 'error_class': 'ffmpeg'}
+        
+        job = self.run_job('fail-fast-job')
+        
+        self.assertEqual(mock_cut_clip.call_count, 1)
+        self.assertEqual(job['clip_states'][0]['state'], 'failed')
+        self.assertEqual(job['clip_states'][0]['error_class'], 'ffmpeg')
+
+class TestWorkspace(unittest.TestCase):
+    """Test per-job temp workspaces"""
+    
+    def setUp(self):
+        import app
+        self.app = app
+        self.test_jobs_folder = tempfile.mkdtemp()
+        self.test_root = tempfile.mkdtemp()
+        self.original_jobs_folder = app.JOBS_FOLDER
+        app.JOBS_FOLDER = self.test_jobs_folder
+        self.workspace = app.WorkspaceManager(self.test_root, min_free_bytes=0)
+    
+    def tearDown(self):
+        self.app.JOBS_FOLDER = self.original_jobs_folder
+        shutil.rmtree(self.test_jobs_folder, ignore_errors=True)
+        shutil.rmtree(self.test_root, ignore_errors=True)
+    
+    def test_jobs_get_separate_dirs(self):
+        """Two jobs for the same video never share a temp path, cleanup runs on errors"""
+        first = self.workspace.job_dir('job-a')
+        second = self.workspace.job_dir('job-b')
+        self.assertNotEqual(first, second)
+        
+        with self.assertRaises(RuntimeError):
+            with self.workspace.scratch('job-a') as scratch:
+                self.assertTrue(scratch.startswith(first))
+                raise RuntimeError('boom')
+        self.assertFalse(os.path.exists(scratch))
+        
+        self.workspace.release('job-a')
+        self.assertFalse(os.path.exists(first))
+        self.assertTrue(os.path.exists(second))
+    
+    def test_ensure_space(self):
+        """Downloads are refused before they can fill the volume"""
+        from app import WorkspaceFullError, classify_request_error
+        workspace = self.app.WorkspaceManager(self.test_root, min_free_bytes=100)
+        with patch.object(workspace, 'free_bytes', return_value=1000):
+            workspace.ensure_space(500)
+            with self.assertRaises(WorkspaceFullError) as ctx:
+                workspace.ensure_space(950)
+        self.assertEqual(classify_request_error(ctx.exception), 'disk_full')
+        self.assertIsNone(self.app.clip_retry_action('disk_full', 0))
+    
+    def test_sweep_removes_orphans(self):
+        """Old dirs of finished or unknown jobs are removed, active jobs keep theirs"""
+        save_job('active-job', {'job_id': 'active-job', 'status': 'processing'})
+        save_job('done-job', {'job_id': 'done-job', 'status': 'finished'})
+        for name in ('active-job', 'done-job', 'unknown-job', 'fresh-job'):
+            self.workspace.job_dir(name)
+        old = time.time() - self.app.WORKSPACE_ORPHAN_SECONDS - 10
+        for name in ('active-job', 'done-job', 'unknown-job'):
+            os.utime(os.path.join(self.test_root, name), (old, old))
+        
+        removed = self.workspace.sweep()
+        
+        self.assertEqual(sorted(removed), ['done-job', 'unknown-job'])
+        self.assertEqual(sorted(os.listdir(self.test_root)), ['active-job', 'fresh-job'])
+
+class TestPreviews(unittest.TestCase):
+    """Test thumbnail / WebP / sprite outputs produced with the Reels encode"""
+    
+    def setUp(self):
+        import app
+        self.app = app
+        self.test_clips_folder = tempfile.mkdtemp()
+        self.original_clips_folder = app.CLIPS_FOLDER
+        app.CLIPS_FOLDER = self.test_clips_folder
+    
+    def tearDown(self):
+        self.app.CLIPS_FOLDER = self.original_clips_folder
+        shutil.rmtree(self.test_clips_folder, ignore_errors=True)
+    
+    def test_preview_branches_share_one_decode(self):
+        """The Reels filter runs once and is split into the preview branches"""
+        names = self.app.preview_filenames('v-0-10_reels.mp4', ['thumbnail', 'sprite'])
+        self.assertEqual(names, {'thumbnail': 'v-0-10_reels.jpg', 'sprite': 'v-0-10_reels_sprite.jpg',
+                                 'sprite_vtt': 'v-0-10_reels_sprite.vtt'})
+        
+        video_args, preview_args = self.app.reels_video_args(names, 10, offset=1.5)
+        graph = video_args[1]
+        self.assertEqual(graph.count(self.app.ENCODER_PROFILE['video_filter']), 1)
+        self.assertIn('split=3[main][pt_in][ps_in]', graph)
+        self.assertIn('trim=start=1.500:duration=10.000', graph)
+        self.assertEqual(video_args[2:], ['-map', '[main]'])
+        self.assertEqual(preview_args.count('-map'), 2)
+        self.assertEqual(self.app.reels_video_args({}, 10)[1], [])
+    
+    def test_sprite_vtt(self):
+        """VTT cues point at the right sprite cell"""
+        path = os.path.join(self.test_clips_folder, 'sprite.vtt')
+        self.app.write_sprite_vtt(path, 'sprite.jpg', 12.5)
+        with open(path, encoding='utf-8') as f:
+            content = f.read()
+        
+        self.assertTrue(content.startswith('WEBVTT'))
+        self.assertIn('00:00:11.000 --> 00:00:12.000\nsprite.jpg#xywh=180,320,180,320', content)
+        self.assertIn('00:00:12.000 --> 00:00:12.500\nsprite.jpg#xywh=360,320,180,320', content)
+    
+    @unittest.skipUnless(shutil.which('ffmpeg'), 'ffmpeg gerekli')
+    def test_cut_writes_previews(self):
+        """One ffmpeg run writes the clip and all requested previews"""
+        source = os.path.join(self.test_clips_folder, 'source.mp4')
+        subprocess.run(['ffmpeg', '-hide_banner', '-loglevel', 'error', '-f', 'lavfi', '-i', 'testsrc2=size=320x180:rate=15',
+                        '-f', 'lavfi', '-i', 'sine', '-t', '4', '-shortest', '-y', source], check=True)
+        
+        with patch('app.run_ffmpeg', wraps=self.app.run_ffmpeg) as mock_run:
+            result = self.app.cut_clip_from_local_file(source, 'v', 0.5, 3.5, 'Test', '720p',
+                                                       previews=['thumbnail', 'webp', 'sprite'])
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(mock_run.call_count, 1)
+        for kind in ('thumbnail', 'sprite', 'sprite_vtt'):
+            self.assertTrue(os.path.getsize(os.path.join(self.test_clips_folder, result['previews'][kind])) > 0)
+        
+        clip = self.app.app.test_client().get('/api/clips').get_json()['clips']
+        clip = [entry for entry in clip if entry['filename'] == result['filename']][0]
+        self.assertIn('thumbnail', clip['previews'])
+
+class TestAudioOnly(unittest.TestCase):
+    """Test audio-only (transcript-ready) clip jobs"""
+    
+    def setUp(self):
+        import app
+        self.app = app
+        self.test_jobs_folder = tempfile.mkdtemp()
+        self.test_clips_folder = tempfile.mkdtemp()
+        self.original_jobs_folder = app.JOBS_FOLDER
+        self.original_clips_folder = app.CLIPS_FOLDER
+        app.JOBS_FOLDER = self.test_jobs_folder
+        app.CLIPS_FOLDER = self.test_clips_folder
+    
+    def tearDown(self):
+        self.app.JOBS_FOLDER = self.original_jobs_folder
+        self.app.CLIPS_FOLDER = self.original_clips_folder
+        shutil.rmtree(self.test_jobs_folder, ignore_errors=True)
+        shutil.rmtree(self.test_clips_folder, ignore_errors=True)
+    
+    def test_filenames_and_validation(self):
+        """Audio jobs get their own filenames and mode/format are validated"""
+        self.assertEqual(self.app.generate_audio_filename('v', 0, 10, 'flac'), 'v-0-10_audio.flac')
+        self.assertEqual(self.app.job_clip_filenames('v', [{'start': 0, 'end': 10}, {'start': 5}], 'audio', 'wav'),
+                         ['v-0-10_audio.wav'])
+        self.assertIsNone(self.app.validate_job_mode('audio', 'm4a'))
+        self.assertIn('mode', self.app.validate_job_mode('subtitles', 'm4a'))
+        self.assertIn('audio_format', self.app.validate_job_mode('audio', 'mp3'))
+    
+    @patch('app.get_keyframe_index')
+    @patch('app.get_source_probe')
+    @patch('app.cut_clip_from_url')
+    @patch('app.cut_audio_clip', return_value={'success': True, 'filename': 'v-0-10_audio.flac', 'video_info': {}})
+    def test_audio_job_skips_video(self, mock_cut_audio, mock_cut_clip, mock_probe, mock_keyframes):
+        """Audio jobs cut from the audio URL without probing or indexing the video"""
+        save_job('audio-job', {'job_id': 'audio-job', 'video_id': 'v', 'status': 'pending', 'total': 1, 'processed': 0,
+                               'mode': 'audio', 'audio_format': 'flac'})
+        process_clips_async('audio-job', 'v', [{'start': 0, 'end': 10}],
+                            'http://audio.url', 'http://audio.url', 'Test Video', 'audio')
+        job = get_job('audio-job')
+        
+        self.assertEqual(job['status'], 'finished')
+        self.assertEqual(mock_cut_audio.call_args.args[0], 'http://audio.url')
+        self.assertEqual(mock_cut_audio.call_args.kwargs['audio_format'], 'flac')
+        mock_cut_clip.assert_not_called()
+        mock_probe.assert_not_called()
+        mock_keyframes.assert_not_called()
+    
+    @unittest.skipUnless(shutil.which('ffmpeg'), 'ffmpeg gerekli')
+    def test_cut_flac_is_asr_ready(self):
+        """FLAC output is 16 kHz mono with no video stream"""
+        source = os.path.join(self.test_clips_folder, 'source.mp4')
+        subprocess.run(['ffmpeg', '-hide_banner', '-loglevel', 'error', '-f', 'lavfi', '-i', 'testsrc2=size=320x180:rate=15',
+                        '-f', 'lavfi', '-i', 'sine=sample_rate=44100', '-t', '4', '-shortest', '-y', source], check=True)
+        
+        result = self.app.cut_audio_clip(source, 'v', 0.5, 3.5, 'Test', audio_format='flac')
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(result['filename'], 'v-0.5-3.5_audio.flac')
+        info = subprocess.run(['ffmpeg', '-hide_banner', '-i', os.path.join(self.test_clips_folder, result['filename'])],
+                              capture_output=True, text=True).stderr
+        self.assertIn('16000 Hz, mono', info)
+        self.assertNotIn('Video:', info)
+    
+    def test_concurrent_audio_cuts_share_one_encode(self):
+        """A second job for the same audio clip waits for the first encode instead of returning its partial file"""
+        output = os.path.join(self.test_clips_folder, 'v-0-10_audio.m4a')
+        
+        def encode(cmd, *args, **kwargs):
+            encode_path = cmd[cmd.index('-y') + 1]
+            self.assertFalse(os.path.exists(output))
+            with open(encode_path, 'wb') as f:
+                f.write(b'x' * 1024)
+                f.flush()
+                time.sleep(0.3)  # ikinci job bu sırada kontrol eder
+                f.write(b'x' * 1024)
+            return subprocess.CompletedProcess(cmd, 0, '', '')
+        
+        results = []
+        with patch('app.run_ffmpeg', side_effect=encode) as mock_run:
+            workers = [threading.Thread(target=lambda: results.append(
+                self.app.cut_audio_clip('source.m4a', 'v', 0, 10, 'Test'))) for _ in range(2)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join(5)
+        
+        self.assertEqual(mock_run.call_count, 1)
+        self.assertEqual([result['video_info']['file_size'] for result in results], [2048, 2048])
+
+class TestSourceAnalysis(unittest.TestCase):
+    """Test silence/scene analysis and automatic clip boundaries"""
+    
+    def setUp(self):
+        import app
+        self.app = app
+        self.test_jobs_folder = tempfile.mkdtemp()
+        self.test_analysis_folder = tempfile.mkdtemp()
+        self.original_jobs_folder = app.JOBS_FOLDER
+        self.original_analysis_folder = app.ANALYSIS_FOLDER
+        app.JOBS_FOLDER = self.test_jobs_folder
+        app.ANALYSIS_FOLDER = self.test_analysis_folder
+        self.analysis = {'duration': 18.0, 'scene_cuts': [[6.0, 0.18], [12.0, 0.2]], 'silences': [[4.5, 5.5]]}
+    
+    def tearDown(self):
+        self.app.JOBS_FOLDER = self.original_jobs_folder
+        self.app.ANALYSIS_FOLDER = self.original_analysis_folder
+        shutil.rmtree(self.test_jobs_folder, ignore_errors=True)
+        shutil.rmtree(self.test_analysis_folder, ignore_errors=True)
+    
+    def test_scene_cuts_from_frame_scores(self):
+        """Hard cuts are local peaks of the frame difference scores"""
+        import numpy as np
+        frames = np.repeat(np.array([[0], [0], [0], [255], [255], [250], [0]], dtype=np.uint8), 16, axis=1)
+        
+        cuts = self.app.detect_scene_cuts(self.app.scene_scores(frames), fps=2, threshold=0.1)
+        
+        self.assertEqual([cut[0] for cut in cuts], [1.5, 3.0])
+        self.assertEqual(self.app.parse_silences(
+            "frame:1\nlavfi.silence_start=1.2\nframe:9\nlavfi.silence_end=2.5\nlavfi.silence_start=9\n", 10),
+            [[1.2, 2.5], [9.0, 10]])
+    
+    def test_suggest_and_snap(self):
+        """Suggestions prefer silences; user ranges snap within the tolerance"""
+        suggested = self.app.suggest_clip_ranges(self.analysis, min_duration=4, max_duration=8)
+        self.assertEqual([(c['start'], c['end'], c['boundary']) for c in suggested],
+                         [(0.0, 5.0, 'silence'), (5.0, 12.0, 'scene'), (12.0, 18.0, 'end')])
+        
+        snapped = self.app.snap_clip_ranges([{'start': 0.4, 'end': 6.9, 'caption': 'x'}, {'start': 8, 'end': 9}],
+                                            self.analysis, tolerance=1)
+        self.assertEqual((snapped[0]['start'], snapped[0]['end'], snapped[0]['caption']), (0.0, 6.0, 'x'))
+        self.assertEqual((snapped[1]['start'], snapped[1]['end']), (8.0, 9.0))
+    
+    @patch('app.get_source_probe', return_value=None)
+    def test_analysis_job(self, mock_probe):
+        """Analysis jobs store suggestions without cutting anything"""
+        with open(os.path.join(self.test_analysis_folder, 'v.json'), 'w') as f:
+            json.dump(self.analysis, f)
+        save_job('analysis-job', {'job_id': 'analysis-job', 'video_id': 'v', 'status': 'pending', 'total': 0,
+                                  'processed': 0, 'mode': 'analysis', 'clip_states': [],
+                                  'analysis_options': {'min_duration': 4, 'max_duration': 8}})
+        
+        with patch('app.run_ffmpeg') as mock_run, patch('app.SCHEDULER.cpu_slot') as mock_slot:
+            process_clips_async('analysis-job', 'v', [], 'http://video.url', 'http://video.url', 'Test', '720p')
+        job = get_job('analysis-job')
+        
+        mock_run.assert_not_called()  # cache hit
+        mock_slot.assert_not_called()
+        mock_probe.assert_called_once_with('v', 'http://video.url', build=False)
+        self.assertEqual(job['status'], 'finished')
+        self.assertEqual(len(job['analysis']['suggested_clips']), 3)
+        self.assertEqual(job['analysis']['scene_cuts'], [6.0, 12.0])
+    
+    @patch('app.resolve_source_urls')
+    def test_cached_analysis_skips_source(self, mock_resolve):
+        """A repeated analysis request finishes immediately without resolving, probing or queueing"""
+        with open(os.path.join(self.test_analysis_folder, 'v.json'), 'w') as f:
+            json.dump(self.analysis, f)
+        
+        with patch('app.get_source_probe') as mock_probe, patch('app.SCHEDULER.submit') as mock_submit:
+            response = self.app.app.test_client().post('/api/analyze', json={'video_id': 'v', 'min_duration': 4, 'max_duration': 8})
+        data = response.get_json()
+        job = get_job(data['job_id'])
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(data['cached'])
+        mock_resolve.assert_not_called()
+        mock_probe.assert_not_called()
+        mock_submit.assert_not_called()
+        self.assertEqual(job['status'], 'finished')
+        self.assertEqual(len(job['analysis']['suggested_clips']), 3)
+    
+    @unittest.skipUnless(shutil.which('ffmpeg'), 'ffmpeg gerekli')
+    def test_analyze_real_source(self):
+        """One ffmpeg pass finds the colour cut and the silent gap"""
+        source = os.path.join(self.test_analysis_folder, 'source.mp4')
+        subprocess.run(['ffmpeg', '-hide_banner', '-loglevel', 'error',
+                        '-f', 'lavfi', '-i', 'color=c=red:s=160x90:r=10:d=3', '-f', 'lavfi', '-i', 'color=c=blue:s=160x90:r=10:d=3',
+                        '-f', 'lavfi', '-i', 'sine=d=2', '-f', 'lavfi', '-i', 'anullsrc=r=44100:cl=mono:d=1', '-f', 'lavfi', '-i', 'sine=d=3',
+                        '-filter_complex', '[0:v][1:v]concat=n=2:v=1:a=0[v];[2:a][3:a][4:a]concat=n=3:v=0:a=1[a]',
+                        '-map', '[v]', '-map', '[a]', '-y', source], check=True)
+        
+        analysis = self.app.get_source_analysis('real', source, {'duration': 6.0, 'audio': {}})
+        
+        self.assertEqual([cut[0] for cut in analysis['scene_cuts']], [3.0])
+        self.assertEqual(len(analysis['silences']), 1)
+        self.assertAlmostEqual(analysis['silences'][0][0], 2.0, delta=0.2)
+        with patch('app.run_ffmpeg') as mock_run:
+            self.assertEqual(self.app.get_source_analysis('real', source)['scene_cuts'], analysis['scene_cuts'])
+        mock_run.assert_not_called()
+
+class TestReframe(unittest.TestCase):
+    """Test crop-follow vertical reframing"""
+    
+    def setUp(self):
+        import app
+        self.app = app
+        self.test_jobs_folder = tempfile.mkdtemp()
+        self.test_reframe_folder = tempfile.mkdtemp()
+        self.original_jobs_folder = app.JOBS_FOLDER
+        self.original_reframe_folder = app.REFRAME_FOLDER
+        app.JOBS_FOLDER = self.test_jobs_folder
+        app.REFRAME_FOLDER = self.test_reframe_folder
+    
+    def tearDown(self):
+        self.app.JOBS_FOLDER = self.original_jobs_folder
+        self.app.REFRAME_FOLDER = self.original_reframe_folder
+        shutil.rmtree(self.test_jobs_folder, ignore_errors=True)
+        shutil.rmtree(self.test_reframe_folder, ignore_errors=True)
+    
+    def test_centers_follow_moving_subject(self):
+        """The crop window tracks a bright block moving left to right"""
+        import numpy as np
+        frames = np.zeros((12, 18, 32), dtype=np.uint8)
+        for index in range(12):
+            frames[index, 6:12, 2 + index * 2:6 + index * 2] = 255
+        
+        centers = self.app.crop_centers(frames, window=0.3, fps=2)
+        
+        self.assertEqual(len(centers), 12)
+        self.assertTrue(np.all(np.diff(centers) >= -1e-9))
+        self.assertLess(centers[0], 0.3)
+        self.assertGreater(centers[-1], 0.6)
+        self.assertTrue(np.all((centers >= 0.15) & (centers <= 0.85)))
+    
+    def test_chunked_energy_matches_full_pass(self):
+        """Reading frames in chunks (from a memmap) gives the same centers as one pass"""
+        import numpy as np
+        rng = np.random.default_rng(3)
+        frames = rng.integers(0, 256, size=(25, 18, 32), dtype=np.uint8)
+        path = os.path.join(self.test_reframe_folder, 'frames.gray')
+        frames.tofile(path)
+        
+        expected = self.app.crop_centers(frames, window=0.3, fps=2)
+        mapped = np.memmap(path, dtype=np.uint8, mode='r', shape=frames.shape)
+        with patch('app.REFRAME_CHUNK_FRAMES', 4):
+            chunked = self.app.crop_centers(mapped, window=0.3, fps=2)
+            energy = np.concatenate([self.app.column_energy(frames[:4]), self.app.column_energy(frames[4:], frames[3])])
+        del mapped
+        
+        np.testing.assert_allclose(chunked, expected)
+        np.testing.assert_array_equal(energy, self.app.column_energy(frames))
+    
+    def test_crop_filter(self):
+        """Track segments become a flat sum of clipped ramps; vertical sources are not cropped"""
+        track = {'fps': 1, 'window': 0.3, 'centers': [0.5, 0.5, 0.5, 0.7, 0.7]}
+        
+        expression = self.app.crop_x_expression(track, base=1, span=3)
+        
+        self.assertTrue(expression.startswith('clip((0.5000+(0.2000)*clip((t-1.00)/1,0,1))'))
+        self.assertNotIn('if(', expression)
+        self.assertIn("crop=w=trunc(ih*9/32)*2:h=ih:x='", self.app.reframe_filter(track, 0, 2))
+        self.assertIsNone(self.app.crop_window_fraction({'video': {'width': 1080, 'height': 1920}}))
+        self.assertEqual(self.app.generate_clip_filename('v', 0, 10, 'crop'), 'v-0-10_reels_crop.mp4')
+    
+    @patch('app.get_keyframe_index', return_value=None)
+    @patch('app.get_source_probe', return_value=None)
+    @patch('app.cut_clip_from_url')
+    def test_crop_job_shares_track(self, mock_cut_clip, mock_probe, mock_keyframes):
+        """The track is computed once per job and passed to every clip"""
+        mock_cut_clip.side_effect = lambda *args, **kwargs: {
+            'success': True, 'filename': self.app.generate_clip_filename('v', args[3], args[4], 'crop'), 'video_info': {}
+        }
+        track = {'fps': 2, 'window': 0.3, 'centers': [0.5] * 40}
+        save_job('crop-job', {'job_id': 'crop-job', 'video_id': 'v', 'status': 'pending', 'total': 2, 'processed': 0,
+                              'framing': 'crop'})
+        
+        with patch('app.get_crop_track', return_value=track) as mock_track:
+            process_clips_async('crop-job', 'v', [{'start': 0, 'end': 10}, {'start': 10, 'end': 20}],
+                                'http://video.url', 'http://audio.url', 'Test', '720p')
+        
+        mock_track.assert_called_once()
+        self.assertEqual([call.kwargs['crop_track'] for call in mock_cut_clip.call_args_list], [track, track])
+        self.assertEqual(get_job('crop-job')['clip_states'][1]['output'], 'v-10-20_reels_crop.mp4')
+    
+    @unittest.skipUnless(shutil.which('ffmpeg'), 'ffmpeg gerekli')
+    def test_crop_cut_real_source(self):
+        """The generated crop expression is accepted by ffmpeg and fills 1080x1920"""
+        clips_folder = tempfile.mkdtemp()
+        original_clips_folder = self.app.CLIPS_FOLDER
+        self.app.CLIPS_FOLDER = clips_folder
+        try:
+            source = os.path.join(clips_folder, 'source.mp4')
+            subprocess.run(['ffmpeg', '-hide_banner', '-loglevel', 'error', '-f', 'lavfi', '-i', 'testsrc2=size=320x180:rate=10',
+                            '-f', 'lavfi', '-i', 'sine', '-t', '4', '-shortest', '-y', source], check=True)
+            probe = {'duration': 4.0, 'video': {'width': 320, 'height': 180}}
+            
+            track = self.app.get_crop_track('real', source, probe)
+            result = self.app.cut_clip_from_local_file(source, 'real', 1, 3, 'Test', '720p', crop_track=track)
+            
+            self.assertEqual(len(track['centers']), 8)
+            self.assertTrue(result['success'])
+            self.assertEqual(result['filename'], 'real-1-3_reels_crop.mp4')
+            info = subprocess.run(['ffmpeg', '-hide_banner', '-i', os.path.join(clips_folder, result['filename'])],
+                                  capture_output=True, text=True).stderr
+            self.assertIn('1080x1920', info)
+        finally:
+            self.app.CLIPS_FOLDER = original_clips_folder
+            shutil.rmtree(clips_folder, ignore_errors=True)
+
+class TestCompose(unittest.TestCase):
+    """Test highlight reel assembly from cached segments"""
+    
+    def setUp(self):
+        import app
+        self.app = app
+        self.test_jobs_folder = tempfile.mkdtemp()
+        self.test_clips_folder = tempfile.mkdtemp()
+        self.original_jobs_folder = app.JOBS_FOLDER
+        self.original_clips_folder = app.CLIPS_FOLDER
+        app.JOBS_FOLDER = self.test_jobs_folder
+        app.CLIPS_FOLDER = self.test_clips_folder
+    
+    def tearDown(self):
+        self.app.JOBS_FOLDER = self.original_jobs_folder
+        self.app.CLIPS_FOLDER = self.original_clips_folder
+        shutil.rmtree(self.test_jobs_folder, ignore_errors=True)
+        shutil.rmtree(self.test_clips_folder, ignore_errors=True)
+    
+    def make_source(self):
+        source = os.path.join(self.test_clips_folder, 'source.mp4')
+        subprocess.run(['ffmpeg', '-hide_banner', '-loglevel', 'error', '-f', 'lavfi', '-i', 'testsrc2=size=320x180:rate=15',
+                        '-f', 'lavfi', '-i', 'sine', '-t', '6', '-shortest', '-y', source], check=True)
+        return source
+    
+    def test_compose_filename_is_stable(self):
+        """The same segment list maps to the same cached reel"""
+        segments = [{'video_id': 'a', 'start': 0, 'end': 5}, {'video_id': 'b', 'start': 1, 'end': 2}]
+        self.assertEqual(self.app.compose_filename(segments), self.app.compose_filename(list(segments)))
+        self.assertNotEqual(self.app.compose_filename(segments), self.app.compose_filename(segments[::-1]))
+        self.assertNotEqual(self.app.compose_filename(segments), self.app.compose_filename(segments, 'crop'))
+    
+    @unittest.skipUnless(shutil.which('ffmpeg'), 'ffmpeg gerekli')
+    def test_only_missing_segments_are_encoded(self):
+        """Cached segments are reused and the reel is joined with stream copy"""
+        source = self.make_source()
+        self.app.cut_clip_from_local_file(source, 'a', 0, 2, 'Test', '720p')
+        
+        def encode_missing(child_id, video_id, clips, *args):
+            # Alt job: eksik segmentleri gerçekten kes
+            for clip in clips:
+                self.app.cut_clip_from_local_file(source, video_id, clip['start'], clip['end'], 'Test', '720p')
+            child = get_job(child_id)
+            child['status'] = 'finished'
+            save_job(child_id, child)
+            encoded.extend((video_id, clip['start'], clip['end']) for clip in clips)
+        
+        encoded = []
+        segments = [{'video_id': 'a', 'start': 0, 'end': 2}, {'video_id': 'b', 'start': 3, 'end': 5},
+                    {'video_id': 'a', 'start': 0, 'end': 2}]
+        save_job('compose-job', {'job_id': 'compose-job', 'video_id': 'a,b', 'status': 'pending', 'mode': 'compose',
+                                 'segments': segments, 'total': 3, 'processed': 0})
+        
+        with patch('app.resolve_source_urls', return_value={'success': True, 'video_url': 'u', 'audio_url': 'u'}) as mock_resolve, \
+             patch('app.process_clips_async', side_effect=encode_missing), \
+             patch('app.run_ffmpeg', wraps=self.app.run_ffmpeg) as mock_run:
+            self.app.process_compose_async('compose-job')
+        job = get_job('compose-job')
+        
+        self.assertEqual(job['status'], 'finished')
+        mock_resolve.assert_called_once_with('b')
+        self.assertEqual(encoded, [('b', 3, 5)])
+        self.assertEqual(job['results'][0]['reused_segments'], 2)
+        self.assertIn('-c', mock_run.call_args_list[-1].args[0])
+        self.assertEqual(mock_run.call_args_list[-1].args[0][mock_run.call_args_list[-1].args[0].index('-c') + 1], 'copy')
+        info = subprocess.run(['ffmpeg', '-hide_banner', '-i', os.path.join(self.test_clips_folder, job['results'][0]['filename'])],
+                              capture_output=True, text=True).stderr
+        self.assertIn('Duration: 00:00:06', info)
+        self.assertIn('1080x1920', info)
+    
+    def test_identical_compose_waits_for_running_concat(self):
+        """A second compose of the same segments waits for the first concat and reuses its reel"""
+        segments = [{'video_id': 'a', 'start': 0, 'end': 2}, {'video_id': 'b', 'start': 0, 'end': 2}]
+        for segment in segments:
+            with open(os.path.join(self.test_clips_folder, self.app.generate_clip_filename(segment['video_id'], 0, 2)), 'wb') as f:
+                f.write(b'x' * 1024)
+        output_file = self.app.compose_filename(segments)
+        save_job('compose-2', {'job_id': 'compose-2', 'video_id': 'a,b', 'status': 'pending', 'mode': 'compose',
+                               'segments': segments, 'total': 2, 'processed': 0})
+        
+        with patch('app.concat_segments') as mock_concat:
+            with self.app.output_lock(output_file):
+                # İlk job birleştiriyor
+                worker = threading.Thread(target=self.app.process_compose_async, args=('compose-2',))
+                worker.start()
+                time.sleep(0.3)
+                self.assertEqual(get_job('compose-2')['status'], 'processing')
+                with open(os.path.join(self.test_clips_folder, output_file), 'wb') as f:
+                    f.write(b'x' * 2048)
+            worker.join(5)
+        
+        self.assertEqual(get_job('compose-2')['status'], 'finished')
+        mock_concat.assert_not_called()
+    
+    @unittest.skipUnless(shutil.which('ffmpeg'), 'ffmpeg gerekli')
+    def test_concat_is_published_when_finished(self):
+        """The reel is concatenated under a temporary name and renamed into place"""
+        source = self.make_source()
+        output = os.path.join(self.test_clips_folder, 'reel.mp4')
+        
+        with patch('app.run_ffmpeg', wraps=self.app.run_ffmpeg) as mock_run:
+            self.assertTrue(self.app.concat_segments([source, source], output, 12)['success'])
+        
+        cmd = mock_run.call_args.args[0]
+        self.assertNotEqual(cmd[cmd.index('-y') + 1], output)
+        self.assertGreater(os.path.getsize(output), 0)
+        self.assertEqual(os.listdir(os.path.join(self.test_clips_folder, '.partial')), [])
+    
+    def test_matching_segments_are_not_reencoded(self):
+        """Segments whose stream parameters match are concatenated as they are"""
+        probe = {key: dict(value) for key, value in self.app.COMPOSE_STREAM_PROFILE.items()}
+        with patch('app.probe_segment', return_value=probe), patch('app.normalize_segment') as mock_normalize:
+            paths, normalized, error = self.app.prepare_concat_inputs(['a.mp4', 'b.mp4'], self.test_clips_folder, [2, 2])
+        
+        self.assertEqual((paths, normalized, error), (['a.mp4', 'b.mp4'], 0, None))
+        mock_normalize.assert_not_called()
+    
+    @unittest.skipUnless(shutil.which('ffmpeg'), 'ffmpeg gerekli')
+    def test_mismatched_frame_rates_are_normalized(self):
+        """A 25 fps cached segment is re-encoded before joining it to a 30 fps one"""
+        segments = [{'video_id': 'a', 'start': 0, 'end': 2}, {'video_id': 'b', 'start': 0, 'end': 2}]
+        rates = {}
+        for segment, rate in zip(segments, (30, 25)):
+            path = os.path.join(self.test_clips_folder, self.app.generate_clip_filename(segment['video_id'], 0, 2))
+            subprocess.run(['ffmpeg', '-hide_banner', '-loglevel', 'error', '-f', 'lavfi', '-i', f'testsrc2=size=1080x1920:rate={rate}',
+                            '-f', 'lavfi', '-i', 'sine', '-t', '2', '-shortest', '-c:v', 'libx264', '-pix_fmt', 'yuv420p',
+                            '-video_track_timescale', '15360', '-c:a', 'aac', '-ar', '44100', '-ac', '2', '-y', path], check=True)
+            rates[path] = f'{rate}/1'
+        
+        def probe(path):
+            # Bu ortamda ffprobe olmayabilir - segmentlerin gerçek fps'i
+            result = {key: dict(value) for key, value in self.app.COMPOSE_STREAM_PROFILE.items()}
+            result['video']['frame_rate'] = rates.get(path, '30/1')
+            return result
+        
+        save_job('compose-fps', {'job_id': 'compose-fps', 'video_id': 'a,b', 'status': 'pending', 'mode': 'compose',
+                                 'segments': segments, 'total': 2, 'processed': 0})
+        with patch('app.probe_segment', side_effect=probe), \
+             patch('app.normalize_segment', wraps=self.app.normalize_segment) as mock_normalize:
+            self.app.process_compose_async('compose-fps')
+        job = get_job('compose-fps')
+        
+        self.assertEqual(job['status'], 'finished')
+        self.assertEqual(job['results'][0]['normalized_segments'], 1)
+        self.assertEqual(mock_normalize.call_count, 1)
+        self.assertTrue(mock_normalize.call_args.args[0].endswith(self.app.generate_clip_filename('b', 0, 2)))
+        decode = subprocess.run(['ffmpeg', '-hide_banner', '-v', 'error', '-i', os.path.join(self.test_clips_folder, job['results'][0]['filename']),
+                                 '-f', 'null', '-'], capture_output=True, text=True)
+        self.assertNotIn('non monotonically increasing dts', decode.stderr)
+        info = subprocess.run(['ffmpeg', '-hide_banner', '-i', os.path.join(self.test_clips_folder, job['results'][0]['filename'])],
+                              capture_output=True, text=True).stderr
+        self.assertIn('Duration: 00:00:04', info)
+        self.assertIn('30 tbr', info)
+
+class TestHls(unittest.TestCase):
+    """Test segmented fMP4 HLS output"""
+    
+    def setUp(self):
+        import app
+        self.app = app
+        self.test_jobs_folder = tempfile.mkdtemp()
+        self.test_clips_folder = tempfile.mkdtemp()
+        self.original_jobs_folder = app.JOBS_FOLDER
+        self.original_clips_folder = app.CLIPS_FOLDER
+        app.JOBS_FOLDER = self.test_jobs_folder
+        app.CLIPS_FOLDER = self.test_clips_folder
+    
+    def tearDown(self):
+        self.app.JOBS_FOLDER = self.original_jobs_folder
+        self.app.CLIPS_FOLDER = self.original_clips_folder
+        shutil.rmtree(self.test_jobs_folder, ignore_errors=True)
+        shutil.rmtree(self.test_clips_folder, ignore_errors=True)
+    
+    def test_hls_only_for_video_jobs(self):
+        """HLS output is validated and named per clip folder"""
+        self.assertIsNone(self.app.validate_job_mode('video', 'm4a', 'letterbox', 'hls'))
+        self.assertIsNotNone(self.app.validate_job_mode('audio', 'm4a', 'letterbox', 'hls'))
+        self.assertIsNotNone(self.app.validate_job_mode('video', 'm4a', 'letterbox', 'dash'))
+        self.assertEqual(self.app.job_clip_filenames('abc', [{'start': 0, 'end': 5}], output_format='hls'),
+                         ['abc-0-5_reels_hls/index.m3u8'])
+    
+    def test_playlist_url_appears_with_first_segment(self):
+        """check-job exposes the playlist while the clip is still encoding"""
+        playlist = 'abc-0-5_reels_hls/index.m3u8'
+        os.makedirs(os.path.join(self.test_clips_folder, 'abc-0-5_reels_hls'))
+        job = {'job_id': 'job-hls', 'video_id': 'abc', 'status': 'processing', 'created_at': 'now', 'total': 1, 'processed': 0,
+               'output': 'hls', 'clip_states': [{'index': 0, 'state': 'running', 'output': playlist}]}
+        
+        with self.app.app.test_request_context():
+            with open(os.path.join(self.test_clips_folder, playlist), 'w') as f:
+                f.write('#EXTM3U\n#EXT-X-MAP:URI="init.mp4"\n')
+            self.assertNotIn('playlist_url', self.app.build_job_response('job-hls', job)['clip_states'][0])
+            
+            with open(os.path.join(self.test_clips_folder, playlist), 'a') as f:
+                f.write('#EXTINF:4.000000,\nseg_00000.m4s\n')
+            response = self.app.build_job_response('job-hls', job)
+        
+        self.assertTrue(response['clip_states'][0]['playlist_url'].endswith('/clips/' + playlist))
+        self.assertEqual(self.app.read_hls_playlist(os.path.join(self.test_clips_folder, playlist)), (1, False))
+    
+    @unittest.skipUnless(shutil.which('ffmpeg'), 'ffmpeg gerekli')
+    def test_encode_writes_segments_and_playlist(self):
+        """The encode produces an init segment, media segments and a closed playlist"""
+        source = os.path.join(self.test_clips_folder, 'source.mp4')
+        subprocess.run(['ffmpeg', '-hide_banner', '-loglevel', 'error', '-f', 'lavfi', '-i', 'testsrc2=size=320x180:rate=15',
+                        '-f', 'lavfi', '-i', 'sine', '-t', '6', '-shortest', '-y', source], check=True)
+        
+        result = self.app.cut_clip_from_local_file(source, 'abc', 0, 6, 'Test', '720p', output_format='hls')
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(result['filename'], 'abc-0-6_reels_hls/index.m3u8')
+        files = os.listdir(os.path.join(self.test_clips_folder, 'abc-0-6_reels_hls'))
+        self.assertIn('init.mp4', files)
+        self.assertIn('seg_00000.m4s', files)
+        segments, complete = self.app.read_hls_playlist(os.path.join(self.test_clips_folder, result['filename']))
+        self.assertGreaterEqual(segments, 2)
+        self.assertTrue(complete)
+        
+        response = self.app.app.test_client().get('/clips/' + result['filename'])
+        self.assertEqual(response.headers['Content-Type'], 'application/vnd.apple.mpegurl')
+        response.close()
+    
+    def test_live_encode_is_not_deleted(self):
+        """A second job waits for the running encode instead of wiping its playlist folder"""
+        folder = os.path.join(self.test_clips_folder, 'abc-0-6_reels_hls')
+        os.makedirs(folder)
+        playlist = os.path.join(folder, 'index.m3u8')
+        with open(playlist, 'w') as f:
+            f.write('#EXTM3U\n#EXT-X-MAP:URI="init.mp4"\n#EXTINF:4.000000,\nseg_00000.m4s\n')
+        results = []
+        
+        with patch('app.run_ffmpeg') as mock_run:
+            with self.app.clip_output_lock('abc', 0, 6, output_format='hls'):
+                # Kilit = çalışan encode; ikinci job kontrolü onun bitmesini bekler
+                worker = threading.Thread(target=lambda: results.append(
+                    self.app.cut_clip_from_local_file('source.mp4', 'abc', 0, 6, 'Test', '720p', output_format='hls')))
+                worker.start()
+                time.sleep(0.2)
+                self.assertTrue(os.path.exists(playlist))
+                with open(playlist, 'a') as f:
+                    f.write('#EXT-X-ENDLIST\n')
+            worker.join(5)
+        
+        self.assertTrue(results[0]['success'])
+        mock_run.assert_not_called()
+    
+    @unittest.skipIf(sys.platform == 'win32', 'flock gerekli')
+    def test_output_lock_spans_processes(self):
+        """A clip output locked by another worker process is not entered until it is released"""
+        code = ("import sys, app\n"
+                "app.CLIPS_FOLDER = sys.argv[1]\n"
+                "with app.output_lock('abc-0-6_reels_hls/index.m3u8'):\n"
+                "    print('locked', flush=True)\n"
+                "    sys.stdin.read()\n")
+        env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+        other = subprocess.Popen([sys.executable, '-c', code, self.test_clips_folder], env=env,
+                                 stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        acquired = threading.Event()
+        
+        def enter():
+            with self.app.output_lock('abc-0-6_reels_hls/index.m3u8'):
+                acquired.set()
+        
+        try:
+            self.assertEqual(other.stdout.readline().strip(), 'locked')
+            worker = threading.Thread(target=enter)
+            worker.start()
+            self.assertFalse(acquired.wait(0.5))
+            other.stdin.close()  # diğer worker encode'u bitirdi
+            self.assertTrue(acquired.wait(10))
+            worker.join(5)
+        finally:
+            other.kill()
+            other.wait()
+
+class TestJobStore(unittest.TestCase):
+    """Test the write-behind job state cache"""
+    
+    def setUp(self):
+        import app
+        self.app = app
+        self.test_jobs_folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.test_jobs_folder, 'job-1.json')
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_jobs_folder, ignore_errors=True)
+    
+    def read_file(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def test_updates_are_coalesced(self):
+        """Progress updates within the interval land on disk as a single write"""
+        store = self.app.JobStore(interval=60, max_records=10)
+        store.save(self.path, {'status': 'processing', 'processed': 0})
+        for processed in range(1, 20):
+            store.save(self.path, {'status': 'processing', 'processed': processed})
+        
+        self.assertEqual(store.get(self.path)['processed'], 19)
+        self.assertEqual(self.read_file()['processed'], 0)
+        
+        store.save(self.path, {'status': 'finished', 'processed': 20})
+        self.assertEqual(self.read_file(), {'status': 'finished', 'processed': 20})
+    
+    def test_other_worker_write_invalidates(self):
+        """A record rewritten by another worker is re-read, an unchanged one is not"""
+        writer = self.app.JobStore(interval=60, max_records=10)
+        reader = self.app.JobStore(interval=60, max_records=10)
+        writer.save(self.path, {'status': 'pending'})
+        self.assertEqual(reader.get(self.path)['status'], 'pending')
+        
+        with patch('builtins.open', wraps=open) as mock_open:
+            reader.get(self.path)
+        mock_open.assert_not_called()
+        
+        writer.save(self.path, {'status': 'cancelled'})
+        self.assertEqual(reader.get(self.path)['status'], 'cancelled')
+    
+    def test_deleted_job_is_not_resurrected(self):
+        """A pending write for a deleted job does not recreate the file"""
+        store = self.app.JobStore(interval=60, max_records=10)
+        store.save(self.path, {'status': 'processing', 'processed': 0})
+        store.save(self.path, {'status': 'processing', 'processed': 1})
+        os.remove(self.path)
+        
+        store.flush()
+        
+        self.assertFalse(os.path.exists(self.path))
+        self.assertIsNone(store.get(self.path))
+
+class TestJobReaper(unittest.TestCase):
+    """Test TTL-based deletion of finished jobs"""
+    
+    def setUp(self):
+        import app
+        self.app = app
+        self.test_jobs_folder = tempfile.mkdtemp()
+        self.original_jobs_folder = app.JOBS_FOLDER
+        app.JOBS_FOLDER = self.test_jobs_folder
+        self.test_batches_folder = tempfile.mkdtemp()
+        self.original_batches_folder = app.BATCHES_FOLDER
+        app.BATCHES_FOLDER = self.test_batches_folder
+        self.reaper = app.JobReaper(scan_interval=300)
+    
+    def tearDown(self):
+        self.app.JOBS_FOLDER = self.original_jobs_folder
+        self.app.BATCHES_FOLDER = self.original_batches_folder
+        shutil.rmtree(self.test_jobs_folder, ignore_errors=True)
+        shutil.rmtree(self.test_batches_folder, ignore_errors=True)
+    
+    def test_terminal_jobs_share_one_reaper(self):
+        """Finishing jobs schedules them on the reaper instead of starting threads"""
+        threads = threading.active_count()
+        with patch('app.JOB_REAPER', self.reaper), patch.object(self.reaper, 'start'):
+            for n in range(20):
+                save_job(f'job-{n}', {'job_id': f'job-{n}', 'status': 'processing'})
+                save_job(f'job-{n}', {'job_id': f'job-{n}', 'status': 'finished'})
+        
+        self.assertEqual(self.reaper.pending(), 20)
+        self.assertLessEqual(threading.active_count(), threads + 1)
+        expires_at = get_job('job-0')['expires_at']
+        self.assertAlmostEqual(expires_at - time.time(), self.app.JOB_TTL_SECONDS['finished'], delta=5)
+        
+        self.assertEqual(self.reaper.reap(now=expires_at - 1), [])
+        self.assertEqual(len(self.reaper.reap(now=expires_at + 5)), 20)
+        self.assertIsNone(get_job('job-0'))
+        self.assertEqual(os.listdir(self.test_jobs_folder), [])
+    
+    def test_scan_recovers_expiry_after_restart(self):
+        """A fresh reaper finds terminal jobs on disk, active jobs are left alone"""
+        now = time.time()
+        with patch('app.JOB_REAPER', self.reaper), patch.object(self.reaper, 'start'):
+            save_job('done', {'job_id': 'done', 'status': 'finished', 'expires_at': now - 10})
+            save_job('legacy', {'job_id': 'legacy', 'status': 'failed'})
+            save_job('running', {'job_id': 'running', 'status': 'processing'})
+        os.remove(os.path.join(self.test_jobs_folder, 'legacy.json'))
+        with open(os.path.join(self.test_jobs_folder, 'legacy.json'), 'w') as f:
+            json.dump({'job_id': 'legacy', 'status': 'failed'}, f)
+        
+        restarted = self.app.JobReaper(scan_interval=300)
+        with patch.object(restarted, 'start'), patch('app.WORKSPACE.release') as mock_release:
+            self.assertEqual(restarted.scan(), 2)
+            self.assertEqual(restarted.reap(now=now), ['done'])
+            self.assertEqual(restarted.reap(now=now + self.app.JOB_TTL_SECONDS['failed'] + 5), ['legacy'])
+        
+        mock_release.assert_any_call('done')
+        self.assertIsNotNone(get_job('running'))
+        self.assertIsNone(get_job('done'))
+    
+    def test_batches_expire(self):
+        """Batch records carry expires_at and are removed by the reaper, also after a restart"""
+        now = time.time()
+        with patch('app.JOB_REAPER', self.reaper), patch.object(self.reaper, 'start'):
+            self.app.save_batch('b1', {'batch_id': 'b1', 'job_ids': [], 'expires_at': now + 60})
+            with open(os.path.join(self.test_batches_folder, 'legacy.json'), 'w') as f:
+                json.dump({'batch_id': 'legacy', 'job_ids': []}, f)
+            
+            self.assertEqual(self.reaper.scan(), 1)
+            self.assertEqual(self.reaper.reap(now=now + 61), ['b1'])
+            self.assertIsNone(self.app.get_batch('b1'))
+            self.assertEqual(self.reaper.reap(now=now + self.app.BATCH_TTL_SECONDS + 5), ['legacy'])
+        self.assertEqual(os.listdir(self.test_batches_folder), [])
+
+class TestAsgi(unittest.TestCase):
+    """Test the ASGI front end against the Flask contracts"""
+    
+    def setUp(self):
+        import app
+        import asgi
+        self.app = app
+        self.asgi = asgi
+        self.test_jobs_folder = tempfile.mkdtemp()
+        self.test_clips_folder = tempfile.mkdtemp()
+        self.original_jobs_folder = app.JOBS_FOLDER
+        self.original_clips_folder = app.CLIPS_FOLDER
+        app.JOBS_FOLDER = self.test_jobs_folder
+        app.CLIPS_FOLDER = self.test_clips_folder
+    
+    def tearDown(self):
+        self.app.JOBS_FOLDER = self.original_jobs_folder
+        self.app.CLIPS_FOLDER = self.original_clips_folder
+        shutil.rmtree(self.test_jobs_folder, ignore_errors=True)
+        shutil.rmtree(self.test_clips_folder, ignore_errors=True)
+    
+    def request(self, method, path, query=b'', headers=()):
+        """ASGI uygulamasını doğrudan çağır -> (status, headers, body)"""
+        import asyncio
+        messages = []
+        received = []
+        
+        async def receive():
+            if not received:
+                received.append(True)
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await asyncio.sleep(3600)
+        
+        async def send(message):
+            messages.append(message)
+        
+        scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query, 'headers': list(headers),
+                 'server': ('testserver', 80), 'client': ('127.0.0.1', 5000), 'scheme': 'http', 'http_version': '1.1'}
+        asyncio.run(self.asgi.application(scope, receive, send))
+        return messages[0]['status'], dict(messages[0]['headers']), b''.join(m.get('body', b'') for m in messages[1:])
+    
+    def test_json_contract_matches_flask(self):
+        """Endpoints answered through Flask return the same payload over ASGI"""
+        save_job('job-1', {'job_id': 'job-1', 'video_id': 'abc', 'status': 'pending', 'created_at': 'now', 'total': 1, 'processed': 0})
+        client = self.app.app.test_client()
+        
+        for path in ('/api/check-job/job-1', '/api/check-job/missing', '/api/clips'):
+            status, _, body = self.request('GET', path)
+            expected = client.get(path, base_url='http://testserver')
+            self.assertEqual(status, expected.status_code)
+            self.assertEqual(json.loads(body), expected.get_json())
+    
+    def test_long_poll_returns_on_change(self):
+        """check-job?wait holds the connection until the job moves"""
+        save_job('job-1', {'job_id': 'job-1', 'video_id': 'abc', 'status': 'processing', 'created_at': 'now', 'total': 2, 'processed': 0})
+        finish = threading.Timer(0.3, save_job, ('job-1', {'job_id': 'job-1', 'video_id': 'abc', 'status': 'processing',
+                                                           'created_at': 'now', 'total': 2, 'processed': 1}))
+        finish.start()
+        
+        started = time.monotonic()
+        with patch('asgi.ASGI_POLL_SECONDS', 0.05):
+            status, _, body = self.request('GET', '/api/check-job/job-1', b'wait=10')
+        finish.join()
+        
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)['processed'], 1)
+        self.assertLess(time.monotonic() - started, 5)
+    
+    def test_clip_streaming_with_range(self):
+        """Clips are streamed in chunks with byte ranges, paths stay inside the clips folder"""
+        with open(os.path.join(self.test_clips_folder, 'abc-0-5_reels.mp4'), 'wb') as f:
+            f.write(bytes(range(256)) * 1024)
+        
+        with patch('asgi.FILE_CHUNK_BYTES', 1000):
+            status, headers, body = self.request('GET', '/clips/abc-0-5_reels.mp4', headers=[(b'range', b'bytes=100-2599')])
+        self.assertEqual(status, 206)
+        self.assertEqual(headers[b'Content-Range'], b'bytes 100-2599/262144')
+        self.assertEqual(body, (bytes(range(256)) * 1024)[100:2600])
+        
+        self.assertEqual(self.request('GET', '/clips/abc-0-5_reels.mp4', headers=[(b'range', b'bytes=999999-')])[0], 416)
+        self.assertEqual(self.request('GET', '/clips/../app.py')[0], 404)
+    
+    def test_job_events_stream_until_finished(self):
+        """The SSE stream sends the job state and closes once it is terminal"""
+        save_job('job-1', {'job_id': 'job-1', 'video_id': 'abc', 'status': 'finished', 'created_at': 'now', 'total': 1,
+                           'processed': 1, 'results': [], 'errors': []})
+        
+        status, headers, body = self.request('GET', '/api/jobs/job-1/events')
+        
+        self.assertEqual(status, 200)
+        self.assertEqual(headers[b'content-type'], b'text/event-stream')
+        event = body.decode('utf-8').split('\n')
+        self.assertEqual(event[0], 'event: job')
+        self.assertEqual(json.loads(event[1][len('data: '):])['status'], 'finished')
+    
+    def test_slow_views_do_not_block_clip_io(self):
+        """Flask views run on their own pool, so clips stream while every view thread is busy"""
+        with open(os.path.join(self.test_clips_folder, 'abc-0-5_reels.mp4'), 'wb') as f:
+            f.write(b'x' * 1000)
+        release = threading.Event()
+        views = [self.asgi._view_executor.submit(release.wait, 10) for _ in range(self.asgi.ASGI_VIEW_THREADS)]
+        try:
+            status, _, body = self.request('GET', '/clips/abc-0-5_reels.mp4')
+        finally:
+            release.set()
+        
+        self.assertEqual((status, body), (200, b'x' * 1000))
+        self.assertTrue(all(view.result(5) for view in views))
+        
+        threads = []
+        call_flask = self.asgi.call_flask
+        with patch('asgi.call_flask', side_effect=lambda request: threads.append(threading.current_thread().name) or call_flask(request)):
+            self.assertEqual(self.request('GET', '/api/clips')[0], 200)
+        self.assertTrue(threads[0].startswith('asgi-view'))
+    
+    def test_check_job_answers_while_view_pool_is_busy(self):
+        """check-job and its long-poll reply on the I/O pool even when every view thread is stuck"""
+        save_job('job-1', {'job_id': 'job-1', 'video_id': 'abc', 'status': 'finished', 'created_at': 'now', 'total': 1,
+                           'processed': 1, 'results': [], 'errors': []})
+        release = threading.Event()
+        views = [self.asgi._view_executor.submit(release.wait, 10) for _ in range(self.asgi.ASGI_VIEW_THREADS)]
+        try:
+            started = time.monotonic()
+            for query in (b'', b'wait=5'):
+                status, _, body = self.request('GET', '/api/check-job/job-1', query)
+                self.assertEqual(status, 200)
+                self.assertEqual(json.loads(body)['status'], 'finished')
+            self.assertLess(time.monotonic() - started, 5)
+        finally:
+            release.set()
+        self.assertTrue(all(view.result(5) for view in views))
+
+class TestStartup(unittest.TestCase):
+    """Test import-time work is deferred to create_app"""
+    
+    def test_import_has_no_side_effects(self):
+        """Importing app neither creates folders nor loads numpy"""
+        workdir = tempfile.mkdtemp()
+        env = {k: v for k, v in os.environ.items() if k != 'PROMETHEUS_MULTIPROC_DIR'}
+        env['PYTHONPATH'] = os.path.dirname(os.path.abspath(__file__))
+        code = ("import os, sys, app; print(app._initialized, os.path.isdir('clips'), "
+                "type(sys.modules['numpy']).__name__)")
+        try:
+            result = subprocess.run([sys.executable, '-c', code], cwd=workdir, env=env,
+                                    capture_output=True, text=True, timeout=60)
+            self.assertEqual(result.returncode, 0, result.stderr)
+            self.assertEqual(result.stdout.split(), ['False', 'False', '_LazyModule'])
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    
+    def test_create_app_creates_folders_once(self):
+        """create_app runs the one-time init and is idempotent"""
+        import mimetypes
+        import app
+        workdir = tempfile.mkdtemp()
+        folder = os.path.join(workdir, 'clips')
+        try:
+            with patch.object(app, 'CLIPS_FOLDER', folder), patch.object(app, '_initialized', False):
+                self.assertIs(app.create_app(), app.app)
+                self.assertTrue(os.path.isdir(folder))
+                shutil.rmtree(folder)
+                app.create_app()
+                self.assertFalse(os.path.isdir(folder))  # ikinci çağrı tekrar init etmez
+            self.assertEqual(mimetypes.guess_type('index.m3u8')[0], 'application/vnd.apple.mpegurl')
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    
+    def test_gunicorn_reload_keeps_live_metrics(self):
+        """Stale metric files are wiped on the first config load only, not on SIGHUP reloads"""
+        import runpy
+        folder = tempfile.mkdtemp()
+        config = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py')
+        try:
+            with open(os.path.join(folder, 'counter_1.db'), 'wb') as f:
+                f.write(b'stale')
+            with patch.dict(os.environ, {'PROMETHEUS_MULTIPROC_DIR': folder}):
+                os.environ.pop('CLIP_API_METRICS_MASTER', None)
+                runpy.run_path(config)
+                self.assertEqual(os.listdir(folder), [])
+                
+                with open(os.path.join(folder, 'counter_2.db'), 'wb') as f:
+                    f.write(b'live')
+                runpy.run_path(config)  # SIGHUP: config tekrar okunur
+                self.assertEqual(os.listdir(folder), ['counter_2.db'])
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+    
+    def test_lazy_numpy_loads_on_use(self):
+        """The lazily imported numpy behaves like the real module"""
+        import app
+        self.assertEqual(app.np.zeros(3).sum(), 0)
+    
+    def test_turboscribe_patterns(self):
+        """Precompiled TurboScribe patterns parse the download page"""
+        import app
+        html = ('<h1 class="t">My Video</h1>'
+                '<a href="https://r1.googlevideo.com/videoplayback?itag=140&mime=audio%2Fmp4">m4a</a>')
+        self.assertEqual(app.TURBOSCRIBE_TITLE_RE.search(html).group(1), 'My Video')
+        self.assertIn('itag=140', app.TURBOSCRIBE_ITAG_RES[140].search(html).group(1))
+        self.assertIsNone(app.TURBOSCRIBE_ITAG_RES[251].search(html))
+        self.assertIsNotNone(app.TURBOSCRIBE_AUDIO_RE.search(html))
+
 class TestEdgeCases(unittest.TestCase):
     """Test edge cases and error scenarios"""
     